@@ -1,10 +1,16 @@
 from django.contrib import admin
-from .models import Disease, Medicine, DiseaseMedicine, MedicineSearchCache, MedicineInteraction
+from .models import Disease, DiseaseAlias, Medicine, DiseaseMedicine, MedicineSearchCache, MedicineInteraction
+
+class DiseaseAliasInline(admin.TabularInline):
+    model = DiseaseAlias
+    fields = ['alias']
+    extra = 1
 
 @admin.register(Disease)
 class DiseaseAdmin(admin.ModelAdmin):
     list_display = ['name', 'normalized_name', 'created_at']
-    search_fields = ['name', 'normalized_name']
+    search_fields = ['name', 'normalized_name', 'aliases__alias']
+    inlines = [DiseaseAliasInline]
 
 @admin.register(Medicine)  
 class MedicineAdmin(admin.ModelAdmin):
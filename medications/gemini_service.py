@@ -2,15 +2,18 @@ import google.generativeai as genai
 import json
 from django.conf import settings
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from typing import Dict, List, Any
 import logging
 import time
-from fuzzywuzzy import fuzz
 from .models import (
     Disease, Medicine, DiseaseMedicine, MedicineSearchCache, 
-    CachedMedicineResult, MedicineInteraction, PatientMedicineHistory
+    CachedMedicineResult, PatientMedicineHistory, normalize_disease_name
 )
+from .interactions import lookup_interactions, normalize_medication_name, record_interactions, same_medication
+from .single_flight import flight_key, single_flight
+from .tasks import schedule_disease_refresh
 import requests
 import os
 
@@ -52,6 +55,21 @@ class GeminiMedicineService:
                 "error": f"Status {response.status_code}: {response.text}"
             }
     
+    def _response_text(self, response: Dict[str, Any]):
+        """The text of a Gemini response, or None"""
+        if 'text' in response and response['text']:
+            return response['text']
+        if 'candidates' in response and response['candidates']:
+            # Gemini API: text is usually in candidates[0]['content']['parts'][0]['text']
+            try:
+                candidate = response['candidates'][0]
+                parts = candidate.get('content', {}).get('parts', [])
+                if parts and isinstance(parts[0], dict) and 'text' in parts[0]:
+                    return parts[0]['text']
+            except Exception as e:
+                logger.error(f"Error extracting text from Gemini candidates: {e}")
+        return None
+    
     def search_medicines_for_disease(self, disease_query: str, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Search for medicines with intelligent caching and improved error handling
@@ -64,6 +82,9 @@ class GeminiMedicineService:
             cached_result = self._get_cached_result(normalized_query)
             if cached_result:
                 logger.info(f"Returning cached result for: {disease_query}")
+                # Stale while revalidate: answer now, refresh from Gemini in Celery
+                if cached_result['data']['stale']:
+                    schedule_disease_refresh(normalized_query)
                 return cached_result
         
         # Check if we have this disease in our database
@@ -72,14 +93,34 @@ class GeminiMedicineService:
         # Get existing medicines for this disease
         existing_medicines = self._get_existing_medicines_for_disease(disease_obj)
         print("Existing medicines count:", (existing_medicines))
-        # If we have recent, comprehensive data, return it
+        # If we have comprehensive data, return it (refreshing it in the background once
+        # the disease's last refresh is stale)
         if existing_medicines and not force_refresh:
-            recent_medicines = [m for m in existing_medicines if not m.is_stale()]
-            if len(recent_medicines) >= 3:  # Minimum threshold
+            if len(existing_medicines) >= 3:  # Minimum threshold
                 logger.info(f"Returning existing medicines for: {disease_query}")
-                return self._format_cached_medicines(disease_obj, recent_medicines)
+                result = self._format_cached_medicines(disease_obj, existing_medicines)
+                if disease_obj.is_stale():
+                    result['data']['stale'] = True
+                    schedule_disease_refresh(normalized_query)
+                return result
+        
+        # One Gemini call per query at a time; concurrent searches share its result
+        ai_result = single_flight(
+            flight_key('disease', normalized_query),
+            lambda: self._fetch_and_store_medicines(disease_obj, disease_query, normalized_query),
+        )
+        if ai_result['success']:
+            return ai_result
         
-        # Fetch from Gemini AI with retry logic
+        # Fallback to existing data if AI fails
+        if existing_medicines:
+            logger.warning(f"AI failed, returning existing data for: {disease_query}")
+            return self._format_cached_medicines(disease_obj, existing_medicines)
+        
+        return ai_result
+    
+    def _fetch_and_store_medicines(self, disease_obj: Disease, disease_query: str, normalized_query: str) -> Dict[str, Any]:
+        """Fetch medicines from Gemini with retry logic and save them and the search cache entry"""
         print(f"Fetching from Gemini AI for: {disease_query}")
         ai_result = self._fetch_from_gemini_with_retry(disease_query)
         
@@ -89,13 +130,6 @@ class GeminiMedicineService:
             
             # Create cache entry
             self._create_cache_entry(normalized_query, saved_medicines, ai_result)
-            
-            return ai_result
-        
-        # Fallback to existing data if AI fails
-        if existing_medicines:
-            logger.warning(f"AI failed, returning existing data for: {disease_query}")
-            return self._format_cached_medicines(disease_obj, existing_medicines)
         
         return ai_result
     
@@ -166,18 +200,7 @@ class GeminiMedicineService:
                 
 
                 # Extract response text from Gemini response structure
-                response_text = None
-                if 'text' in response and response['text']:
-                    response_text = response['text']
-                elif 'candidates' in response and response['candidates']:
-                    # Gemini API: text is usually in candidates[0]['content']['parts'][0]['text']
-                    try:
-                        candidate = response['candidates'][0]
-                        parts = candidate.get('content', {}).get('parts', [])
-                        if parts and isinstance(parts[0], dict) and 'text' in parts[0]:
-                            response_text = parts[0]['text']
-                    except Exception as e:
-                        logger.error(f"Error extracting text from Gemini candidates: {e}")
+                response_text = self._response_text(response)
                 if not response_text:
                     logger.error(f"No valid text found in Gemini response: {response}")
                     return {
@@ -286,7 +309,7 @@ class GeminiMedicineService:
                 prompt
             )
             
-            response_text = response.get('text', '').strip()
+            response_text = (self._response_text(response) or '').strip()
             
             # Clean up response
             if response_text.startswith('```json'):
@@ -330,14 +353,14 @@ class GeminiMedicineService:
             }
     
     def _get_cached_result(self, normalized_query: str) -> Dict[str, Any]:
-        """Get cached search result if available and fresh"""
+        """Get cached search result if available; data['stale'] is set once it is past its age limit"""
         try:
             cache = MedicineSearchCache.objects.filter(
                 Q(normalized_query=normalized_query) | 
                 Q(normalized_query__icontains=normalized_query)
             ).first()
             
-            if cache and not cache.is_stale():
+            if cache:
                 cache.increment_access()
                 
                 # Get medicines from cache
@@ -350,7 +373,8 @@ class GeminiMedicineService:
                         'medicines': [self._medicine_to_dict(med) for med in cached_medicines],
                         'disclaimer': "This information is for educational purposes only. Always consult with a healthcare provider.",
                         'source': 'cache',
-                        'cached_at': cache.created_at.isoformat()
+                        'cached_at': cache.created_at.isoformat(),
+                        'stale': cache.is_stale()
                     }
                 }
         except Exception as e:
@@ -359,23 +383,17 @@ class GeminiMedicineService:
         return None
     
     def _get_or_create_disease(self, disease_name: str) -> Disease:
-        """Get or create disease object"""
-        # Try exact match first
-        disease = Disease.objects.filter(normalized_name=disease_name.lower().strip()).first()
+        """Get the disease a search refers to (by name, alias or close spelling) or create it"""
+        disease = Disease.objects.match(disease_name)
+        if disease:
+            if disease.normalized_name != normalize_disease_name(disease_name):
+                logger.info(f"Found similar disease: {disease.name} for {disease_name}")
+            return disease
         
-        if not disease:
-            # Try fuzzy matching for similar diseases
-            all_diseases = Disease.objects.all()
-            for existing_disease in all_diseases:
-                similarity = fuzz.ratio(disease_name.lower(), existing_disease.normalized_name)
-                if similarity > 85:  # High similarity threshold
-                    logger.info(f"Found similar disease: {existing_disease.name} for {disease_name}")
-                    return existing_disease
-            
-            # Create new disease
-            disease = Disease.objects.create(name=disease_name.title())
+        # Create new disease
+        disease, created = Disease.objects.get_or_create(name=disease_name.strip().title())
+        if created:
             logger.info(f"Created new disease: {disease.name}")
-        
         return disease
     
     def _get_existing_medicines_for_disease(self, disease: Disease) -> List[Medicine]:
@@ -455,27 +473,33 @@ class GeminiMedicineService:
         return saved_medicines
     
     def _create_cache_entry(self, normalized_query: str, medicines: List[Medicine], ai_result: Dict):
-        """Create cache entry for search result"""
+        """Create or replace the cache entry for a search result"""
+        search_query = ai_result['data'].get('disease') or normalized_query
         try:
-            # Delete old cache entries for this query
-            MedicineSearchCache.objects.filter(normalized_query=normalized_query).delete()
-            
-            # Create new cache entry
-            cache = MedicineSearchCache.objects.create(
-                search_query=ai_result['data']['disease'],
-                total_results=len(medicines),
-                ai_response_raw=ai_result.get('raw_response'),
-                ai_processing_time=ai_result.get('processing_time')
-            )
-            
-            # Add medicines to cache
-            for index, medicine in enumerate(medicines):
-                CachedMedicineResult.objects.create(
-                    cache=cache,
-                    medicine=medicine,
-                    order_index=index
+            with transaction.atomic():
+                # Drop other entries for this query (another spelling echoed back by Gemini)
+                MedicineSearchCache.objects.filter(normalized_query=normalized_query).exclude(
+                    search_query=search_query
+                ).delete()
+                
+                # Update in place, so a concurrent reader never sees the entry missing
+                cache, _ = MedicineSearchCache.objects.update_or_create(
+                    search_query=search_query,
+                    defaults={
+                        'total_results': len(medicines),
+                        'ai_response_raw': ai_result.get('raw_response'),
+                        'ai_processing_time': ai_result.get('processing_time'),
+                        'created_at': timezone.now(),
+                    },
                 )
                 
+                # Add medicines to cache
+                CachedMedicineResult.objects.filter(cache=cache).delete()
+                CachedMedicineResult.objects.bulk_create([
+                    CachedMedicineResult(cache=cache, medicine=medicine, order_index=index)
+                    for index, medicine in enumerate(dict.fromkeys(medicines))
+                ])
+                
         except Exception as e:
             logger.error(f"Error creating cache entry: {e}")
     
@@ -488,7 +512,8 @@ class GeminiMedicineService:
                 'medicines': [self._medicine_to_dict(med) for med in medicines],
                 'disclaimer': "This information is for educational purposes only. Always consult with a healthcare provider.",
                 'source': 'database',
-                'last_updated': max([med.last_updated_from_ai for med in medicines]).isoformat() if medicines else None
+                'last_updated': max([med.last_updated_from_ai for med in medicines]).isoformat() if medicines else None,
+                'stale': False
             }
         }
     
@@ -512,56 +537,62 @@ class GeminiMedicineService:
             'last_searched': medicine.last_searched.isoformat() if medicine.last_searched else None
         }
     
+    def _fetch_and_record_interactions(self, medicine_name: str, medications: List[str]) -> Dict[str, Any]:
+        """Ask Gemini about unchecked medications and store its answer in the interaction matrix"""
+        ai_result = self._fetch_interactions_from_ai(medicine_name, medications)
+        if ai_result['success'] and ai_result['source'] == 'ai' and medications:
+            try:
+                record_interactions(medicine_name, medications, ai_result['data'])
+            except Exception as e:
+                logger.error(f"Error saving interactions for {medicine_name}: {e}")
+        return ai_result
+    
     def get_drug_interactions_from_cache(self, medicine_name: str, current_medications: List[str]) -> Dict[str, Any]:
-        """Check drug interactions using cached data first, then AI if needed"""
+        """
+        Check drug interactions using the interaction matrix first, then AI if needed.
+        
+        Only medications never checked against this medicine go to Gemini, and
+        its answer is stored in the matrix so the next check is a cache hit.
+        """
         try:
-            # Get medicine object
-            medicine = Medicine.objects.filter(name__iexact=medicine_name).first()
-            if not medicine:
-                return self._fetch_interactions_from_ai(medicine_name, current_medications)
-            
-            # Track search
-            medicine.increment_search_count()
-            
-            # Check cached interactions
-            cached_interactions = []
-            for current_med in current_medications:
-                current_med_obj = Medicine.objects.filter(name__icontains=current_med.strip()).first()
-                if current_med_obj:
-                    # Check both directions of interaction
-                    interaction = MedicineInteraction.objects.filter(
-                        Q(medicine_a=medicine, medicine_b=current_med_obj) |
-                        Q(medicine_a=current_med_obj, medicine_b=medicine)
-                    ).first()
-                    
-                    if interaction:
-                        cached_interactions.append({
-                            'medication': current_med,
-                            'severity': interaction.get_severity_display(),
-                            'description': interaction.description,
-                            'management': interaction.management
-                        })
-            
-            # If we have some cached data, return it
-            if cached_interactions or not current_medications:
-                safe_combinations = [med for med in current_medications 
-                                   if not any(inter['medication'] == med for inter in cached_interactions)]
-                
-                return {
-                    'success': True,
-                    'data': {
-                        'medicine': medicine_name,
-                        'current_medications': current_medications,
-                        'interactions': cached_interactions,
-                        'safe_combinations': safe_combinations,
-                        'recommendations': "Based on cached data. For most up-to-date information, consult your healthcare provider.",
-                        'source': 'cache'
-                    }
-                }
-            
-            # Fallback to AI
-            return self._fetch_interactions_from_ai(medicine_name, current_medications)
-            
+            # Two queries: resolve every name, then fetch all pairwise interactions
+            lookup = lookup_interactions(medicine_name, current_medications)
         except Exception as e:
             logger.error(f"Error checking cached interactions: {e}")
-            return self._fetch_interactions_from_ai(medicine_name, current_medications)
\ No newline at end of file
+            return self._fetch_interactions_from_ai(medicine_name, current_medications)
+        
+        interactions = list(lookup['interactions'])
+        unchecked = lookup['unchecked']
+        source = 'cache'
+        ai_data = {}
+        if unchecked or not lookup['medicine']:
+            # Concurrent checks of the same medicine and medications share one Gemini call
+            ai_result = single_flight(
+                flight_key('interactions', normalize_medication_name(medicine_name) or medicine_name.lower(),
+                           *sorted(med.lower() for med in unchecked)),
+                lambda: self._fetch_and_record_interactions(medicine_name, unchecked),
+            )
+            if not ai_result['success']:
+                return ai_result
+            ai_data = ai_result['data']
+            source = ai_result['source']
+            interactions += [entry for entry in ai_data.get('interactions') or [] if isinstance(entry, dict)]
+        
+        safe_combinations = [
+            med for med in current_medications
+            if not any(same_medication(med, str(inter.get('medication') or '')) for inter in interactions)
+        ]
+        
+        data = {
+            'medicine': medicine_name,
+            'current_medications': current_medications,
+            'interactions': interactions,
+            'interaction_matrix': lookup['matrix'],
+            'unresolved_medications': lookup['unresolved'],
+            'safe_combinations': safe_combinations,
+            'recommendations': ai_data.get('recommendations') or "Based on cached data. For most up-to-date information, consult your healthcare provider.",
+            'source': source
+        }
+        if ai_data.get('error_fallback'):
+            data['error_fallback'] = True
+        return {'success': True, 'data': data}
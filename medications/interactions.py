@@ -0,0 +1,299 @@
+"""
+Drug interaction lookup over the interaction matrix.
+
+Medication names from a patient chart ("Lisinopril 10mg daily") are resolved
+to Medicine rows in one query on the lowercased name or generic name, and
+every pairwise MedicineInteraction among them is fetched in a second query.
+Pairs are stored once in canonical order (MedicineInteraction.canonical_pair),
+so the matrix lookup needs no two-direction OR.
+
+Gemini answers are written back with ``record_interactions``: interactions
+are kept permanently, and pairs Gemini found no interaction for are stored
+as "no interaction" rows that expire after MEDICINE_NO_INTERACTION_TTL_DAYS,
+so only pairs never checked (or whose negative entry expired) go to Gemini.
+"""
+
+import logging
+import re
+from datetime import timedelta
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Medicine, MedicineInteraction
+
+logger = logging.getLogger(__name__)
+
+
+# Units a dose is written in ("500mg", "1000 IU", "2 tablets", "0.5%")
+DOSE_UNITS = (
+    'mg', 'mcg', 'ug', 'g', 'kg', 'ml', 'l', 'iu', 'unit', 'units', 'meq', 'mmol', '%',
+    'tab', 'tabs', 'tablet', 'tablets', 'cap', 'caps', 'capsule', 'capsules', 'puff', 'puffs', 'drop', 'drops',
+)
+# Directions that end a name even without a dose ("Tylenol PRN")
+DOSE_FREQUENCY_WORDS = {
+    'daily', 'nightly', 'weekly', 'once', 'twice', 'every', 'prn', 'qd', 'qod', 'bid', 'tid', 'qid',
+    'qhs', 'hs', 'qam', 'qpm', 'po',
+}
+_UNIT_PATTERN = '|'.join(re.escape(unit) for unit in sorted(DOSE_UNITS, key=len, reverse=True))
+# "500", "10mg", "0.5%", "10/325", "500mg/5ml"
+DOSE_PATTERN = re.compile(rf'^\d*\.?\d+(?:{_UNIT_PATTERN})?(?:/\d*\.?\d*(?:{_UNIT_PATTERN})?)?$')
+
+
+def normalize_medication_name(name: str) -> str:
+    """
+    Lowercased drug name without dose or directions ("Metformin HCl 500 mg BID" -> "metformin hcl").
+
+    Only a dose (a number with an optional unit) or a frequency word ends the
+    name, so digits that are part of it stay ("Vitamin D3 1000 IU" -> "vitamin d3").
+    """
+    words = []
+    for word in (name or '').lower().replace(',', ' ').split():
+        if DOSE_PATTERN.match(word) or word in DOSE_FREQUENCY_WORDS:
+            break
+        words.append(word)
+    return ' '.join(words)
+
+
+def _name_keys(name: str, first_word: bool = True) -> List[str]:
+    """Lookup keys for a name, most specific first (full name, then its first word unless first_word is False)"""
+    normalized = normalize_medication_name(name)
+    if not normalized:
+        return []
+    first = normalized.split()[0]
+    return [normalized] if first == normalized or not first_word else [normalized, first]
+
+
+def same_medication(name: str, other: str) -> bool:
+    """Whether two medication names refer to the same drug by name ("Metformin" and "metformin hcl 500mg")"""
+    return bool(set(_name_keys(name)) & set(_name_keys(other)))
+
+
+def resolve_medicines(names: Iterable[str], first_word: bool = True) -> Dict[str, Optional[Medicine]]:
+    """
+    Map each medication name to its Medicine (or None) with one query.
+
+    A name matches Medicine.name before generic_name, and the full name before
+    its first word (skipped when first_word is False); ties go to the oldest
+    Medicine so results are stable.
+    """
+    names = list(dict.fromkeys(name for name in names if name))
+    keys = {name: _name_keys(name, first_word) for name in names}
+    all_keys = {key for name_keys in keys.values() for key in name_keys}
+    if not all_keys:
+        return {name: None for name in names}
+
+    by_name, by_generic = {}, {}
+    medicines = Medicine.objects.annotate(
+        name_key=Lower('name'), generic_key=Lower('generic_name'),
+    ).filter(Q(name_key__in=all_keys) | Q(generic_key__in=all_keys)).order_by('pk')
+    for medicine in medicines:
+        by_name.setdefault(medicine.name_key, medicine)
+        by_generic.setdefault(medicine.generic_key, medicine)
+
+    resolved = {}
+    for name in names:
+        resolved[name] = next(
+            (lookup[key] for key in keys[name] for lookup in (by_name, by_generic) if key in lookup), None,
+        )
+    return resolved
+
+
+def _resolved_by_full_name(name: str, medicine: Medicine) -> bool:
+    """Whether a name resolved to the medicine by its full name rather than just its first word"""
+    return normalize_medication_name(name) in {medicine.name.lower(), (medicine.generic_name or '').lower()}
+
+
+def interaction_matrix(medicines: Iterable[Medicine]) -> Dict[Tuple[int, int], MedicineInteraction]:
+    """
+    Every stored interaction among the medicines, keyed by canonical (medicine_a_id, medicine_b_id).
+
+    Includes unexpired "no interaction" entries (severity SEVERITY_NONE).
+    """
+    ids = {medicine.pk for medicine in medicines}
+    if len(ids) < 2:
+        return {}
+    interactions = MedicineInteraction.objects.filter(medicine_a_id__in=ids, medicine_b_id__in=ids).exclude(
+        severity=MedicineInteraction.SEVERITY_NONE, expires_at__lte=timezone.now(),
+    )
+    return {(interaction.medicine_a_id, interaction.medicine_b_id): interaction for interaction in interactions}
+
+
+def _interaction_dict(interaction: MedicineInteraction) -> Dict:
+    return {
+        'severity': interaction.get_severity_display(),
+        'description': interaction.description,
+        'management': interaction.management,
+    }
+
+
+def lookup_interactions(medicine_name: str, current_medications: List[str]) -> Dict:
+    """
+    Stored interactions for a medicine against a patient's medication list.
+
+    Returns:
+        Dict with:
+            medicine: The resolved Medicine, or None
+            interactions: Interactions of the medicine with each current medication
+            matrix: Every stored interaction among the medicine and all current medications
+            unresolved: Current medications with no Medicine record
+            unchecked: Current medications never checked against the medicine
+                (no stored interaction or unexpired "no interaction" entry)
+    """
+    resolved = resolve_medicines([medicine_name] + list(current_medications))
+    medicine = resolved.get(medicine_name)
+    if medicine:
+        Medicine.objects.filter(pk=medicine.pk).update(search_count=F('search_count') + 1, last_searched=timezone.now())
+
+    # Chart names paired with their Medicine, the searched medicine first
+    entries = [(medicine_name, medicine)] if medicine else []
+    entries += [
+        (name, resolved[name]) for name in dict.fromkeys(current_medications)
+        if resolved.get(name) and name != medicine_name
+    ]
+    pairs = interaction_matrix(entry_medicine for _, entry_medicine in entries)
+
+    interactions, matrix, checked = [], [], set()
+    for (name, first), (other_name, second) in combinations(entries, 2):
+        if first.pk == second.pk:
+            if name == medicine_name:
+                checked.add(other_name)
+            continue
+        interaction = pairs.get(MedicineInteraction.canonical_pair(first.pk, second.pk))
+        if not interaction:
+            continue
+        if interaction.severity == MedicineInteraction.SEVERITY_NONE:
+            # "Vitamin K" matched "Vitamin" by its first word is a different drug than the one checked
+            if name == medicine_name and all(
+                _resolved_by_full_name(entry_name, entry_medicine)
+                for entry_name, entry_medicine in ((name, first), (other_name, second))
+            ):
+                checked.add(other_name)
+            continue
+        if name == medicine_name:
+            checked.add(other_name)
+        matrix.append({'medications': [name, other_name], **_interaction_dict(interaction)})
+        if name == medicine_name:
+            interactions.append({'medication': other_name, **_interaction_dict(interaction)})
+
+    return {
+        'medicine': medicine,
+        'interactions': interactions,
+        'matrix': matrix,
+        'unresolved': [name for name in current_medications if not resolved.get(name)],
+        'unchecked': [name for name in dict.fromkeys(current_medications) if name not in checked and name != medicine_name],
+    }
+
+
+def _severity(value) -> str:
+    """Gemini's severity text ("Moderate", "major interaction") as a severity choice; unknown reads as moderate"""
+    text = str(value or '').lower()
+    for severity, _ in MedicineInteraction.SEVERITY_CHOICES:
+        if severity != MedicineInteraction.SEVERITY_NONE and severity in text:
+            return severity
+    return 'moderate'
+
+
+def _get_or_create_medicines(names: Iterable[str]) -> Dict[str, Medicine]:
+    """
+    Resolve names by their full name, adding a bare Medicine for any unknown drug so its pairs can be stored.
+
+    The first-word fallback is not used, so "Vitamin K" never stores an answer under "Vitamin".
+    """
+    resolved = resolve_medicines(names, first_word=False)
+    for name, medicine in resolved.items():
+        normalized = normalize_medication_name(name)
+        if medicine is None and normalized:
+            resolved[name], _ = Medicine.objects.get_or_create(
+                name__iexact=normalized, defaults={'name': normalized.title()},
+            )
+    return {name: medicine for name, medicine in resolved.items() if medicine}
+
+
+def record_interactions(medicine_name: str, checked_medications: List[str], ai_data: Dict) -> int:
+    """
+    Store Gemini's interaction check for a medicine against the medications it was asked about.
+
+    Reported interactions are upserted permanently; every other checked
+    medication is stored as an expiring "no interaction" entry, unless an
+    interaction Gemini reported could not be matched to a checked medication.
+
+    Returns:
+        Number of pairs written
+    """
+    medicines = _get_or_create_medicines([medicine_name] + list(checked_medications))
+    medicine = medicines.get(medicine_name)
+    if not medicine:
+        return 0
+    targets = {}
+    for name in checked_medications:
+        other = medicines.get(name)
+        if other and other.pk != medicine.pk:
+            targets[name] = other
+
+    # Gemini may shorten a chart name ("Metformin" for "Metformin HCl 500 mg BID"),
+    # answer with the medicine's stored, generic or brand name, or add the brand in
+    # parentheses ("Atorvastatin (Lipitor)")
+    target_keys = {
+        name: set(_name_keys(name)) | {
+            str(known).lower() for known in [other.name, other.generic_name, *(other.brand_names or [])] if known
+        }
+        for name, other in targets.items()
+    }
+    found = {}
+    unmatched = 0
+    for entry in ai_data.get('interactions') or []:
+        if not isinstance(entry, dict):
+            unmatched += 1
+            continue
+        entry_keys = [
+            key for part in re.split(r'[()]', str(entry.get('medication') or '')) for key in _name_keys(part)
+        ]
+        other = next(
+            (targets[name] for key in entry_keys for name in targets if key in target_keys[name]), None,
+        )
+        if other is None:
+            unmatched += 1
+            continue
+        pair = MedicineInteraction.canonical_pair(medicine.pk, other.pk)
+        found[pair] = MedicineInteraction(
+            medicine_a_id=pair[0], medicine_b_id=pair[1],
+            severity=_severity(entry.get('severity')),
+            description=entry.get('description') or '',
+            management=entry.get('management'),
+            ai_generated=True,
+        )
+    if found:
+        MedicineInteraction.objects.bulk_create(
+            found.values(), update_conflicts=True, unique_fields=['medicine_a', 'medicine_b'],
+            update_fields=['severity', 'description', 'management', 'ai_generated', 'expires_at', 'updated_at'],
+        )
+
+    if unmatched:
+        # An interaction named differently than the chart ("Lipitor" charted as
+        # "Atorvastatin 20mg") may be with any checked medication, so none is stored as safe
+        logger.warning(f"{unmatched} Gemini interaction(s) for {medicine_name} matched no checked medication")
+        return len(found)
+
+    expires_at = timezone.now() + timedelta(days=settings.MEDICINE_NO_INTERACTION_TTL_DAYS)
+    negatives = [
+        MedicineInteraction(
+            medicine_a_id=pair[0], medicine_b_id=pair[1], severity=MedicineInteraction.SEVERITY_NONE,
+            description='', ai_generated=True, expires_at=expires_at,
+        )
+        for pair in {MedicineInteraction.canonical_pair(medicine.pk, other.pk) for other in targets.values()}
+        if pair not in found
+    ]
+    if negatives:
+        ids = {medicine.pk} | {other.pk for other in targets.values()}
+        # Replace expired "no interaction" entries, but never overwrite a stored interaction
+        MedicineInteraction.objects.filter(
+            medicine_a_id__in=ids, medicine_b_id__in=ids,
+            severity=MedicineInteraction.SEVERITY_NONE, expires_at__lte=timezone.now(),
+        ).delete()
+        MedicineInteraction.objects.bulk_create(negatives, ignore_conflicts=True)
+    return len(found) + len(negatives)
@@ -0,0 +1,66 @@
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def _trigram(field, name):
+    return django.contrib.postgres.indexes.GinIndex(
+        django.contrib.postgres.indexes.OpClass(field, name='gin_trgm_ops'), name=name,
+    )
+
+
+INDEXES = [
+    ('disease', _trigram('normalized_name', 'disease_name_trgm')),
+    ('diseasealias', _trigram('normalized_alias', 'disease_alias_trgm')),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # GIN trigram indexes only exist on PostgreSQL; other backends match diseases in Python
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in INDEXES:
+        schema_editor.add_index(apps.get_model('medications', model_name), index, concurrently=True)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in INDEXES:
+        schema_editor.remove_index(apps.get_model('medications', model_name), index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('medications', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='DiseaseAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=255)),
+                ('normalized_alias', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='medications.disease')),
+            ],
+            options={
+                'verbose_name_plural': 'disease aliases',
+                'ordering': ['alias'],
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
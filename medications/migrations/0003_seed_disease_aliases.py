@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Common lay terms and abbreviations for conditions searched from patient charts
+COMMON_DISEASE_ALIASES = {
+    'Hypertension': ['High Blood Pressure', 'High BP', 'HTN'],
+    'Type 2 Diabetes Mellitus': ['Type 2 Diabetes', 'Diabetes Type 2', 'T2DM', 'Adult Onset Diabetes'],
+    'Hyperlipidemia': ['High Cholesterol', 'Dyslipidemia'],
+    'Congestive Heart Failure': ['Heart Failure', 'CHF'],
+    'Atrial Fibrillation': ['AFib', 'A-Fib'],
+    'Coronary Artery Disease': ['CAD', 'Coronary Heart Disease'],
+    'Chronic Obstructive Pulmonary Disease': ['COPD'],
+    'Chronic Kidney Disease': ['CKD'],
+    'Gastroesophageal Reflux Disease': ['GERD', 'Acid Reflux'],
+    'Hypothyroidism': ['Underactive Thyroid'],
+}
+
+
+def _normalize(name):
+    return ' '.join(name.lower().split())
+
+
+def seed_aliases(apps, schema_editor):
+    Disease = apps.get_model('medications', 'Disease')
+    DiseaseAlias = apps.get_model('medications', 'DiseaseAlias')
+
+    # Names saved before normalization collapsed inner whitespace
+    for disease in Disease.objects.all():
+        if disease.normalized_name != _normalize(disease.name):
+            Disease.objects.filter(pk=disease.pk).update(normalized_name=_normalize(disease.name))
+
+    for canonical, aliases in COMMON_DISEASE_ALIASES.items():
+        disease = Disease.objects.filter(normalized_name=_normalize(canonical)).first()
+        if disease is None:
+            disease = Disease.objects.create(name=canonical, normalized_name=_normalize(canonical))
+        for alias in aliases:
+            normalized = _normalize(alias)
+            # A disease already saved under this name keeps its own medicines and cache
+            if Disease.objects.filter(normalized_name=normalized).exists():
+                continue
+            DiseaseAlias.objects.get_or_create(
+                normalized_alias=normalized, defaults={'disease': disease, 'alias': alias},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0002_diseasealias_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_aliases, migrations.RunPython.noop),
+    ]
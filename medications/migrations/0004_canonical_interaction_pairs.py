@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def canonicalize_pairs(apps, schema_editor):
+    """Store every pair lower id first, dropping reversed duplicates and self-pairs"""
+    MedicineInteraction = apps.get_model('medications', 'MedicineInteraction')
+    MedicineInteraction.objects.filter(medicine_a=models.F('medicine_b')).delete()
+    reversed_pairs = MedicineInteraction.objects.filter(medicine_a__gt=models.F('medicine_b'))
+    for interaction in reversed_pairs.iterator():
+        duplicate = MedicineInteraction.objects.filter(
+            medicine_a_id=interaction.medicine_b_id, medicine_b_id=interaction.medicine_a_id,
+        )
+        if duplicate.exists():
+            interaction.delete()
+        else:
+            MedicineInteraction.objects.filter(pk=interaction.pk).update(
+                medicine_a_id=interaction.medicine_b_id, medicine_b_id=interaction.medicine_a_id,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0003_seed_disease_aliases'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='medicine_name_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(django.db.models.functions.text.Lower('generic_name'), name='medicine_generic_lower'),
+        ),
+        migrations.RunPython(canonicalize_pairs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0004: PostgreSQL can't ALTER a table with pending deferred FK checks from its updates
+
+    dependencies = [
+        ('medications', '0004_canonical_interaction_pairs'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='medicineinteraction',
+            constraint=models.CheckConstraint(condition=models.Q(('medicine_a__lt', models.F('medicine_b'))), name='interaction_canonical_pair'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0005_interaction_canonical_pair_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicineinteraction',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, help_text="Set on 'no interaction' entries, which are checked again after this time", null=True),
+        ),
+        migrations.AlterField(
+            model_name='medicineinteraction',
+            name='severity',
+            field=models.CharField(choices=[('minor', 'Minor'), ('moderate', 'Moderate'), ('major', 'Major'), ('contraindicated', 'Contraindicated'), ('none', 'No interaction')], max_length=20),
+        ),
+    ]
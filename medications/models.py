@@ -1,8 +1,75 @@
-from django.db import models
+from django.db import connection, models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.utils import timezone
+import hashlib
 import json
 
+# Entries cached together expire spread over this fraction of their lifetime
+STALE_JITTER = 0.1
+
+
+def jittered_seconds(seconds, seed):
+    """A lifetime stretched by a stable per-entry fraction (up to STALE_JITTER), so entries don't all expire at once"""
+    fraction = int(hashlib.md5(str(seed).encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return seconds * (1 + STALE_JITTER * fraction)
+
+
+# fuzz.ratio a name must exceed to resolve to an existing disease
+DISEASE_MATCH_THRESHOLD = 85
+# Most similar names (by trigram similarity) re-scored with fuzz.ratio
+DISEASE_MATCH_CANDIDATES = 5
+
+
+def normalize_disease_name(name):
+    """Lowercase with single spaces, the form disease names and aliases are matched on"""
+    return ' '.join((name or '').lower().split())
+
+
+class DiseaseQuerySet(models.QuerySet):
+    def match(self, name):
+        """
+        The disease a searched name refers to, or None.
+
+        An exact name or alias wins; otherwise the closest name or alias with a
+        fuzz.ratio above DISEASE_MATCH_THRESHOLD. On PostgreSQL the candidates
+        come from one trigram-indexed query instead of a scan of every disease.
+        """
+        from fuzzywuzzy import fuzz
+
+        normalized = normalize_disease_name(name)
+        if not normalized:
+            return None
+        exact = self.filter(
+            models.Q(normalized_name=normalized) | models.Q(aliases__normalized_alias=normalized)
+        ).first()
+        if exact:
+            return exact
+
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramSimilarity
+
+            names = self.filter(normalized_name__trigram_similar=normalized).annotate(
+                similarity=TrigramSimilarity('normalized_name', normalized),
+            ).order_by().values_list('pk', 'normalized_name', 'similarity')
+            alias_names = DiseaseAlias.objects.filter(normalized_alias__trigram_similar=normalized).annotate(
+                similarity=TrigramSimilarity('normalized_alias', normalized),
+            ).order_by().values_list('disease_id', 'normalized_alias', 'similarity')
+            candidates = names.union(alias_names).order_by('-similarity')[:DISEASE_MATCH_CANDIDATES]
+        else:
+            candidates = list(self.values_list('pk', 'normalized_name')) + list(
+                DiseaseAlias.objects.values_list('disease_id', 'normalized_alias')
+            )
+
+        best_pk, best_score = None, DISEASE_MATCH_THRESHOLD
+        for pk, candidate, *_ in candidates:
+            score = fuzz.ratio(normalized, candidate)
+            if score > best_score:
+                best_pk, best_score = pk, score
+        return self.filter(pk=best_pk).first() if best_pk else None
+
+
 class Disease(models.Model):
     """Store disease information for medicine search caching"""
     name = models.CharField(max_length=255, unique=True, db_index=True)
@@ -10,15 +77,57 @@ class Disease(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DiseaseQuerySet.as_manager()
+    
     class Meta:
         ordering = ['name']
+        # Trigram index for Disease.objects.match (PostgreSQL only, see migration 0002)
+        indexes = [
+            GinIndex(OpClass('normalized_name', name='gin_trgm_ops'), name='disease_name_trgm'),
+        ]
     
     def __str__(self):
         return self.name
     
     def save(self, *args, **kwargs):
         # Normalize disease name for better matching
-        self.normalized_name = self.name.lower().strip()
+        self.normalized_name = normalize_disease_name(self.name)
+        super().save(*args, **kwargs)
+    
+    def is_stale(self, days=30):
+        """
+        Check if the disease's medicines need a refresh from AI.
+
+        Every refresh saves the DiseaseMedicine of each medicine Gemini returned,
+        so the newest one dates the last refresh; medicines Gemini stopped
+        returning keep their old rows without making the disease stale.
+        """
+        last_refreshed = self.medicine_treatments.aggregate(last=models.Max('updated_at'))['last']
+        if not last_refreshed:
+            return True
+        age = (timezone.now() - last_refreshed).total_seconds()
+        return age > jittered_seconds(days * 86400, self.pk)
+
+
+class DiseaseAlias(models.Model):
+    """Another name for a disease ("high blood pressure" for Hypertension), used when matching searches"""
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=255)
+    normalized_alias = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['alias']
+        verbose_name_plural = 'disease aliases'
+        indexes = [
+            GinIndex(OpClass('normalized_alias', name='gin_trgm_ops'), name='disease_alias_trgm'),
+        ]
+    
+    def __str__(self):
+        return f"{self.alias} -> {self.disease.name}"
+    
+    def save(self, *args, **kwargs):
+        self.normalized_alias = normalize_disease_name(self.alias)
         super().save(*args, **kwargs)
 
 class Medicine(models.Model):
@@ -78,6 +187,9 @@ class Medicine(models.Model):
             models.Index(fields=['generic_name']),
             models.Index(fields=['drug_class']),
             models.Index(fields=['last_searched']),
+            # Case-insensitive name resolution (medications.interactions.resolve_medicines)
+            models.Index(Lower('name'), name='medicine_name_lower'),
+            models.Index(Lower('generic_name'), name='medicine_generic_lower'),
         ]
     
     def __str__(self):
@@ -93,7 +205,8 @@ class Medicine(models.Model):
         """Check if medicine data is stale and needs refresh from AI"""
         if not self.last_updated_from_ai:
             return True
-        return (timezone.now() - self.last_updated_from_ai).days > days
+        age = (timezone.now() - self.last_updated_from_ai).total_seconds()
+        return age > jittered_seconds(days * 86400, self.pk)
     
     def get_brand_names_display(self):
         """Get comma-separated brand names"""
@@ -160,7 +273,7 @@ class MedicineSearchCache(models.Model):
     
     def is_stale(self, hours=24):
         """Check if cache is stale"""
-        return (timezone.now() - self.created_at).total_seconds() > (hours * 3600)
+        return (timezone.now() - self.created_at).total_seconds() > jittered_seconds(hours * 3600, self.normalized_query)
 
 class CachedMedicineResult(models.Model):
     """Through model for MedicineSearchCache and Medicine relationship"""
@@ -181,11 +294,13 @@ class MedicineInteraction(models.Model):
     medicine_b = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='interactions_as_b')
     
     # Interaction Details
+    SEVERITY_NONE = 'none'
     SEVERITY_CHOICES = [
         ('minor', 'Minor'),
         ('moderate', 'Moderate'),
         ('major', 'Major'),
         ('contraindicated', 'Contraindicated'),
+        (SEVERITY_NONE, 'No interaction'),
     ]
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
     description = models.TextField()
@@ -199,6 +314,10 @@ class MedicineInteraction(models.Model):
     # AI and Source Information
     ai_generated = models.BooleanField(default=True)
     ai_confidence = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    expires_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Set on 'no interaction' entries, which are checked again after this time",
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -206,9 +325,23 @@ class MedicineInteraction(models.Model):
     
     class Meta:
         unique_together = ['medicine_a', 'medicine_b']
+        constraints = [
+            # Each pair is stored once, lower medicine id first (see canonical_pair)
+            models.CheckConstraint(condition=models.Q(medicine_a__lt=models.F('medicine_b')), name='interaction_canonical_pair'),
+        ]
     
     def __str__(self):
         return f"{self.medicine_a.name} + {self.medicine_b.name} ({self.severity})"
+    
+    @staticmethod
+    def canonical_pair(medicine_id, other_id):
+        """The (medicine_a_id, medicine_b_id) a pair is stored under, whichever order it is given in"""
+        return (medicine_id, other_id) if medicine_id < other_id else (other_id, medicine_id)
+    
+    def save(self, *args, **kwargs):
+        if self.medicine_a_id and self.medicine_b_id and self.medicine_a_id > self.medicine_b_id:
+            self.medicine_a, self.medicine_b = self.medicine_b, self.medicine_a
+        super().save(*args, **kwargs)
 
 class PatientMedicineHistory(models.Model):
     """Track which medicines were searched/viewed for which patients"""
@@ -0,0 +1,84 @@
+"""
+Single-flight de-duplication for Gemini calls.
+
+When several requests need the same Gemini answer at once (moderators
+searching the same condition, a double-click), only the first one calls
+Gemini. It holds a lock in the shared django-redis cache while the call is in
+flight and publishes the result under a key tied to its lock token, and as the
+key's latest result; the other callers wait for that result instead of
+sending their own request. If the
+leader fails or takes longer than the wait, waiting callers make the call
+themselves, so a lost leader never blocks a search.
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+from typing import Any, Callable
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'medications-flight'
+
+# Longer than a Gemini call with its retries, so the lock outlives a healthy leader
+LOCK_TIMEOUT_SECONDS = 120
+# How long a waiting caller shares the leader's call before making its own
+WAIT_TIMEOUT_SECONDS = 60
+RESULT_TTL_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.25
+
+
+def flight_key(*parts: str) -> str:
+    """A cache-safe key for normalized query parts"""
+    digest = hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:{digest}'
+
+
+def single_flight(key: str, func: Callable[[], Any], wait_timeout: float = WAIT_TIMEOUT_SECONDS) -> Any:
+    """
+    Run func once per key across concurrent callers and return its result to all of them.
+
+    Args:
+        key: From flight_key(), identifying the request
+        func: The call to de-duplicate; its result must be cacheable
+        wait_timeout: Seconds a non-leading caller waits for the leader's result
+    """
+    lock_key = f'{key}:lock'
+    latest_key = f'{key}:result'
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, timeout=LOCK_TIMEOUT_SECONDS):
+        try:
+            result = func()
+            cache.set_many({f'{key}:result:{token}': result, latest_key: result}, timeout=RESULT_TTL_SECONDS)
+            return result
+        finally:
+            # Only release our own lock; it may have expired and been taken by another leader
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    # The leader publishes its result before releasing the lock, so once the lock
+    # is gone the result is either there or the leader failed. A caller that finds
+    # the lock already released no longer knows the leader's token and reads the
+    # latest result instead.
+    leader = cache.get(lock_key)
+    deadline = time.monotonic() + wait_timeout
+    while leader is not None:
+        result = cache.get(f'{key}:result:{leader}')
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            logger.warning(f"Gave up waiting for in-flight request {key}")
+            return func()
+        time.sleep(POLL_INTERVAL_SECONDS)
+        current = cache.get(lock_key)
+        if current is None:
+            result = cache.get(f'{key}:result:{leader}')
+            if result is not None:
+                return result
+            break
+        leader = current
+    result = cache.get(latest_key)
+    return result if result is not None else func()
@@ -0,0 +1,43 @@
+from celery import shared_task
+from django.core.cache import cache
+import logging
+
+from .single_flight import flight_key
+
+logger = logging.getLogger(__name__)
+
+# One background refresh per query in this window, even if Gemini keeps failing
+REFRESH_LOCK_SECONDS = 10 * 60
+
+
+def schedule_disease_refresh(disease_query):
+    """
+    Queue a background refresh of a stale disease search, unless one was queued recently.
+
+    Returns:
+        True if a refresh was queued
+    """
+    lock_key = flight_key('refresh', disease_query)
+    if not cache.add(lock_key, 1, timeout=REFRESH_LOCK_SECONDS):
+        return False
+    try:
+        refresh_disease_search.delay(disease_query)
+    except Exception as e:
+        # Serving the stale result is still fine; let the next request try again
+        cache.delete(lock_key)
+        logger.error(f"Could not queue refresh for {disease_query}: {str(e)}")
+        return False
+    return True
+
+
+@shared_task
+def refresh_disease_search(disease_query):
+    """Fetch a disease search from Gemini again, replacing its stale medicines and cache entry"""
+    from .gemini_service import GeminiMedicineService
+
+    result = GeminiMedicineService().search_medicines_for_disease(disease_query, force_refresh=True)
+    if result.get('success'):
+        logger.info(f"Refreshed medicine search for {disease_query}")
+    else:
+        logger.warning(f"Refresh of medicine search for {disease_query} failed: {result.get('error')}")
+    return bool(result.get('success'))
@@ -71,10 +71,7 @@ def check_drug_interactions(request):
         # Get patient's current medications
         try:
             patient = Patient.objects.get(id=patient_id)
-            current_medications = []
-            
-            if patient.medications:
-                current_medications = [med.strip() for med in patient.medications.split('\n') if med.strip()]
+            current_medications = patient.medication_list
         
         except Patient.DoesNotExist:
             return JsonResponse({
@@ -1,4 +1,4 @@
 from django.contrib import admin
-from .models import Reports, Documentation
+from .models import Reports, Documentation, VitalsAlert, VitalsAlertRule, VitalsExportJob
 
-admin.site.register([Reports, Documentation])
+admin.site.register([Reports, Documentation, VitalsAlertRule, VitalsAlert, VitalsExportJob])
@@ -0,0 +1,243 @@
+"""
+Abnormal-vitals alert rules and notifications.
+
+Readings are evaluated in Celery (see reports.tasks) after they are committed.
+Each patient gets the active rules defined for them, falling back per metric to
+clinic-wide rules and then to DEFAULT_ALERT_RULES. Repeated alerts for the same
+patient and metric are suppressed for VITALS_ALERT_COOLDOWN_MINUTES, and with
+VITALS_ALERT_DIGEST_MINUTES set, alerts are batched into one email per window.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List
+
+import sendgrid
+from sendgrid.helpers.mail import Mail
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import VitalsAlert, VitalsAlertRule
+from .utils import VITAL_METRICS
+
+logger = logging.getLogger('reports.alerts')
+
+ALERT_FROM_EMAIL = 'marketing@pinksurfing.com'
+ALERT_TO_EMAIL = 'shaiqueljilani@gmail.com'  # Admin email
+
+# Used for any metric that has neither a patient-specific nor a clinic-wide rule
+DEFAULT_ALERT_RULES = (
+    ('heart_rate', VitalsAlertRule.OPERATOR_ABOVE, Decimal('110')),
+    ('systolic', VitalsAlertRule.OPERATOR_ABOVE, Decimal('170')),
+    ('spo2', VitalsAlertRule.OPERATOR_BELOW, Decimal('88')),
+)
+
+METRIC_UNITS = {
+    'systolic': 'mmHg',
+    'diastolic': 'mmHg',
+    'heart_rate': 'bpm',
+    'spo2': '%',
+    'temperature': '°F',
+    'blood_glucose': '',
+}
+
+DIGEST_SCHEDULED_CACHE_KEY = 'vitals-alert-digest-scheduled'
+
+
+def cooldown_minutes() -> int:
+    return getattr(settings, 'VITALS_ALERT_COOLDOWN_MINUTES', 60)
+
+
+def digest_minutes() -> int:
+    return getattr(settings, 'VITALS_ALERT_DIGEST_MINUTES', 0)
+
+
+def schedule_alert_evaluation(report_ids: Iterable[Any]):
+    """Queue alert evaluation for reports once the surrounding transaction commits"""
+    from .tasks import evaluate_vitals_alerts
+
+    report_ids = list(report_ids)
+    if not report_ids:
+        return
+    # robust: a broker outage is logged instead of failing the request after commit
+    transaction.on_commit(lambda: evaluate_vitals_alerts.delay(report_ids), robust=True)
+
+
+def _default_rules() -> List[VitalsAlertRule]:
+    return [
+        VitalsAlertRule(metric=metric, operator=operator, threshold=threshold)
+        for metric, operator, threshold in DEFAULT_ALERT_RULES
+    ]
+
+
+def rules_for_patients(patient_ids: Iterable[Any]) -> Dict[Any, List[VitalsAlertRule]]:
+    """
+    Resolve the effective rule set of several patients with one query.
+
+    Returns:
+        {patient_id: [VitalsAlertRule, ...]}
+    """
+    patient_ids = set(patient_ids)
+    rules = VitalsAlertRule.objects.filter(is_active=True).filter(
+        Q(patient_id__in=patient_ids) | Q(patient__isnull=True)
+    )
+
+    patient_rules = defaultdict(lambda: defaultdict(list))
+    clinic_rules = defaultdict(list)
+    for rule in rules:
+        if rule.patient_id is None:
+            clinic_rules[rule.metric].append(rule)
+        else:
+            patient_rules[rule.patient_id][rule.metric].append(rule)
+
+    default_rules = defaultdict(list)
+    for rule in _default_rules():
+        default_rules[rule.metric].append(rule)
+
+    resolved = {}
+    for patient_id in patient_ids:
+        effective = []
+        for metric in VITAL_METRICS:
+            effective.extend(
+                patient_rules[patient_id].get(metric)
+                or clinic_rules.get(metric)
+                or default_rules.get(metric)
+                or []
+            )
+        resolved[patient_id] = effective
+    return resolved
+
+
+def evaluate_reports(reports: Iterable[Any]) -> List[VitalsAlert]:
+    """
+    Check readings against their patients' rules.
+
+    Returns:
+        Unsaved VitalsAlert objects, one per breached metric per reading
+    """
+    reports = list(reports)
+    rules = rules_for_patients(report.patient_id for report in reports)
+
+    alerts = []
+    for report in reports:
+        for rule in rules[report.patient_id]:
+            value = getattr(report, VITAL_METRICS[rule.metric])
+            if not rule.is_breached(value):
+                continue
+            label = rule.get_metric_display()
+            direction = rule.get_operator_display().lower()
+            unit = METRIC_UNITS.get(rule.metric, '')
+            alerts.append(VitalsAlert(
+                patient=report.patient,
+                report=report,
+                metric=rule.metric,
+                value=value,
+                reason=f"{label}: {_number(value)} {unit} ({direction} {_number(rule.threshold)})".replace('  ', ' '),
+            ))
+    return alerts
+
+
+def _number(value) -> str:
+    """A vital or threshold without trailing zeros (Decimal('100.00') -> '100')"""
+    return f"{Decimal(value).normalize():f}"
+
+
+def claim_cooldown(alert: VitalsAlert) -> bool:
+    """
+    Return True if no alert for this patient and metric was sent within the cooldown.
+
+    cache.add is atomic in Redis, so concurrent workers cannot both claim it.
+    """
+    minutes = cooldown_minutes()
+    if minutes <= 0:
+        return True
+    return cache.add(_cooldown_key(alert), timezone.now().isoformat(), timeout=minutes * 60)
+
+
+def release_cooldown(alert: VitalsAlert):
+    """Let the next breach of this patient and metric alert again (its email was never sent)"""
+    cache.delete(_cooldown_key(alert))
+
+
+def _cooldown_key(alert: VitalsAlert) -> str:
+    return f'vitals-alert-cooldown:{alert.patient_id}:{alert.metric}'
+
+
+def claim_digest_schedule() -> bool:
+    """Return True for the first alert of a digest window (that caller schedules the digest)"""
+    return cache.add(DIGEST_SCHEDULED_CACHE_KEY, 1, timeout=digest_minutes() * 60)
+
+
+def _patient_block(patient, alerts: List[VitalsAlert]) -> str:
+    report = alerts[0].report
+    taken_at = None
+    if report is not None:
+        taken_at = report.measurement_timestamp or timezone.localtime(report.created_at).strftime('%Y-%m-%d %H:%M:%S')
+    return f"""
+                <ul>
+                    <li><strong>Patient:</strong> {patient.user.first_name} {patient.user.last_name}</li>
+                    <li><strong>Email:</strong> {patient.user.email}</li>
+                    <li><strong>Mobile Number:</strong> {patient.phone_number}</li>
+                    <li><strong>Date of Birth:</strong> {patient.date_of_birth}</li>
+                </ul>
+
+                <h4>Concerning Vital Signs:</h4>
+                <ul>
+                    {''.join(f'<li><strong>{alert.reason}</strong></li>' for alert in alerts)}
+                </ul>
+
+                <p>This reading was taken at: {taken_at or 'N/A'}</p>
+                """
+
+
+def build_alert_email(alerts: List[VitalsAlert]) -> Dict[str, str]:
+    """
+    Build one email for a batch of alerts (a single reading or a digest).
+
+    Returns:
+        Dict with 'subject' and 'html_content'
+    """
+    by_patient = defaultdict(list)
+    for alert in alerts:
+        by_patient[alert.patient].append(alert)
+
+    if len(by_patient) == 1 and len({alert.report_id for alert in alerts}) == 1:
+        subject = 'ALERT: Abnormal Vital Signs Detected'
+        intro = '<p>The following patient has reported vital signs outside the normal range:</p>'
+    else:
+        subject = f'ALERT DIGEST: {len(alerts)} Abnormal Vital Signs for {len(by_patient)} Patient(s)'
+        intro = '<p>The following patients have reported vital signs outside the normal range:</p>'
+
+    blocks = ''.join(_patient_block(patient, patient_alerts) for patient, patient_alerts in by_patient.items())
+    html_content = f"""
+                <h3>Abnormal Vital Signs Alert</h3>
+                {intro}
+                {blocks}
+                <p>Please review this patient's data and take appropriate action.</p>
+                """
+    return {'subject': subject, 'html_content': html_content}
+
+
+def send_alert_email(alerts: List[VitalsAlert]) -> bool:
+    """Send an email alert to the admin about concerning vital signs"""
+    if not alerts:
+        return False
+    try:
+        email = build_alert_email(alerts)
+        sg = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
+        message = Mail(
+            from_email=ALERT_FROM_EMAIL,
+            to_emails=ALERT_TO_EMAIL,
+            subject=email['subject'],
+            html_content=email['html_content'],
+        )
+        sg.send(message)
+        logger.info(f"Vitals alert email sent for {len(alerts)} alert(s)")
+        return True
+    except Exception as e:
+        logger.error(f"SendGrid error sending vitals alert: {str(e)}")
+        return False
@@ -0,0 +1,252 @@
+"""
+Bulk data exports for analytics.
+
+Each dataset is a flat column list over one model, read with
+``values_list().iterator()`` so exports never instantiate model objects.
+CSV is streamed row by row with ``StreamingHttpResponse``; Parquet is written
+in chunks with pandas/pyarrow to a temporary file (a Parquet footer is only
+known once every row group has been written) and then streamed back. Under
+ASGI both go out through ``reports.streaming.stream_under_asgi``.
+"""
+
+import csv
+import itertools
+import json
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models.functions import Coalesce
+
+EXPORT_FORMAT_CSV = 'csv'
+EXPORT_FORMAT_PARQUET = 'parquet'
+EXPORT_FORMATS = (EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET)
+
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+
+# Rows fetched per database round trip and written per Parquet row group
+EXPORT_CHUNK_SIZE = 5000
+PARQUET_ROW_GROUP_SIZE = 50000
+
+
+def _reports_queryset():
+    from .models import Reports
+
+    return Reports.objects.annotate(reading_time=Coalesce('measured_at', 'manual_datetime', 'created_at'))
+
+
+def _call_summaries_queryset():
+    from retell_calling.models import CallSummary
+
+    return CallSummary.objects.all()
+
+
+def _lead_call_summaries_queryset():
+    from retell_calling.models import LeadCallSummary
+
+    return LeadCallSummary.objects.all()
+
+
+def _lab_results_queryset():
+    from rpm_users.models import LabResult
+
+    return LabResult.objects.all()
+
+
+# Column kinds: int, float, str, datetime, json
+# Each dataset: queryset factory, date column used by since/until, owner filters
+# (query parameter -> lookup) and (column name, lookup, kind) columns in output order
+EXPORT_DATASETS: Dict[str, Dict[str, Any]] = {
+    'reports': {
+        'queryset': _reports_queryset,
+        'date_field': 'reading_time',
+        'filters': {'patient_id': 'patient_id'},
+        'columns': [
+            ('id', 'id', 'int'),
+            ('patient_id', 'patient_id', 'str'),
+            ('reading_time', 'reading_time', 'datetime'),
+            ('created_at', 'created_at', 'datetime'),
+            ('data_type', 'data_type', 'str'),
+            ('serial_number', 'serial_number', 'str'),
+            ('systolic', 'systolic_value', 'int'),
+            ('diastolic', 'diastolic_value', 'int'),
+            ('heart_rate', 'heart_rate_value', 'int'),
+            ('spo2', 'spo2_value', 'int'),
+            ('temperature', 'temperature_value', 'float'),
+            ('blood_glucose', 'blood_glucose_value', 'float'),
+            ('irregular_heartbeat', 'irregular_heartbeat', 'str'),
+            ('symptoms', 'symptoms', 'str'),
+        ],
+    },
+    'call-summaries': {
+        'queryset': _call_summaries_queryset,
+        'date_field': 'generated_at',
+        'filters': {'patient_id': 'patient_id'},
+        'columns': [
+            ('id', 'id', 'str'),
+            ('patient_id', 'patient_id', 'str'),
+            ('call_session_id', 'call_session_id', 'str'),
+            ('retell_call_id', 'call_session__retell_call_id', 'str'),
+            ('call_status', 'call_session__call_status', 'str'),
+            ('duration_ms', 'call_session__duration_ms', 'int'),
+            ('summary_text', 'summary_text', 'str'),
+            ('key_points', 'key_points', 'json'),
+            ('concerning_flags', 'concerning_flags', 'json'),
+            ('health_metrics', 'health_metrics', 'json'),
+            ('ai_confidence_score', 'ai_confidence_score', 'float'),
+            ('generated_at', 'generated_at', 'datetime'),
+        ],
+    },
+    'lead-call-summaries': {
+        'queryset': _lead_call_summaries_queryset,
+        'date_field': 'generated_at',
+        'filters': {'lead_id': 'lead_id'},
+        'columns': [
+            ('id', 'id', 'str'),
+            ('lead_id', 'lead_id', 'int'),
+            ('call_session_id', 'call_session_id', 'str'),
+            ('retell_call_id', 'call_session__retell_call_id', 'str'),
+            ('call_status', 'call_session__call_status', 'str'),
+            ('duration_ms', 'call_session__duration_ms', 'int'),
+            ('summary_text', 'summary_text', 'str'),
+            ('key_points', 'key_points', 'json'),
+            ('concerning_flags', 'concerning_flags', 'json'),
+            ('health_metrics', 'health_metrics', 'json'),
+            ('ai_confidence_score', 'ai_confidence_score', 'float'),
+            ('generated_at', 'generated_at', 'datetime'),
+        ],
+    },
+    'lab-results': {
+        'queryset': _lab_results_queryset,
+        'date_field': 'date_recorded',
+        'filters': {'patient_id': 'patient_id'},
+        'columns': [
+            ('id', 'id', 'int'),
+            ('patient_id', 'patient_id', 'str'),
+            ('category', 'test__category__name', 'str'),
+            ('test', 'test__name', 'str'),
+            ('unit', 'test__unit', 'str'),
+            ('min_range', 'test__min_range', 'str'),
+            ('max_range', 'test__max_range', 'str'),
+            ('value', 'value', 'str'),
+            ('date_recorded', 'date_recorded', 'datetime'),
+            ('recorded_by_id', 'recorded_by_id', 'int'),
+            ('notes', 'notes', 'str'),
+            ('created_at', 'created_at', 'datetime'),
+        ],
+    },
+}
+
+
+def export_rows(dataset: str, since=None, until=None, filters: Optional[Dict[str, str]] = None) -> Iterable[tuple]:
+    """
+    Stream a dataset's rows as tuples in column order, oldest first.
+
+    Args:
+        dataset: Key of EXPORT_DATASETS
+        since: Optional inclusive lower bound on the dataset's date column
+        until: Optional exclusive upper bound on the dataset's date column
+        filters: Owner filters by query parameter name (e.g. {'patient_id': ...}); unknown names are ignored
+
+    Raises:
+        KeyError: If the dataset does not exist
+    """
+    spec = EXPORT_DATASETS[dataset]
+    date_field = spec['date_field']
+    queryset = spec['queryset']()
+    if since is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': until})
+    for param, lookup in spec['filters'].items():
+        if (filters or {}).get(param):
+            queryset = queryset.filter(**{lookup: filters[param]})
+
+    lookups = [lookup for _, lookup, _ in spec['columns']]
+    return queryset.order_by(date_field, 'pk').values_list(*lookups).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def column_names(dataset: str) -> List[str]:
+    return [name for name, _, _ in EXPORT_DATASETS[dataset]['columns']]
+
+
+def _csv_value(value, kind: str):
+    if value is None:
+        return ''
+    if kind == 'json':
+        return json.dumps(value)
+    if kind == 'datetime':
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(dataset: str, rows: Iterable[tuple]) -> Iterable[str]:
+    """CSV lines for StreamingHttpResponse: a header, then one line per row"""
+    kinds = [kind for _, _, kind in EXPORT_DATASETS[dataset]['columns']]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(column_names(dataset))
+    for row in rows:
+        yield writer.writerow([_csv_value(value, kind) for value, kind in zip(row, kinds)])
+
+
+def _parquet_schema(dataset: str):
+    import pyarrow as pa
+
+    types = {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'str': pa.string(),
+        'json': pa.string(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in EXPORT_DATASETS[dataset]['columns']])
+
+
+def _parquet_frame(dataset: str, chunk: List[tuple]):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(chunk, columns=column_names(dataset))
+    for name, _, kind in EXPORT_DATASETS[dataset]['columns']:
+        column = frame[name]
+        if kind == 'datetime':
+            frame[name] = pd.to_datetime(column, utc=True)
+        elif kind == 'float':
+            frame[name] = pd.to_numeric(column, errors='coerce').astype('float64')
+        elif kind == 'int':
+            frame[name] = pd.array(column, dtype='Int64')
+        elif kind == 'json':
+            frame[name] = column.map(lambda value: None if value is None else json.dumps(value))
+        elif kind == 'str':
+            frame[name] = column.map(lambda value: None if value is None else str(value))
+    return frame
+
+
+def write_parquet(dataset: str, rows: Iterable[tuple]):
+    """
+    Write rows to a Parquet temp file one row group at a time.
+
+    Returns:
+        (file positioned at the start, number of rows written)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(dataset)
+    output = tempfile.TemporaryFile()
+    written = 0
+    rows = iter(rows)
+    with pq.ParquetWriter(output, schema, compression='snappy') as writer:
+        while True:
+            chunk = list(itertools.islice(rows, PARQUET_ROW_GROUP_SIZE))
+            if not chunk:
+                break
+            frame = _parquet_frame(dataset, chunk)
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            written += len(chunk)
+    output.seek(0)
+    return output, written
@@ -0,0 +1,294 @@
+"""
+Vitals spreadsheet exports.
+
+Workbooks are built in openpyxl write-only mode: rows are appended straight
+from a ``values_list().iterator()`` query and flushed to a temporary file, so
+memory stays flat however long a patient's history is. Cell formatting uses
+named styles registered once per workbook instead of per-cell style objects.
+"""
+
+import csv
+import io
+import itertools
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+from .utils import VITAL_METRIC_LABELS
+
+# Excel styling constants
+EXCEL_HEADER_COLOR = "7928CA"
+EXCEL_HEADER_FONT_COLOR = "FFFFFF"
+EXCEL_PATIENT_INFO_COLOR = "E0C3FC"
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# (header, Reports column) for the vitals rows, in sheet order
+VITALS_EXPORT_COLUMNS = (
+    ('Date/Time', 'created_at'),
+    # Typed columns already fall back to the legacy "120/80" blood_pressure and heart_rate fields
+    ('Systolic BP (mmHg)', 'systolic_value'),
+    ('Diastolic BP (mmHg)', 'diastolic_value'),
+    ('Heart Rate (bpm)', 'heart_rate_value'),
+    ('SpO2 (%)', 'spo2_value'),
+    ('Temperature (°F)', 'temperature_value'),
+    ('Blood Glucose', 'blood_glucose_value'),
+    ('Irregular Heartbeat', 'irregular_heartbeat'),
+    ('Symptoms', 'symptoms'),
+)
+
+COLUMN_WIDTHS = {'A': 18, 'B': 18, 'C': 20, 'D': 18, 'E': 12, 'F': 18, 'G': 15, 'H': 18, 'I': 30}
+
+SUMMARY_HEADERS = ('Vital', 'Min', 'Max', 'Average', 'Readings', 'Last')
+
+# Patient info and the vitals summary occupy rows 1-8; the vitals table starts at row 9
+HEADER_ROW = 9
+
+STYLE_TITLE = 'vitals_title'
+STYLE_INFO_LABEL = 'vitals_info_label'
+STYLE_SUMMARY_HEADER = 'vitals_summary_header'
+STYLE_SUMMARY_CELL = 'vitals_summary_cell'
+STYLE_HEADER = 'vitals_header'
+STYLE_CELL = 'vitals_cell'
+
+
+def _thin_border():
+    side = Side(style='thin')
+    return Border(left=side, right=side, top=side, bottom=side)
+
+
+def _named_styles():
+    patient_info_fill = PatternFill(start_color=EXCEL_PATIENT_INFO_COLOR, end_color=EXCEL_PATIENT_INFO_COLOR, fill_type="solid")
+    centered = Alignment(horizontal='center', vertical='center')
+    return [
+        NamedStyle(name=STYLE_TITLE, font=Font(bold=True, size=16, color=EXCEL_HEADER_COLOR), alignment=centered),
+        NamedStyle(name=STYLE_INFO_LABEL, font=Font(bold=True, size=11)),
+        NamedStyle(
+            name=STYLE_SUMMARY_HEADER, font=Font(bold=True, size=11),
+            fill=patient_info_fill, border=_thin_border(),
+        ),
+        NamedStyle(name=STYLE_SUMMARY_CELL, border=_thin_border()),
+        NamedStyle(
+            name=STYLE_HEADER,
+            font=Font(bold=True, color=EXCEL_HEADER_FONT_COLOR, size=12),
+            fill=PatternFill(start_color=EXCEL_HEADER_COLOR, end_color=EXCEL_HEADER_COLOR, fill_type="solid"),
+            alignment=centered,
+            border=_thin_border(),
+        ),
+        NamedStyle(
+            name=STYLE_CELL,
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True),
+            border=_thin_border(),
+        ),
+    ]
+
+
+def vitals_workbook() -> Workbook:
+    """Write-only workbook with the vitals named styles registered"""
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def excel_value(value: Any) -> Any:
+    """Cell value for a typed vital or text column; empty string when not recorded"""
+    if value is None:
+        return ''
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def vitals_export_rows(reports) -> Iterable[tuple]:
+    """Stream the export columns of a Reports queryset without instantiating models"""
+    columns = [column for _, column in VITALS_EXPORT_COLUMNS]
+    return reports.values_list(*columns).iterator(chunk_size=2000)
+
+
+def sheet_title(patient) -> str:
+    """Excel sheet names: max 31 chars, no []:*?/\\"""
+    name = f"{patient.user.last_name} {patient.user.first_name}".strip() or 'Patient'
+    return re.sub(r'[\[\]:*?/\\]', '', name)[:31] or 'Patient'
+
+
+def _cell(ws, value, style=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if style:
+        cell.style = style
+    return cell
+
+
+def write_vitals_sheet(wb: Workbook, patient, rows: Iterable[tuple],
+                       summary: Optional[Dict[str, Dict[str, Any]]] = None, title: str = "Vitals Data"):
+    """
+    Append a patient's vitals sheet to a write-only workbook.
+
+    Args:
+        wb: Workbook from vitals_workbook()
+        patient: Patient whose details fill the header block
+        rows: Tuples in VITALS_EXPORT_COLUMNS order (e.g. from vitals_export_rows())
+        summary: Optional VitalsAggregationService.summarize_patient() output, shown at D2:I8
+        title: Sheet name
+
+    Returns:
+        Number of vitals rows written
+    """
+    ws = wb.create_sheet(title=title)
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    # Freeze everything above the first data row
+    ws.freeze_panes = f'A{HEADER_ROW + 1}'
+    ws.merged_cells.add('A1:F1')
+
+    patient_info = {
+        3: ('Patient Name:', f"{patient.user.first_name} {patient.user.last_name}"),
+        4: ('Date of Birth:', str(patient.date_of_birth) if patient.date_of_birth else 'N/A'),
+        5: ('Email:', patient.user.email),
+        6: ('Phone:', patient.phone_number if patient.phone_number else 'N/A'),
+        7: ('Report Generated:', timezone.now().strftime('%m/%d/%Y %H:%M')),
+    }
+    summary_rows = {}
+    if summary is not None:
+        summary_rows[2] = [_cell(ws, header, STYLE_SUMMARY_HEADER) for header in SUMMARY_HEADERS]
+        for offset, (metric, stats) in enumerate(summary.items()):
+            values = [VITAL_METRIC_LABELS[metric], stats['min'], stats['max'], stats['mean'], stats['count'], stats['last']]
+            summary_rows[3 + offset] = [_cell(ws, excel_value(value), STYLE_SUMMARY_CELL) for value in values]
+
+    # Rows 1-8: title, patient info in A:B and the summary in D:I
+    for row_number in range(1, HEADER_ROW):
+        if row_number == 1:
+            left = [_cell(ws, 'PATIENT VITALS REPORT', STYLE_TITLE)]
+        elif row_number in patient_info:
+            label, value = patient_info[row_number]
+            left = [_cell(ws, label, STYLE_INFO_LABEL), value]
+        else:
+            left = []
+        right = summary_rows.get(row_number)
+        ws.append(left + [None] * (3 - len(left)) + right if right else left)
+
+    ws.append([_cell(ws, header, STYLE_HEADER) for header, _ in VITALS_EXPORT_COLUMNS])
+
+    written = 0
+    for row in rows:
+        created_at, *values = row
+        ws.append(
+            [_cell(ws, timezone.localtime(created_at).strftime('%m/%d/%Y %H:%M'), STYLE_CELL)]
+            + [_cell(ws, excel_value(value), STYLE_CELL) for value in values]
+        )
+        written += 1
+    return written
+
+
+def export_file_name(patient, extension: str) -> str:
+    """Archive member name; the patient id keeps names unique across namesakes"""
+    name = re.sub(r'[^\w-]+', '_', f"{patient.user.last_name}_{patient.user.first_name}").strip('_') or 'patient'
+    return f"{name[:60]}_{patient.id}.{extension}"
+
+
+def _export_readings(patients, start, end):
+    from .models import Reports
+
+    return (
+        Reports.objects
+        .filter(patient__in=patients)
+        .annotate(reading_time=Coalesce('measured_at', 'manual_datetime', 'created_at'))
+        .filter(reading_time__gte=start, reading_time__lt=end)
+    )
+
+
+def count_export_patients(patients, start, end) -> int:
+    """Number of patients with readings in [start, end), for progress reporting"""
+    return _export_readings(patients, start, end).values('patient_id').distinct().count()
+
+
+def bulk_export_rows(patients, start, end) -> Iterable[tuple]:
+    """
+    One ordered streaming query over the readings of every patient in the export.
+
+    Rows are (patient_id, reading time, *VITALS_EXPORT_COLUMNS[1:]) ordered by
+    patient and then reading time, so each patient's rows arrive contiguously.
+    """
+    columns = [column for _, column in VITALS_EXPORT_COLUMNS[1:]]
+    return (
+        _export_readings(patients, start, end)
+        .order_by('patient_id', 'reading_time', 'id')
+        .values_list('patient_id', 'reading_time', *columns)
+        .iterator(chunk_size=2000)
+    )
+
+
+def write_vitals_csv(text_file, rows: Iterable[tuple]) -> int:
+    """Write rows in VITALS_EXPORT_COLUMNS order as CSV; returns the number of rows"""
+    writer = csv.writer(text_file)
+    writer.writerow([header for header, _ in VITALS_EXPORT_COLUMNS])
+    written = 0
+    for reading_time, *values in rows:
+        writer.writerow([timezone.localtime(reading_time).strftime('%m/%d/%Y %H:%M')] + [excel_value(v) for v in values])
+        written += 1
+    return written
+
+
+def write_bulk_export(output, patients, start, end, export_format: str = 'xlsx',
+                      on_patient: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """
+    Write a zip with one workbook (or CSV) per patient that has readings in [start, end).
+
+    Args:
+        output: Writable binary file for the zip
+        patients: Patient queryset to export
+        start/end: Reading time range
+        export_format: 'xlsx' or 'csv'
+        on_patient: Called with (patients written, rows written) after each patient
+
+    Returns:
+        Dict with 'patients' and 'rows' counts
+    """
+    patients_by_id = {patient.id: patient for patient in patients.select_related('user')}
+    written_patients = written_rows = 0
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        grouped = itertools.groupby(bulk_export_rows(patients, start, end), key=lambda row: row[0])
+        for patient_id, patient_rows in grouped:
+            patient = patients_by_id[patient_id]
+            rows = (row[1:] for row in patient_rows)
+            if export_format == 'csv':
+                # utf-8-sig so Excel opens the CSV with the right encoding
+                member = archive.open(export_file_name(patient, 'csv'), 'w')
+                with io.TextIOWrapper(member, encoding='utf-8-sig', newline='') as text_file:
+                    count = write_vitals_csv(text_file, rows)
+            else:
+                wb = vitals_workbook()
+                count = write_vitals_sheet(wb, patient, rows, title=sheet_title(patient))
+                with save_to_tempfile(wb) as workbook_file, \
+                        archive.open(export_file_name(patient, 'xlsx'), 'w') as member:
+                    shutil.copyfileobj(workbook_file, member)
+
+            written_patients += 1
+            written_rows += count
+            if on_patient:
+                on_patient(written_patients, written_rows)
+
+    return {'patients': written_patients, 'rows': written_rows}
+
+
+def save_to_tempfile(wb: Workbook):
+    """
+    Save a workbook to an anonymous temporary file positioned at the start.
+
+    The xlsx zip needs a seekable target, so it is assembled on disk and then
+    streamed to the client rather than built in memory.
+    """
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return output
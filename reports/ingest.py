@@ -0,0 +1,294 @@
+"""
+Ingestion of MioConnect device readings.
+
+MioConnect posts one JSON payload per reading. Gateways that reconnect replay
+their backlog, so ``ingest_mio_connect_batch`` accepts many payloads at once,
+resolves every serial number in one lookup and inserts all readings with one
+``bulk_create``.
+
+MioConnect also retries deliveries. Each reading gets an idempotency key
+(serial + device timestamp + data type) backed by a unique index, so a retry
+is a no-op that returns the id of the report stored the first time.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+
+from rpm_users.activity import record_vitals
+from rpm_users.device_resolver import device_serial_resolver, normalize_serial
+
+from .alerts import schedule_alert_evaluation
+from .models import Reports
+from .rollups import schedule_rollup_refresh
+
+logger = logging.getLogger('reports.ingest')
+
+# Per-item error code for a reading that was not stored but can be sent again as is
+RETRY_ERROR_CODE = 409
+
+
+class IngestError(Exception):
+    """A payload that cannot be stored; ``status`` mirrors the single-reading endpoint"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def mio_connect_ingest_key(body: Dict[str, Any]) -> Optional[str]:
+    """
+    Idempotency key of a MioConnect reading.
+
+    Returns:
+        "serial:timestamp:data_type", or None when the payload carries no
+        device timestamp (such readings cannot be told apart from retries)
+    """
+    data = body.get('data', {})
+    device_serial = str(data.get('sn', '') or '').strip()
+    timestamp = str(data.get('ts', '') or body.get('createdAt', '') or '').strip()
+    if not device_serial or not timestamp:
+        return None
+    return f"{device_serial}:{timestamp}:{data.get('data_type', '') or ''}"[:128]
+
+
+def mio_connect_report_fields(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a MioConnect payload onto Reports fields.
+
+    Args:
+        body: Decoded webhook payload ({"deviceId", "createdAt", "data": {...}, ...})
+
+    Returns:
+        Dict of Reports field name -> value (without patient)
+    """
+    data = body.get('data', {})
+
+    # List all possible fields from both device types
+    report_fields = {
+        # Common
+        'device_id': body.get('deviceId', ''),
+        'created_at_device': str(body.get('createdAt', '')),
+        'data_type': data.get('data_type', ''),
+        'imei': data.get('imei', ''),
+        'iccid': data.get('iccid', ''),
+        'serial_number': data.get('sn', ''),
+        'model_number': body.get('modelNumber', ''),
+        'is_test': str(body.get('isTest', '')),
+        # Sphygmomanometer
+        'user_id': str(data.get('user', '')),
+        'systolic_blood_pressure': str(data.get('sys', '')),
+        'diastolic_blood_pressure': str(data.get('dia', '')),
+        'pulse': str(data.get('pul', '')),
+        'irregular_heartbeat': str(data.get('ihb', '')),
+        'hand_shaking': str(data.get('hand', '')),
+        'triple_mode': str(data.get('tri', '')),
+        'battery_level': str(data.get('bat', '')),
+        'signal_strength': str(data.get('sig', '')),
+        'measurement_timestamp': str(data.get('ts', '')),
+        'timezone': str(data.get('tz', '')),
+        # Blood Glucose Meter
+        'blood_glucose': str(data.get('data', '')),
+        'glucose_unit': str(data.get('unit', '')),
+        'test_paper_type': str(data.get('sample', '')),
+        'sample_type': str(data.get('target', '')),
+        'meal_mark': str(data.get('meal', '')),
+        'signal_level': str(data.get('sig_lvl', '')),
+        'measurement_timezone': str(data.get('ts_tz', '')),
+        'upload_timestamp': str(data.get('uptime', '')),
+        'upload_timezone': str(data.get('uptime_tz', '')),
+        'ingest_key': mio_connect_ingest_key(body),
+    }
+
+    # For compatibility, also fill old fields if possible
+    if report_fields['systolic_blood_pressure'] and report_fields['diastolic_blood_pressure']:
+        report_fields['blood_pressure'] = f"{report_fields['systolic_blood_pressure']}/{report_fields['diastolic_blood_pressure']}"
+    else:
+        report_fields['blood_pressure'] = ''
+    report_fields['heart_rate'] = report_fields['pulse']
+    report_fields['spo2'] = ''
+    report_fields['temperature'] = ''
+    report_fields['symptoms'] = ''
+    return report_fields
+
+
+def payload_serial(body: Any) -> str:
+    """
+    Extract the device serial number from a payload.
+
+    Raises:
+        IngestError: If the payload is not an object or has no serial number
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('data', {}), dict):
+        raise IngestError("Invalid payload: expected a JSON object with a 'data' object")
+    device_serial = str(body.get('data', {}).get('sn', '') or '').strip()
+    if not device_serial:
+        raise IngestError("Missing device serial number")
+    return device_serial
+
+
+def existing_report_ids(keys) -> Dict[str, int]:
+    """Map idempotency keys that are already stored to their report ids"""
+    keys = [key for key in keys if key]
+    if not keys:
+        return {}
+    return dict(Reports.objects.filter(ingest_key__in=keys).values_list('ingest_key', 'id'))
+
+
+def store_mio_connect_reading(patient_id: Any, body: Dict[str, Any]) -> Tuple[int, bool]:
+    """
+    Store one MioConnect reading unless it was already stored.
+
+    Returns:
+        (report_id, created) - for a retried reading, the id of the original report and False
+    """
+    report_fields = mio_connect_report_fields(body)
+    ingest_key = report_fields['ingest_key']
+    if ingest_key:
+        existing = existing_report_ids([ingest_key])
+        if existing:
+            return existing[ingest_key], False
+
+    try:
+        # Savepoint, so a concurrent retry that won the race does not break the outer transaction
+        with transaction.atomic():
+            # Typed vitals, alerts and rollups are handled by Reports.save()
+            report = Reports.objects.create(patient_id=patient_id, **report_fields)
+    except IntegrityError:
+        existing = existing_report_ids([ingest_key])
+        if not existing:
+            raise
+        return existing[ingest_key], False
+    return report.id, True
+
+
+def schedule_post_ingest(reports: List[Reports]):
+    """
+    Queue alert evaluation and rollup refreshes for bulk-created reports.
+
+    bulk_create bypasses Reports.save() and post_save, so this does what they
+    would, with one rollup refresh per patient and hour instead of one per
+    reading and one activity summary update per patient.
+    """
+    schedule_alert_evaluation([report.pk for report in reports])
+    record_vitals(reports)
+
+    reading_times = defaultdict(list)
+    for report in reports:
+        reading_times[report.patient_id].append(report.measured_at)
+    for patient_id, times in reading_times.items():
+        schedule_rollup_refresh(patient_id, *times)
+
+
+def ingest_mio_connect_batch(payloads: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Store a batch of MioConnect payloads.
+
+    Invalid items and unknown devices are reported per item and do not prevent
+    the rest of the batch from being stored.
+
+    Args:
+        payloads: Decoded webhook payloads
+
+    Returns:
+        One result per payload, in order: {'index', 'status', ...}
+        status is 'created' or 'duplicate' (with report_id, patient_id)
+        or 'error' (with error, code; RETRY_ERROR_CODE if the item can be retried)
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(payloads)
+    serials = {}
+    for index, body in enumerate(payloads):
+        try:
+            serials[index] = payload_serial(body)
+        except IngestError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': e.message, 'code': e.status}
+
+    # Cached serial -> patient lookups; at most one query for serials not seen recently
+    patients = device_serial_resolver.resolve_many(serials.values())
+
+    pending = []
+    for index, device_serial in serials.items():
+        patient_id = patients.get(normalize_serial(device_serial))
+        if patient_id is None:
+            results[index] = {
+                'index': index,
+                'status': 'error',
+                'error': f"No patient found with device serial number: {device_serial}",
+                'code': 404,
+            }
+            continue
+        report = Reports(patient_id=patient_id, **mio_connect_report_fields(payloads[index]))
+        report.populate_typed_vitals()
+        pending.append((index, report))
+
+    already_stored = existing_report_ids(report.ingest_key for _, report in pending)
+
+    # Retries of stored readings, and repeats of the same reading within this batch
+    keyed, unkeyed, duplicates = {}, [], []
+    for index, report in pending:
+        if report.ingest_key in already_stored or report.ingest_key in keyed:
+            duplicates.append((index, report))
+        elif report.ingest_key:
+            keyed[report.ingest_key] = (index, report)
+        else:
+            unkeyed.append((index, report))
+
+    created, lost, missing = [], set(), set()
+    if keyed or unkeyed:
+        with transaction.atomic():
+            created = Reports.objects.bulk_create([report for _, report in unkeyed])
+            # Insert-or-ignore: a concurrent retry may have stored some of these keys since the
+            # lookup above, and ignore_conflicts does not return primary keys, so read them back.
+            # bulk_create stamped each of our rows with its own created_at; a stored row with a
+            # different one was inserted by the retry that won the race.
+            Reports.objects.bulk_create([report for _, report in keyed.values()], ignore_conflicts=True)
+            stored = {
+                key: (report_id, created_at)
+                for key, report_id, created_at in Reports.objects.filter(ingest_key__in=keyed)
+                .values_list('ingest_key', 'id', 'created_at')
+            }
+            for key, (index, report) in keyed.items():
+                report.pk, created_at = stored.get(key, (None, None))
+                if report.pk is None:
+                    # Ignored as a conflict, but the row it conflicted with is gone again
+                    missing.add(key)
+                    continue
+                if created_at == report.created_at:
+                    created.append(report)
+                else:
+                    lost.add(key)
+            schedule_post_ingest(created)
+
+    for index, report in list(keyed.values()) + unkeyed + duplicates:
+        if report.ingest_key in missing:
+            results[index] = {
+                'index': index,
+                'status': 'error',
+                'error': "Reading was not stored because of a concurrent change; retry it",
+                'code': RETRY_ERROR_CODE,
+            }
+    for index, report in list(keyed.values()) + unkeyed:
+        if report.ingest_key in missing:
+            continue
+        results[index] = {
+            'index': index,
+            'status': 'duplicate' if report.ingest_key in lost else 'created',
+            'report_id': report.pk,
+            'patient_id': report.patient_id,
+        }
+    for index, report in duplicates:
+        if report.ingest_key in missing:
+            continue
+        results[index] = {
+            'index': index,
+            'status': 'duplicate',
+            'report_id': already_stored.get(report.ingest_key) or keyed[report.ingest_key][1].pk,
+            'patient_id': report.patient_id,
+        }
+
+    stored_count = sum(1 for result in results if result['status'] == 'created')
+    logger.info(f"MioConnect batch: {stored_count} of {len(payloads)} readings stored")
+    return results
@@ -0,0 +1,239 @@
+"""
+Write-ahead buffer for MioConnect readings.
+
+With MIO_CONNECT_INGEST_MODE = 'buffered' the webhook validates a reading,
+appends it to a Redis stream (Redis runs with appendonly, so accepted readings
+survive a restart) and returns 202 without touching Postgres. The
+``drain_mio_connect_stream`` Celery task reads the stream through a consumer
+group, stores readings in batches with ``ingest_mio_connect_batch`` and only
+acknowledges entries once they are committed.
+
+Delivery is at-least-once: entries left pending by a crashed worker are
+reclaimed after STREAM_RECLAIM_IDLE_MS, and the idempotency key on Reports
+turns redelivered readings into no-ops. Entries that keep failing are moved
+to a dead-letter stream after STREAM_MAX_DELIVERIES attempts.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from .ingest import RETRY_ERROR_CODE, ingest_mio_connect_batch
+
+logger = logging.getLogger('reports.ingest_buffer')
+
+INGEST_MODE_SYNC = 'sync'
+INGEST_MODE_BUFFERED = 'buffered'
+
+STREAM_RECLAIM_IDLE_MS = 60 * 1000
+STREAM_MAX_DELIVERIES = 5
+
+# At most one drain task is queued per interval however many readings arrive
+DRAIN_KICK_CACHE_KEY = 'reports-ingest-stream-drain-kick'
+DRAIN_KICK_INTERVAL_SECONDS = 1
+
+
+def buffering_enabled() -> bool:
+    return getattr(settings, 'MIO_CONNECT_INGEST_MODE', INGEST_MODE_SYNC) == INGEST_MODE_BUFFERED
+
+
+def stream_key() -> str:
+    return settings.MIO_CONNECT_STREAM_KEY
+
+
+def dead_letter_key() -> str:
+    return f'{stream_key()}:dead'
+
+
+def group_name() -> str:
+    return settings.MIO_CONNECT_STREAM_GROUP
+
+
+def consumer_name() -> str:
+    """Unique per worker process, so pending entries can be traced to (and reclaimed from) it"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+def ensure_group(conn):
+    """Create the stream and consumer group on first use"""
+    try:
+        conn.xgroup_create(stream_key(), group_name(), id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def enqueue_reading(body: Dict[str, Any]) -> str:
+    """
+    Append a validated MioConnect payload to the ingest stream.
+
+    Returns:
+        Stream entry id
+    """
+    conn = get_connection()
+    entry_id = conn.xadd(
+        stream_key(),
+        {'payload': json.dumps(body), 'received_at': str(time.time())},
+        maxlen=settings.MIO_CONNECT_STREAM_MAXLEN,
+        approximate=True,
+    )
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+
+def request_drain():
+    """Queue a drain soon after a reading is buffered (beat is the fallback if this fails)"""
+    from .tasks import drain_mio_connect_stream
+
+    try:
+        if cache.add(DRAIN_KICK_CACHE_KEY, 1, timeout=DRAIN_KICK_INTERVAL_SECONDS):
+            drain_mio_connect_stream.delay()
+    except Exception as e:
+        logger.error(f"Failed to queue ingest stream drain: {str(e)}")
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _decode_entries(entries) -> List[Tuple[str, Dict[str, str]]]:
+    return [
+        (_decode(entry_id), {_decode(k): _decode(v) for k, v in (fields or {}).items()})
+        for entry_id, fields in entries
+    ]
+
+
+def _dead_letter(conn, entries: List[Tuple[str, Dict[str, str]]], reason: str):
+    for entry_id, fields in entries:
+        conn.xadd(dead_letter_key(), {**fields, 'entry_id': entry_id, 'reason': reason})
+    conn.xack(stream_key(), group_name(), *[entry_id for entry_id, _ in entries])
+    logger.error(f"Moved {len(entries)} ingest stream entries to {dead_letter_key()}: {reason}")
+
+
+def _reclaim(conn, consumer: str, count: int) -> List[Tuple[str, Dict[str, str]]]:
+    """Take over entries another consumer read but never acknowledged"""
+    overdue = conn.xpending_range(
+        stream_key(), group_name(), min='-', max='+', count=count, idle=STREAM_RECLAIM_IDLE_MS,
+    )
+    if not overdue:
+        return []
+
+    exhausted = [item for item in overdue if item['times_delivered'] >= STREAM_MAX_DELIVERIES]
+    retry_ids = [item['message_id'] for item in overdue if item['times_delivered'] < STREAM_MAX_DELIVERIES]
+
+    if exhausted:
+        claimed = conn.xclaim(
+            stream_key(), group_name(), consumer, STREAM_RECLAIM_IDLE_MS,
+            [item['message_id'] for item in exhausted],
+        )
+        _dead_letter(conn, _decode_entries(claimed), f'failed {STREAM_MAX_DELIVERIES} deliveries')
+
+    if not retry_ids:
+        return []
+    claimed = conn.xclaim(stream_key(), group_name(), consumer, STREAM_RECLAIM_IDLE_MS, retry_ids)
+    # Entries trimmed from the stream come back without fields; nothing left to store
+    return [entry for entry in _decode_entries(claimed) if entry[1]]
+
+
+def _store(conn, entries: List[Tuple[str, Dict[str, str]]]) -> int:
+    """Store a batch of entries and acknowledge them; unparseable entries go to the dead-letter stream"""
+    payloads, entry_ids, malformed = [], [], []
+    for entry_id, fields in entries:
+        try:
+            payloads.append(json.loads(fields['payload']))
+            entry_ids.append(entry_id)
+        except (KeyError, ValueError):
+            malformed.append((entry_id, fields))
+
+    if malformed:
+        _dead_letter(conn, malformed, 'malformed payload')
+    if not payloads:
+        return 0
+
+    # Raises on database errors; the entries then stay pending and are reclaimed later
+    results = ingest_mio_connect_batch(payloads)
+    # Readings that can be retried stay pending, so they are reclaimed and stored later
+    done = [
+        entry_id for entry_id, result in zip(entry_ids, results)
+        if result['status'] != 'error' or result['code'] != RETRY_ERROR_CODE
+    ]
+    if done:
+        conn.xack(stream_key(), group_name(), *done)
+
+    for entry_id, result in zip(entry_ids, results):
+        if result['status'] == 'error' and result['code'] != RETRY_ERROR_CODE:
+            logger.warning(f"Dropped ingest stream entry {entry_id}: {result['error']}")
+    return sum(1 for result in results if result['status'] == 'created')
+
+
+def drain_stream(batch_size: int = 500, max_batches: int = 20) -> Dict[str, int]:
+    """
+    Move buffered readings from the stream into Reports.
+
+    Args:
+        batch_size: Entries read (and bulk-inserted) at a time
+        max_batches: Upper bound per call so one task run stays short
+
+    Returns:
+        Dict with 'read' and 'created' counts
+    """
+    conn = get_connection()
+    ensure_group(conn)
+    consumer = consumer_name()
+    read = created = 0
+
+    entries = _reclaim(conn, consumer, batch_size)
+    for _ in range(max_batches):
+        if not entries:
+            response = conn.xreadgroup(group_name(), consumer, {stream_key(): '>'}, count=batch_size)
+            entries = _decode_entries(response[0][1]) if response else []
+        if not entries:
+            break
+        read += len(entries)
+        created += _store(conn, entries)
+        entries = []
+
+    return {'read': read, 'created': created}
+
+
+def stream_lag() -> Dict[str, Any]:
+    """
+    Backlog of the ingest stream.
+
+    Returns:
+        Dict with 'length' (entries kept in the stream), 'lag' (entries not yet
+        read by the consumer group; None on Redis < 7), 'pending' (read but unacknowledged),
+        'oldest_pending_seconds' and 'dead_letters'
+    """
+    conn = get_connection()
+    ensure_group(conn)
+
+    group = next(
+        (info for info in conn.xinfo_groups(stream_key()) if _decode(info['name']) == group_name()),
+        {},
+    )
+    oldest_pending_seconds = None
+    pending = conn.xpending(stream_key(), group_name())
+    if pending['pending']:
+        # Stream ids start with the millisecond timestamp the entry was added at
+        oldest_ms = int(_decode(pending['min']).split('-')[0])
+        oldest_pending_seconds = round(time.time() - oldest_ms / 1000, 1)
+
+    return {
+        'length': conn.xlen(stream_key()),
+        'lag': group.get('lag'),
+        'pending': pending['pending'],
+        'oldest_pending_seconds': oldest_pending_seconds,
+        'dead_letters': conn.xlen(dead_letter_key()),
+    }
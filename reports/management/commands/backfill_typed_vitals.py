@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from reports.models import Reports
+from reports.utils import backfill_typed_vitals
+
+
+class Command(BaseCommand):
+    help = 'Parse the text vitals of existing reports into the typed numeric columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of reports to convert per batch (default: 1000)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-convert every report, not only the ones that were never converted',
+        )
+        parser.add_argument(
+            '--patient',
+            help='Only convert reports of the patient with this ID',
+        )
+
+    def handle(self, *args, **options):
+        reports = Reports.objects.all()
+        if not options['all']:
+            reports = reports.filter(measured_at__isnull=True)
+        if options['patient']:
+            reports = reports.filter(patient_id=options['patient'])
+
+        total = reports.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS('All reports already have typed vitals. Nothing to do.'))
+            return
+
+        self.stdout.write(f'Converting {total} reports in chunks of {options["chunk_size"]}...')
+        updated = backfill_typed_vitals(
+            reports,
+            chunk_size=options['chunk_size'],
+            progress=lambda done: self.stdout.write(f'  {done}/{total}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Successfully converted {updated} reports'))
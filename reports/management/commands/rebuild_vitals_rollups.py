@@ -0,0 +1,63 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from reports.models import Reports
+from reports.rollups import rebuild_rollups
+from reports.services import VitalsAggregationService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly/daily vitals rollups for a date range from raw reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First day to rebuild (YYYY-MM-DD). Defaults to the oldest reading.',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to rebuild, inclusive (YYYY-MM-DD). Defaults to today.',
+        )
+        parser.add_argument(
+            '--patient',
+            action='append',
+            help='Only rebuild rollups for this patient ID (can be repeated)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rollup rows per bulk insert (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        start_date = self._parse_date(options['start'], '--start')
+        end_date = self._parse_date(options['end'], '--end') or timezone.localdate()
+
+        if start_date is None:
+            oldest = Reports.objects.aggregate(
+                oldest=Min(VitalsAggregationService.reading_time_expression())
+            )['oldest']
+            if oldest is None:
+                self.stdout.write(self.style.WARNING('No reports found. Nothing to rebuild.'))
+                return
+            start_date = timezone.localtime(oldest).date()
+
+        if start_date > end_date:
+            raise CommandError('--start must not be after --end')
+
+        start = timezone.make_aware(datetime.combine(start_date, time.min))
+        end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+        self.stdout.write(f'Rebuilding vitals rollups from {start_date} to {end_date}...')
+        written = rebuild_rollups(start, end, patient_ids=options['patient'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote {written} rollup rows'))
+
+    def _parse_date(self, value, option):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'{option} must be in YYYY-MM-DD format')
@@ -0,0 +1,129 @@
+from django.core.management.base import BaseCommand, CommandError
+from contextlib import nullcontext
+
+from reports.replay import external_stubs, load_capture, run_replay, summarize, test_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay captured requests (JSONL) against the Django test client or a running server '
+        'and report throughput, latency percentiles and per-endpoint query counts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='JSONL file with one {"method", "path", "headers", "body"} request per line')
+        parser.add_argument(
+            '--target',
+            help='Base URL of a running server (e.g. http://localhost:8000). '
+                 'Defaults to the in-process test client, which also counts queries and '
+                 'runs against a freshly created test database, never the configured one.',
+        )
+        parser.add_argument(
+            '--fixture',
+            action='append',
+            default=[],
+            help='Fixture loaded into the test database before a test client replay (repeatable), '
+                 'e.g. the patients whose device serials the capture uses',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Reuse the test database between test client replays instead of recreating it',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Requests per second across all workers (default: 0, as fast as possible)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Concurrent workers (default: 1)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1,
+            help='Times to replay the capture, e.g. to simulate a gateway backlog burst (default: 1)',
+        )
+        parser.add_argument(
+            '--vary-timestamps',
+            action='store_true',
+            help='Shift MioConnect device timestamps on each repeat so readings are stored instead of de-duplicated',
+        )
+        parser.add_argument(
+            '--no-stubs',
+            action='store_true',
+            help='Let the test client reach the real SendGrid, Retell and Gemini APIs',
+        )
+        parser.add_argument(
+            '--stub-latency-ms',
+            type=int,
+            default=0,
+            help='Delay added to every stubbed SendGrid/Retell/Gemini response (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['repeat'] < 1:
+            raise CommandError('--concurrency and --repeat must be at least 1')
+
+        try:
+            requests_, skipped = load_capture(options['capture'])
+        except OSError as e:
+            raise CommandError(f'Cannot read capture: {e}')
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} lines that are not captured requests'))
+        if not requests_:
+            self.stdout.write(self.style.WARNING('No requests to replay.'))
+            return
+
+        target = options['target']
+        self.stdout.write(
+            f"Replaying {len(requests_)} requests x{options['repeat']} against "
+            f"{target or 'the test client (on a test database)'} with {options['concurrency']} worker(s)..."
+        )
+
+        replay_kwargs = {
+            'target': target,
+            'rate': options['rate'],
+            'concurrency': options['concurrency'],
+            'repeat': options['repeat'],
+            'vary': options['vary_timestamps'],
+        }
+        # The test client writes through this process's database connections
+        database = nullcontext() if target else test_database(options['fixture'], options['keepdb'])
+        with database:
+            if target or options['no_stubs']:
+                result = run_replay(requests_, **replay_kwargs)
+                stub_calls = None
+            else:
+                with external_stubs(options['stub_latency_ms']) as stub:
+                    result = run_replay(requests_, **replay_kwargs)
+                    stub_calls = stub.calls
+
+        self._report(summarize(result), stub_calls)
+
+    def _report(self, summary, stub_calls):
+        self.stdout.write('')
+        header = f"{'Endpoint':<55} {'Count':>6} {'Err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Queries':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint, stats in summary['endpoints'].items():
+            queries = '-' if stats['mean_queries'] is None else f"{stats['mean_queries']}/{stats['max_queries']}"
+            self.stdout.write(
+                f"{endpoint[:55]:<55} {stats['count']:>6} {stats['errors']:>5} "
+                f"{stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f} {queries:>9}"
+            )
+            statuses = ', '.join(f'{status}: {count}' for status, count in sorted(stats['statuses'].items()))
+            self.stdout.write(f"    status codes: {statuses}")
+
+        if stub_calls:
+            calls = ', '.join(f'{service or "unknown"}: {count}' for service, count in sorted(stub_calls.items()))
+            self.stdout.write(f'Stubbed external calls: {calls}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {summary['total']} requests in {summary['elapsed']:.2f}s "
+            f"({summary['throughput']:.1f} req/s); queries shown as mean/max per request"
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0020_add_manual_datetime_field'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reports',
+            name='blood_glucose_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='diastolic_value',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='heart_rate_value',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='measured_at',
+            field=models.DateTimeField(blank=True, help_text='Parsed time the vitals were taken', null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='spo2_value',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='systolic_value',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reports',
+            name='temperature_value',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reports',
+            index=models.Index(fields=['patient', 'measured_at'], name='reports_rep_patient_cf9e4f_idx'),
+        ),
+    ]
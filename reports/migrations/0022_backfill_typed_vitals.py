@@ -0,0 +1,150 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+from django.utils import timezone
+
+# Frozen copies of the reports.utils parsers as they were when this migration
+# was written, so later changes to the app code cannot change what it does
+
+SMALLINT_MIN = -32768
+SMALLINT_MAX = 32767
+EPOCH_MILLIS_THRESHOLD = 10 ** 12
+MEASUREMENT_DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+)
+TYPED_VITALS_FIELDS = (
+    'systolic_value',
+    'diastolic_value',
+    'heart_rate_value',
+    'spo2_value',
+    'temperature_value',
+    'blood_glucose_value',
+    'measured_at',
+)
+CHUNK_SIZE = 1000
+
+
+def parse_decimal_vital(value, max_digits=None, decimal_places=None):
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ('none', 'null', 'nan'):
+        return None
+    try:
+        number = Decimal(text)
+    except (InvalidOperation, ValueError):
+        return None
+    if not number.is_finite():
+        return None
+    # Check the exponent first: "1e30" cannot be quantized to the column scale
+    if max_digits is not None and number and number.adjusted() >= max_digits - (decimal_places or 0):
+        return None
+    if decimal_places is not None:
+        try:
+            number = number.quantize(Decimal(1).scaleb(-decimal_places))
+        except InvalidOperation:
+            return None
+    if max_digits is not None and len(number.as_tuple().digits) > max_digits:
+        return None
+    return number
+
+
+def parse_int_vital(value):
+    number = parse_decimal_vital(value)
+    # Compare before int(): int(Decimal("1e400000000")) builds a 400-million-digit integer
+    if number is None or not (SMALLINT_MIN <= number <= SMALLINT_MAX):
+        return None
+    return int(number)
+
+
+def split_blood_pressure(bp_string):
+    if not bp_string or '/' not in bp_string:
+        return '', ''
+    parts = bp_string.split('/')
+    return parts[0].strip(), parts[1].strip()
+
+
+def parse_measurement_datetime(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ('none', 'null'):
+        return None
+
+    if text.isdigit():
+        epoch = int(text)
+        if epoch >= EPOCH_MILLIS_THRESHOLD:
+            epoch = epoch / 1000
+        try:
+            return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    for fmt in MEASUREMENT_DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    return None
+
+
+def first_parsed(parser, *values):
+    for value in values:
+        parsed = parser(value)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def compute_typed_vitals(report):
+    legacy_systolic, legacy_diastolic = split_blood_pressure(report.blood_pressure)
+
+    measured_at = report.manual_datetime
+    if measured_at is None and report.data_type != 'manual_entry':
+        measured_at = (
+            parse_measurement_datetime(report.measurement_timestamp)
+            or parse_measurement_datetime(report.created_at_device)
+        )
+
+    return {
+        'systolic_value': first_parsed(parse_int_vital, report.systolic_blood_pressure, legacy_systolic),
+        'diastolic_value': first_parsed(parse_int_vital, report.diastolic_blood_pressure, legacy_diastolic),
+        'heart_rate_value': first_parsed(parse_int_vital, report.pulse, report.heart_rate),
+        'spo2_value': parse_int_vital(report.spo2),
+        'temperature_value': parse_decimal_vital(report.temperature, max_digits=5, decimal_places=2),
+        'blood_glucose_value': parse_decimal_vital(report.blood_glucose, max_digits=7, decimal_places=2),
+        'measured_at': measured_at or report.created_at or timezone.now(),
+    }
+
+
+def forwards(apps, schema_editor):
+    Reports = apps.get_model('reports', 'Reports')
+    queryset = Reports.objects.filter(measured_at__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for report in chunk:
+            for field, value in compute_typed_vitals(report).items():
+                setattr(report, field, value)
+        Reports.objects.bulk_update(chunk, TYPED_VITALS_FIELDS)
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Chunks are committed as they go instead of holding one transaction
+    # over the whole reports table
+    atomic = False
+
+    dependencies = [
+        ('reports', '0021_reports_typed_vitals'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
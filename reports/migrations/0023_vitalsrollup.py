@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0022_backfill_typed_vitals'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the hour/day (local time) this bucket covers')),
+                ('metric', models.CharField(max_length=20)),
+                ('reading_count', models.PositiveIntegerField(default=0)),
+                ('min_value', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('max_value', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('sum_value', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('last_value', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('last_measured_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vitals_rollups', to='rpm_users.patient')),
+            ],
+            options={
+                'ordering': ['bucket_start', 'metric'],
+                'indexes': [models.Index(fields=['patient', 'resolution', 'bucket_start'], name='reports_vit_patient_3f4832_idx')],
+                'constraints': [models.UniqueConstraint(fields=('patient', 'resolution', 'bucket_start', 'metric'), name='unique_vitals_rollup_bucket')],
+            },
+        ),
+    ]
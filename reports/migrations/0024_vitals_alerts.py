@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0023_vitalsrollup'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalsAlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('systolic', 'Systolic BP (mmHg)'), ('diastolic', 'Diastolic BP (mmHg)'), ('heart_rate', 'Heart Rate (bpm)'), ('spo2', 'SpO2 (%)'), ('temperature', 'Temperature (°F)'), ('blood_glucose', 'Blood Glucose')], max_length=20)),
+                ('operator', models.CharField(choices=[('gt', 'Above'), ('lt', 'Below')], max_length=2)),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(blank=True, help_text='Leave empty for a clinic-wide rule', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vitals_alert_rules', to='rpm_users.patient')),
+            ],
+            options={
+                'ordering': ['metric', 'operator'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VitalsAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('systolic', 'Systolic BP (mmHg)'), ('diastolic', 'Diastolic BP (mmHg)'), ('heart_rate', 'Heart Rate (bpm)'), ('spo2', 'SpO2 (%)'), ('temperature', 'Temperature (°F)'), ('blood_glucose', 'Blood Glucose')], max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('reason', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, help_text='When the alert email (or digest) was sent', null=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vitals_alerts', to='rpm_users.patient')),
+                ('report', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alerts', to='reports.reports')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['notified_at', 'created_at'], name='reports_vit_notifie_3fcc7b_idx')],
+            },
+        ),
+    ]
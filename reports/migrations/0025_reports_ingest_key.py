@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0024_vitals_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reports',
+            name='ingest_key',
+            field=models.CharField(blank=True, help_text='Idempotency key of device readings', max_length=128, null=True, unique=True),
+        ),
+    ]
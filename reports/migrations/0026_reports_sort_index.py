@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:35
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0025_reports_ingest_key'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reports',
+            index=models.Index(models.F('patient'), models.OrderBy(django.db.models.functions.comparison.Coalesce('manual_datetime', 'created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), name='reports_patient_sort_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:46
+
+import django.db.models.deletion
+import reports.models
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0026_reports_sort_index'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalsExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('scope', models.CharField(choices=[('moderator', "Moderator's patients"), ('clinic', 'All patients')], default='moderator', max_length=10)),
+                ('export_format', models.CharField(choices=[('xlsx', 'Excel (one workbook per patient)'), ('csv', 'CSV (one file per patient)')], default='xlsx', max_length=4)),
+                ('start', models.DateTimeField(help_text='Inclusive lower bound of the reading time')),
+                ('end', models.DateTimeField(help_text='Exclusive upper bound of the reading time')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_patients', models.PositiveIntegerField(default=0)),
+                ('processed_patients', models.PositiveIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('file', models.FileField(blank=True, null=True, storage=reports.models.vitals_export_storage, upload_to='vitals/')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('moderator', models.ForeignKey(blank=True, help_text='Whose assigned patients are exported (moderator scope)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vitals_export_jobs', to='rpm_users.moderator')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vitals_export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0027_vitals_export_job'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reports',
+            index=models.Index(fields=['patient', '-created_at'], name='reports_rep_patient_403a5c_idx'),
+        ),
+    ]
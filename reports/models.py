@@ -1,8 +1,10 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Coalesce
 import uuid
-import sendgrid
-from sendgrid.helpers.mail import Mail
-from rpm.secrets import SENDGRID_API_KEY
+from .utils import compute_typed_vitals, VITAL_METRIC_LABELS
 # Create your models here.
 class Reports(models.Model):
     patient = models.ForeignKey('rpm_users.Patient', on_delete=models.CASCADE, related_name='reports')
@@ -47,6 +49,30 @@ class Reports(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # Manual datetime field - for manually entered reports with custom date/time
     manual_datetime = models.DateTimeField(blank=True, null=True, help_text="Manual date/time for when vitals were taken")
+    # Typed vitals - parsed from the text fields above on every save so reads can aggregate in SQL
+    systolic_value = models.SmallIntegerField(blank=True, null=True)
+    diastolic_value = models.SmallIntegerField(blank=True, null=True)
+    heart_rate_value = models.SmallIntegerField(blank=True, null=True)
+    spo2_value = models.SmallIntegerField(blank=True, null=True)
+    temperature_value = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    blood_glucose_value = models.DecimalField(max_digits=7, decimal_places=2, blank=True, null=True)
+    measured_at = models.DateTimeField(blank=True, null=True, help_text="Parsed time the vitals were taken")
+    # Device serial + device timestamp + data type; makes webhook retries insert-or-ignore
+    ingest_key = models.CharField(max_length=128, blank=True, null=True, unique=True, help_text="Idempotency key of device readings")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'measured_at']),
+            # Latest reading per patient (moderator patient list)
+            models.Index(fields=['patient', '-created_at']),
+            # Backs the keyset-paginated vitals history (VitalsHistoryService)
+            models.Index(
+                F('patient'),
+                Coalesce('manual_datetime', 'created_at').desc(),
+                F('id').desc(),
+                name='reports_patient_sort_idx',
+            ),
+        ]
     
     @property
     def effective_datetime(self):
@@ -60,71 +86,198 @@ class Reports(models.Model):
         # Check if this is a new record (not yet saved)
         is_new = self.pk is None
         
+        # Keep the typed vitals columns in sync with the raw text fields
+        self.populate_typed_vitals()
+        
         # Save the model first
         super().save(*args, **kwargs)
         
-        # If this is a new record, check the vitals
+        # Evaluate abnormal-vitals alerts in Celery once the reading is committed,
+        # so the device webhook never waits on the email provider
         if is_new:
-            self.check_vitals_and_send_alert()
-    
-    def check_vitals_and_send_alert(self):
-        """Check if any vital signs are outside safe ranges and send an alert if needed"""
-        alert_needed = False
-        alert_reasons = []
+            from .alerts import schedule_alert_evaluation
+            schedule_alert_evaluation([self.pk])
         
-        # Check heart rate (pulse) - above 110 is concerning
-        if self.pulse and int(self.pulse) > 110:
-            alert_needed = True
-            alert_reasons.append(f"Heart Rate: {self.pulse} bpm (above 110)")
-        # Check systolic blood pressure - above 170 is concerning
-        if self.systolic_blood_pressure and int(self.systolic_blood_pressure) > 170:
-            alert_needed = True
-            alert_reasons.append(f"Systolic BP: {self.systolic_blood_pressure} mmHg (above 170)")
-        
-        # Check oxygen saturation - below 88 is concerning
-        if self.spo2 and int(self.spo2) < 88:
-            alert_needed = True
-            alert_reasons.append(f"Oxygen Saturation: {self.spo2}% (below 88%)")
+        # Refresh the hourly/daily rollup buckets this reading falls into (and the ones
+        # it was moved out of) once it is committed
+        from .rollups import schedule_rollup_refresh
+        previous_patient_id, previous_measured_at = getattr(self, '_loaded_rollup_bucket', (None, None))
+        if previous_patient_id is not None and previous_patient_id != self.patient_id:
+            schedule_rollup_refresh(previous_patient_id, previous_measured_at)
+            previous_measured_at = None
+        schedule_rollup_refresh(self.patient_id, self.measured_at, previous_measured_at)
+        self._loaded_rollup_bucket = (self.patient_id, self.measured_at)
+    
+    def populate_typed_vitals(self):
+        """Parse the text vitals into the typed columns (legacy fields are used as fallback)"""
+        for field, value in compute_typed_vitals(self).items():
+            setattr(self, field, value)
+
+
+class VitalsRollup(models.Model):
+    """Pre-aggregated vitals per patient, metric and hour/day bucket"""
+    RESOLUTION_HOUR = 'hour'
+    RESOLUTION_DAY = 'day'
+    RESOLUTION_CHOICES = (
+        (RESOLUTION_HOUR, 'Hour'),
+        (RESOLUTION_DAY, 'Day'),
+    )
+    patient = models.ForeignKey('rpm_users.Patient', on_delete=models.CASCADE, related_name='vitals_rollups')
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField(help_text="Start of the hour/day (local time) this bucket covers")
+    metric = models.CharField(max_length=20)
+    reading_count = models.PositiveIntegerField(default=0)
+    min_value = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
+    max_value = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
+    # Sum instead of mean so buckets can be combined into longer ranges exactly
+    sum_value = models.DecimalField(max_digits=14, decimal_places=2, blank=True, null=True)
+    last_value = models.DecimalField(max_digits=9, decimal_places=2, blank=True, null=True)
+    last_measured_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['bucket_start', 'metric']
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'resolution', 'bucket_start', 'metric'], name='unique_vitals_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['patient', 'resolution', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient_id} - {self.metric} {self.resolution} {self.bucket_start:%Y-%m-%d %H:%M}"
+    
+    @property
+    def mean_value(self):
+        if not self.reading_count or self.sum_value is None:
+            return None
+        return self.sum_value / self.reading_count
+
+
+class VitalsAlertRule(models.Model):
+    """Threshold that raises an abnormal-vitals alert; patient-specific rules override clinic-wide ones"""
+    OPERATOR_ABOVE = 'gt'
+    OPERATOR_BELOW = 'lt'
+    OPERATOR_CHOICES = (
+        (OPERATOR_ABOVE, 'Above'),
+        (OPERATOR_BELOW, 'Below'),
+    )
+    METRIC_CHOICES = tuple(VITAL_METRIC_LABELS.items())
+    patient = models.ForeignKey('rpm_users.Patient', on_delete=models.CASCADE, related_name='vitals_alert_rules', blank=True, null=True, help_text="Leave empty for a clinic-wide rule")
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    operator = models.CharField(max_length=2, choices=OPERATOR_CHOICES)
+    threshold = models.DecimalField(max_digits=7, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['metric', 'operator']
+    
+    def __str__(self):
+        scope = str(self.patient) if self.patient_id else 'All patients'
+        return f"{scope}: {self.get_metric_display()} {self.get_operator_display().lower()} {self.threshold}"
+    
+    def is_breached(self, value):
+        if value is None:
+            return False
+        if self.operator == self.OPERATOR_ABOVE:
+            return value > self.threshold
+        return value < self.threshold
+
+
+class VitalsAlert(models.Model):
+    """An abnormal reading that was (or is waiting to be) reported by email"""
+    patient = models.ForeignKey('rpm_users.Patient', on_delete=models.CASCADE, related_name='vitals_alerts')
+    report = models.ForeignKey(Reports, on_delete=models.SET_NULL, related_name='alerts', blank=True, null=True)
+    metric = models.CharField(max_length=20, choices=VitalsAlertRule.METRIC_CHOICES)
+    value = models.DecimalField(max_digits=7, decimal_places=2)
+    reason = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(blank=True, null=True, help_text="When the alert email (or digest) was sent")
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['notified_at', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} - {self.reason}"
+
+
+def vitals_export_storage():
+    """Export archives hold PHI, so they live outside MEDIA_ROOT (which nginx serves publicly)"""
+    return FileSystemStorage(location=settings.VITALS_EXPORT_ROOT)
+
+
+class VitalsExportJob(models.Model):
+    """A multi-patient vitals export built in Celery and downloaded as a zip"""
+    SCOPE_MODERATOR = 'moderator'
+    SCOPE_CLINIC = 'clinic'
+    SCOPE_CHOICES = (
+        (SCOPE_MODERATOR, "Moderator's patients"),
+        (SCOPE_CLINIC, 'All patients'),
+    )
+    FORMAT_XLSX = 'xlsx'
+    FORMAT_CSV = 'csv'
+    FORMAT_CHOICES = (
+        (FORMAT_XLSX, 'Excel (one workbook per patient)'),
+        (FORMAT_CSV, 'CSV (one file per patient)'),
+    )
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='vitals_export_jobs')
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default=SCOPE_MODERATOR)
+    moderator = models.ForeignKey(
+        'rpm_users.Moderator', on_delete=models.SET_NULL, related_name='vitals_export_jobs', blank=True, null=True,
+        help_text="Whose assigned patients are exported (moderator scope)",
+    )
+    export_format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default=FORMAT_XLSX)
+    start = models.DateTimeField(help_text="Inclusive lower bound of the reading time")
+    end = models.DateTimeField(help_text="Exclusive upper bound of the reading time")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_patients = models.PositiveIntegerField(default=0)
+    processed_patients = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(storage=vitals_export_storage, upload_to='vitals/', blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Vitals export {self.start:%Y-%m-%d} - {self.end:%Y-%m-%d} ({self.status})"
+    
+    def patient_queryset(self):
+        """Patients covered by the export scope"""
+        from rpm_users.models import Patient
         
-        # If any vital signs are outside safe ranges, send an alert
-        if alert_needed:
-            self.send_alert_email(alert_reasons)
-    
-    def send_alert_email(self, alert_reasons):
-        """Send an email alert to the admin about concerning vital signs"""
-        try:
-            sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
-            message = Mail(
-                from_email='marketing@pinksurfing.com',
-                to_emails='shaiqueljilani@gmail.com',  # Admin email
-                subject='ALERT: Abnormal Vital Signs Detected',
-                html_content=f"""
-                <h3>Abnormal Vital Signs Alert</h3>
-                <p>The following patient has reported vital signs outside the normal range:</p>
-                
-                <ul>
-                    <li><strong>Patient:</strong> {self.patient.user.first_name} {self.patient.user.last_name}</li>
-                    <li><strong>Email:</strong> {self.patient.user.email}</li>
-                    <li><strong>Mobile Number:</strong> {self.patient.phone_number}</li>
-                    <li><strong>Date of Birth:</strong> {self.patient.date_of_birth}</li>
-                </ul>
-                
-                <h4>Concerning Vital Signs:</h4>
-                <ul>
-                    {''.join(f'<li><strong>{reason}</strong></li>' for reason in alert_reasons)}
-                </ul>
-                
-                <p>This reading was taken at: {self.measurement_timestamp or self.created_at.strftime('%Y-%m-%d %H:%M:%S')}</p>
-                
-                <p>Please review this patient's data and take appropriate action.</p>
-                """,
-            )
-            
-            sg.send(message)
-            print(f"Alert email sent for patient {self.patient.user.first_name} {self.patient.user.last_name}")
-        except Exception as e:
-            print(f"SendGrid error: {e}")
+        if self.scope == self.SCOPE_CLINIC:
+            return Patient.objects.all()
+        return Patient.objects.filter(moderator_assigned=self.moderator)
     
+    @property
+    def progress(self):
+        """Percentage of patients written so far"""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        if not self.total_patients:
+            return 0
+        return int(self.processed_patients * 100 / self.total_patients)
+
+
 class Documentation(models.Model):
     TITLE_CHOICES = (
         ('Behavioural note', 'Behavioural note'),
@@ -0,0 +1,473 @@
+"""
+Replay captured HTTP requests for load testing.
+
+A capture is a JSONL file with one request per line:
+
+    {"method": "POST", "path": "/reports/data-telemetry/", "headers": {...}, "body": {...}}
+
+``body`` may be a JSON value or a string; ``name`` optionally overrides the
+endpoint label used in the report. Lines that are not request objects are
+skipped, so annotated captures can be replayed as they are.
+
+Requests go either through the Django test client (in process, with
+per-endpoint query counts and the outbound Gemini, Retell and SendGrid calls
+redirected to a local stub server) or to a running server over HTTP.
+
+Client mode writes through the configured database, so it only runs inside
+``test_database()``: a freshly created test database (seeded from fixtures),
+never the development or production database of the settings module. Celery
+tasks queued by the replayed requests run in process there too, so no worker
+on the configured broker looks up test-database ids in its own database.
+"""
+
+import json
+import logging
+import math
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.core.management import call_command
+from django.test.utils import setup_databases, teardown_databases
+
+logger = logging.getLogger('reports.replay')
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Outbound hosts answered by the stub server in client mode
+STUB_HOSTS = {
+    'api.sendgrid.com': 'sendgrid',
+    'api.retellai.com': 'retell',
+    'generativelanguage.googleapis.com': 'gemini',
+}
+
+STUB_HOST_HEADER = 'X-Stub-Host'
+
+ID_SEGMENT_RE = re.compile(
+    r'/(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?=/|$)',
+    re.IGNORECASE,
+)
+
+
+def endpoint_label(method: str, path: str) -> str:
+    """Group requests by route: "POST /reports/get-single-report/{id}/" """
+    return f"{method} {ID_SEGMENT_RE.sub('/{id}', urlsplit(path).path)}"
+
+
+def load_capture(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Read a JSONL capture.
+
+    Returns:
+        (requests, skipped line count)
+    """
+    requests_, skipped = [], 0
+    with open(path, encoding='utf-8') as capture:
+        for line in capture:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if (
+                not isinstance(entry, dict)
+                or str(entry.get('method', '')).upper() not in HTTP_METHODS
+                or not str(entry.get('path', '')).startswith('/')
+            ):
+                skipped += 1
+                continue
+
+            method = entry['method'].upper()
+            headers = {str(k): str(v) for k, v in (entry.get('headers') or {}).items()}
+            body = entry.get('body')
+            requests_.append({
+                'method': method,
+                'path': entry['path'],
+                'headers': headers,
+                'body': body,
+                'endpoint': entry.get('name') or endpoint_label(method, entry['path']),
+            })
+    return requests_, skipped
+
+
+def vary_timestamps(body: Any, offset: int) -> Any:
+    """
+    Shift MioConnect device timestamps so repeated readings are not de-duplicated.
+
+    Args:
+        body: Request body (only MioConnect payloads or lists of them are changed)
+        offset: Seconds to add (the repeat number)
+    """
+    if offset == 0:
+        return body
+    if isinstance(body, list):
+        return [vary_timestamps(item, offset) for item in body]
+    if not isinstance(body, dict) or not isinstance(body.get('data'), dict):
+        return body
+    body = {**body, 'data': dict(body['data'])}
+    if str(body['data'].get('ts', '')).isdigit():
+        body['data']['ts'] = int(body['data']['ts']) + offset
+    if str(body.get('createdAt', '')).isdigit():
+        body['createdAt'] = int(body['createdAt']) + offset * 1000
+    return body
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        service = self.headers.get(STUB_HOST_HEADER, '')
+        with self.server.lock:
+            self.server.calls[service] = self.server.calls.get(service, 0) + 1
+            call_number = self.server.calls[service]
+
+        status, payload = 200, {}
+        if service == 'sendgrid':
+            status = 202
+        elif service == 'retell':
+            payload = {'call_id': f'stub-call-{call_number}', 'call_status': 'registered'}
+            if self.command == 'GET':
+                payload.update({'call_status': 'ended', 'transcript': '', 'call_analysis': {}})
+        elif service == 'gemini':
+            payload = {'candidates': [{'content': {'parts': [{'text': '{}'}]}}]}
+
+        body = json.dumps(payload).encode() if payload else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Local HTTP server that answers SendGrid, Retell and Gemini calls with canned responses"""
+
+    def __init__(self, latency_ms: int = 0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.latency = latency_ms / 1000
+        self.server.calls = {}
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def calls(self) -> Dict[str, int]:
+        return dict(self.server.calls)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _stub_url(url: str, base_url: str) -> Tuple[str, Optional[str]]:
+    parts = urlsplit(url)
+    service = STUB_HOSTS.get(parts.hostname or '')
+    if service is None:
+        return url, None
+    query = f'?{parts.query}' if parts.query else ''
+    return f'{base_url}{parts.path}{query}', service
+
+
+@contextmanager
+def external_stubs(latency_ms: int = 0):
+    """
+    Redirect outbound SendGrid, Retell and Gemini calls made in this process to a StubServer.
+
+    Covers ``requests`` (Retell, Gemini REST), ``python_http_client`` (SendGrid)
+    and ``google.generativeai`` (Retell transcript processing).
+    """
+    import requests
+    from python_http_client.client import Client as SendGridHttpClient
+
+    stub = StubServer(latency_ms).start()
+    original_send = requests.adapters.HTTPAdapter.send
+    original_make_request = SendGridHttpClient._make_request
+
+    def send(adapter, request, *args, **kwargs):
+        request.url, service = _stub_url(request.url, stub.base_url)
+        if service:
+            request.headers[STUB_HOST_HEADER] = service
+        return original_send(adapter, request, *args, **kwargs)
+
+    def make_request(client, opener, request, timeout=None):
+        request.full_url, service = _stub_url(request.full_url, stub.base_url)
+        if service:
+            request.add_header(STUB_HOST_HEADER, service)
+        return original_make_request(client, opener, request, timeout)
+
+    def generate_content(model, *args, **kwargs):
+        requests.post(f'{stub.base_url}/generate', headers={STUB_HOST_HEADER: 'gemini'}, timeout=30)
+        return SimpleNamespace(text='{}')
+
+    patches = [
+        mock.patch.object(requests.adapters.HTTPAdapter, 'send', send),
+        mock.patch.object(SendGridHttpClient, '_make_request', make_request),
+    ]
+    try:
+        import google.generativeai as genai
+        patches.append(mock.patch.object(genai.GenerativeModel, 'generate_content', generate_content))
+    except ImportError:
+        pass
+
+    for patch in patches:
+        patch.start()
+    try:
+        yield stub
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+        stub.stop()
+
+
+@contextmanager
+def eager_tasks():
+    """Run Celery tasks in process instead of publishing them to the configured broker"""
+    from rpm.celery import app
+
+    previous = app.conf.task_always_eager
+    app.conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        app.conf.task_always_eager = previous
+
+
+@contextmanager
+def test_database(fixtures: Iterable[str] = (), keepdb: bool = False):
+    """
+    Run a client-mode replay against a test database instead of the configured one.
+
+    Creates (or with keepdb, reuses) the test databases the test runner would
+    use, loads fixtures into them and destroys them afterwards unless keepdb.
+    Celery tasks run in process meanwhile (see eager_tasks()).
+    """
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+    try:
+        fixtures = list(fixtures)
+        if fixtures:
+            call_command('loaddata', *fixtures, verbosity=0)
+        with eager_tasks():
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+
+
+class _ClientSender:
+    """Send requests through the Django test client, counting queries per request"""
+
+    count_queries = True
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, request: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            # 'testserver' is not in ALLOWED_HOSTS outside the test runner
+            client = self.local.client = Client(SERVER_NAME='localhost')
+
+        extra = {
+            f"HTTP_{name.upper().replace('-', '_')}": value
+            for name, value in request['headers'].items()
+            if name.lower() != 'content-type'
+        }
+        content_type = request['headers'].get('Content-Type') or request['headers'].get('content-type') or 'application/json'
+        data = request['body']
+        if data is not None and not isinstance(data, str):
+            data = json.dumps(data)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(
+                request['method'], request['path'], data or '', content_type=content_type, **extra
+            )
+        return response.status_code, len(queries)
+
+    def close(self):
+        from django.db import connection
+        connection.close()
+
+
+class _HttpSender:
+    """Send requests to a running server"""
+
+    count_queries = False
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def __call__(self, request: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+        import requests
+
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+
+        headers = dict(request['headers'])
+        data = request['body']
+        if data is not None and not isinstance(data, str):
+            data = json.dumps(data)
+            headers.setdefault('Content-Type', 'application/json')
+        response = session.request(
+            request['method'], f"{self.base_url}{request['path']}",
+            data=data, headers=headers, timeout=self.timeout,
+        )
+        return response.status_code, None
+
+    def close(self):
+        session = getattr(self.local, 'session', None)
+        if session is not None:
+            session.close()
+
+
+def run_replay(requests_: List[Dict[str, Any]], target: Optional[str] = None, rate: float = 0,
+               concurrency: int = 1, repeat: int = 1, vary: bool = False) -> Dict[str, Any]:
+    """
+    Replay requests and collect per-request measurements.
+
+    Args:
+        requests_: Output of load_capture()
+        target: Base URL of a running server, or None for the in-process test
+            client (call inside test_database(), the requests write to the database)
+        rate: Requests per second across all workers (0 = as fast as possible)
+        concurrency: Worker threads
+        repeat: Times to replay the whole capture
+        vary: Shift MioConnect timestamps on repeats so they are stored, not de-duplicated
+
+    Returns:
+        Dict with 'samples' [(endpoint, status, latency_seconds, queries)] and 'elapsed'
+    """
+    sender = _HttpSender(target) if target else _ClientSender()
+
+    work = queue.Queue()
+    for round_number in range(repeat):
+        for request in requests_:
+            if vary:
+                request = {**request, 'body': vary_timestamps(request['body'], round_number)}
+            work.put(request)
+    total = work.qsize()
+
+    samples = []
+    samples_lock = threading.Lock()
+    schedule = {'next': 0}
+    schedule_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def wait_for_slot():
+        if not rate:
+            return
+        with schedule_lock:
+            slot = schedule['next']
+            schedule['next'] += 1
+        delay = started + slot / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    request = work.get_nowait()
+                except queue.Empty:
+                    return
+                wait_for_slot()
+                request_started = time.perf_counter()
+                try:
+                    status, queries = sender(request)
+                except Exception as e:
+                    logger.error(f"Replay of {request['endpoint']} failed: {str(e)}")
+                    status, queries = 0, None
+                latency = time.perf_counter() - request_started
+                with samples_lock:
+                    samples.append((request['endpoint'], status, latency, queries))
+        finally:
+            sender.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(concurrency, total or 1)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {'samples': samples, 'elapsed': time.perf_counter() - started}
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aggregate replay samples.
+
+    Returns:
+        {'total', 'elapsed', 'throughput', 'endpoints': {endpoint: {...}}}
+        Each endpoint has count, errors, statuses, p50/p95/p99 (ms) and, in
+        client mode, mean_queries/max_queries.
+    """
+    by_endpoint = {}
+    for endpoint, status, latency, queries in result['samples']:
+        by_endpoint.setdefault(endpoint, []).append((status, latency, queries))
+
+    endpoints = {}
+    for endpoint, samples in sorted(by_endpoint.items()):
+        latencies = sorted(latency * 1000 for _, latency, _ in samples)
+        query_counts = [queries for _, _, queries in samples if queries is not None]
+        statuses = {}
+        for status, _, _ in samples:
+            statuses[status] = statuses.get(status, 0) + 1
+        endpoints[endpoint] = {
+            'count': len(samples),
+            'errors': sum(1 for status, _, _ in samples if status == 0 or status >= 500),
+            'statuses': statuses,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean_queries': round(sum(query_counts) / len(query_counts), 1) if query_counts else None,
+            'max_queries': max(query_counts) if query_counts else None,
+        }
+
+    total = len(result['samples'])
+    elapsed = result['elapsed']
+    return {
+        'total': total,
+        'elapsed': elapsed,
+        'throughput': total / elapsed if elapsed else 0,
+        'endpoints': endpoints,
+    }
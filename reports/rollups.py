@@ -0,0 +1,297 @@
+"""
+Hourly and daily vitals rollups.
+
+Every saved, moved or deleted reading refreshes the hour and day buckets it
+falls (or fell) into in Celery after the transaction commits, so dashboards
+and billing can read a handful of rollup rows instead of scanning raw
+Reports. ``rebuild_rollups`` recomputes whole ranges from raw rows with a
+single ordered streaming query.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from rpm.transactions import on_commit_batched
+
+from .models import Reports, VitalsRollup
+from .services import VITAL_METRICS, VitalsAggregationService
+
+logger = logging.getLogger('reports.rollups')
+
+RESOLUTIONS = (VitalsRollup.RESOLUTION_HOUR, VitalsRollup.RESOLUTION_DAY)
+
+ROLLUP_UPDATE_FIELDS = [
+    'reading_count', 'min_value', 'max_value', 'sum_value',
+    'last_value', 'last_measured_at', 'updated_at',
+]
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Start of the local-time hour or day containing ``moment``"""
+    local = timezone.localtime(moment)
+    if resolution == VitalsRollup.RESOLUTION_HOUR:
+        return local.replace(minute=0, second=0, microsecond=0)
+    return timezone.make_aware(datetime.combine(local.date(), time.min))
+
+
+def bucket_end(start: datetime, resolution: str) -> datetime:
+    """Exclusive end of the bucket starting at ``start`` (DST-aware for days)"""
+    if resolution == VitalsRollup.RESOLUTION_HOUR:
+        return start + timedelta(hours=1)
+    next_day = timezone.localtime(start).date() + timedelta(days=1)
+    return timezone.make_aware(datetime.combine(next_day, time.min))
+
+
+def _reading_rows(reports):
+    """
+    Stream (patient_id, reading_time, *metric values) ordered by patient and time.
+
+    ``reports`` must already be annotated with ``reading_time``.
+    """
+    columns = list(VITAL_METRICS.values())
+    return (
+        reports.order_by('patient_id', 'reading_time', 'id')
+        .values_list('patient_id', 'reading_time', *columns)
+        .iterator(chunk_size=2000)
+    )
+
+
+def _accumulate(rows: Iterable[Tuple], resolutions: Iterable[str]) -> Dict[Tuple, Dict[str, Any]]:
+    """
+    Fold ordered reading rows into bucket statistics.
+
+    Returns:
+        {(patient_id, resolution, bucket_start, metric): stats}
+    """
+    resolutions = list(resolutions)
+    metrics = list(VITAL_METRICS)
+    buckets = {}
+
+    for patient_id, reading_time, *values in rows:
+        starts = {resolution: bucket_start(reading_time, resolution) for resolution in resolutions}
+        for metric, value in zip(metrics, values):
+            if value is None:
+                continue
+            value = Decimal(value)
+            for resolution, start in starts.items():
+                key = (patient_id, resolution, start, metric)
+                stats = buckets.get(key)
+                if stats is None:
+                    buckets[key] = {
+                        'reading_count': 1,
+                        'min_value': value,
+                        'max_value': value,
+                        'sum_value': value,
+                        'last_value': value,
+                        'last_measured_at': reading_time,
+                    }
+                    continue
+                stats['reading_count'] += 1
+                stats['min_value'] = min(stats['min_value'], value)
+                stats['max_value'] = max(stats['max_value'], value)
+                stats['sum_value'] += value
+                # Rows arrive in reading-time order, so the latest one wins
+                stats['last_value'] = value
+                stats['last_measured_at'] = reading_time
+
+    return buckets
+
+
+def _rollup_objects(buckets: Dict[Tuple, Dict[str, Any]]):
+    return [
+        VitalsRollup(
+            patient_id=patient_id,
+            resolution=resolution,
+            bucket_start=start,
+            metric=metric,
+            **stats,
+        )
+        for (patient_id, resolution, start, metric), stats in buckets.items()
+    ]
+
+
+def refresh_rollups_for_reading(patient_id: Any, reading_time: datetime, hour_starts: Iterable[datetime] = ()):
+    """
+    Recompute the hour and day buckets containing one reading.
+
+    ``hour_starts`` names further hour buckets of the same day to recompute
+    from the same scan.
+
+    Recomputing the bucket from its raw rows (instead of incrementing counters)
+    keeps the rollups correct when readings are edited and makes concurrent
+    refreshes of the same bucket converge on the committed data.
+    """
+    day_start = bucket_start(reading_time, VitalsRollup.RESOLUTION_DAY)
+    day_end = bucket_end(day_start, VitalsRollup.RESOLUTION_DAY)
+    targets = {(VitalsRollup.RESOLUTION_DAY, day_start)}
+    targets.update(
+        (VitalsRollup.RESOLUTION_HOUR, bucket_start(moment, VitalsRollup.RESOLUTION_HOUR))
+        for moment in (reading_time, *hour_starts)
+    )
+
+    reports = VitalsAggregationService().windowed_reports([patient_id], day_start, day_end)
+    buckets = _accumulate(_reading_rows(reports), RESOLUTIONS)
+    buckets = {
+        key: stats for key, stats in buckets.items()
+        if (key[1], key[2]) in targets
+    }
+
+    with transaction.atomic():
+        # Drop metrics that no longer have readings in these buckets (or the whole
+        # bucket, when its last reading was deleted or moved out)
+        for resolution, start in targets:
+            VitalsRollup.objects.filter(
+                patient_id=patient_id,
+                resolution=resolution,
+                bucket_start=start,
+            ).exclude(
+                metric__in=[key[3] for key in buckets if key[1:3] == (resolution, start)]
+            ).delete()
+
+        VitalsRollup.objects.bulk_create(
+            _rollup_objects(buckets),
+            update_conflicts=True,
+            unique_fields=['patient', 'resolution', 'bucket_start', 'metric'],
+            update_fields=ROLLUP_UPDATE_FIELDS,
+        )
+
+
+def schedule_rollup_refresh(patient_id: Any, *reading_times: Optional[datetime]):
+    """
+    Queue a refresh of the hour and day buckets containing readings once the surrounding transaction commits.
+
+    Buckets scheduled during one transaction are sent to Celery as a single
+    refresh_vitals_rollups task, one entry per patient and hour.
+    """
+    buckets = {
+        (str(patient_id), bucket_start(reading_time, VitalsRollup.RESOLUTION_HOUR).isoformat())
+        for reading_time in reading_times if patient_id and reading_time is not None
+    }
+    # A broker outage is logged; rebuild_vitals_rollups repairs the missed buckets
+    on_commit_batched('vitals_rollups', buckets, _enqueue_refresh)
+
+
+def _enqueue_refresh(buckets):
+    from .tasks import refresh_vitals_rollups
+
+    refresh_vitals_rollups.delay(buckets)
+
+
+def refresh_rollup_buckets(buckets: Iterable[Tuple[Any, datetime]]) -> int:
+    """
+    Recompute buckets from (patient_id, reading time) pairs, once per patient and day.
+
+    Returns:
+        Number of buckets refreshed
+    """
+    days = {}
+    for patient_id, reading_time in buckets:
+        day = (patient_id, bucket_start(reading_time, VitalsRollup.RESOLUTION_DAY))
+        days.setdefault(day, set()).add(bucket_start(reading_time, VitalsRollup.RESOLUTION_HOUR))
+
+    for (patient_id, _), hours in days.items():
+        refresh_rollups_for_reading(patient_id, min(hours), hours)
+    return sum(len(hours) for hours in days.values())
+
+
+def rebuild_rollups(start: datetime, end: datetime, patient_ids: Optional[Iterable[Any]] = None,
+                    batch_size: int = 1000) -> int:
+    """
+    Rebuild all rollups between two datetimes from raw reports.
+
+    The range is widened to whole local days so no bucket is half rebuilt.
+
+    Args:
+        start: Inclusive start of the range
+        end: Exclusive end of the range
+        patient_ids: Optional patients to restrict the rebuild to
+        batch_size: Rollup rows per bulk insert
+
+    Returns:
+        Number of rollup rows written
+    """
+    start = bucket_start(start, VitalsRollup.RESOLUTION_DAY)
+    last_day = bucket_start(end - timedelta(microseconds=1), VitalsRollup.RESOLUTION_DAY)
+    end = bucket_end(last_day, VitalsRollup.RESOLUTION_DAY)
+
+    reports = Reports.objects.all()
+    rollups = VitalsRollup.objects.filter(bucket_start__gte=start, bucket_start__lt=end)
+    if patient_ids is not None:
+        patient_ids = list(patient_ids)
+        reports = reports.filter(patient_id__in=patient_ids)
+        rollups = rollups.filter(patient_id__in=patient_ids)
+    reports = reports.annotate(
+        reading_time=VitalsAggregationService.reading_time_expression()
+    ).filter(reading_time__gte=start, reading_time__lt=end)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+
+        # Rows are ordered by patient, so a patient's buckets are complete once
+        # the next patient starts and can be flushed to keep memory bounded
+        pending_rows = []
+        current_patient = None
+        for row in _reading_rows(reports):
+            if row[0] != current_patient and pending_rows:
+                written += _flush(pending_rows, batch_size)
+                pending_rows = []
+            current_patient = row[0]
+            pending_rows.append(row)
+        if pending_rows:
+            written += _flush(pending_rows, batch_size)
+
+    return written
+
+
+def _flush(rows, batch_size):
+    objects = _rollup_objects(_accumulate(rows, RESOLUTIONS))
+    VitalsRollup.objects.bulk_create(objects, batch_size=batch_size)
+    return len(objects)
+
+
+def rollup_series(patient, resolution: str, start=None, end=None):
+    """
+    Rollup buckets for a patient grouped by bucket start.
+
+    Returns:
+        List of {'bucket_start', 'metrics': {metric: {'min', 'max', 'mean', 'count', 'last'}}}
+    """
+    rollups = VitalsRollup.objects.filter(patient=patient, resolution=resolution)
+    if start is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(start, resolution))
+    if end is not None:
+        rollups = rollups.filter(bucket_start__lt=end)
+
+    series = []
+    for rollup in rollups.order_by('-bucket_start', 'metric'):
+        if not series or series[-1]['bucket_start'] != rollup.bucket_start:
+            series.append({'bucket_start': rollup.bucket_start, 'metrics': {}})
+        mean = rollup.mean_value
+        series[-1]['metrics'][rollup.metric] = {
+            'min': float(rollup.min_value) if rollup.min_value is not None else None,
+            'max': float(rollup.max_value) if rollup.max_value is not None else None,
+            'mean': round(float(mean), 1) if mean is not None else None,
+            'count': rollup.reading_count,
+            'last': float(rollup.last_value) if rollup.last_value is not None else None,
+        }
+    return series
+
+
+def days_with_readings(patient, start=None, end=None) -> int:
+    """Number of distinct local days with at least one reading (RPM billing)"""
+    rollups = VitalsRollup.objects.filter(
+        patient=patient,
+        resolution=VitalsRollup.RESOLUTION_DAY,
+        reading_count__gt=0,
+    )
+    if start is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(start, VitalsRollup.RESOLUTION_DAY))
+    if end is not None:
+        rollups = rollups.filter(bucket_start__lt=end)
+    return rollups.values('bucket_start').distinct().count()
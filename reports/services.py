@@ -0,0 +1,288 @@
+"""
+Services for aggregating and paging patient vitals.
+"""
+
+import base64
+import binascii
+import json
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import Avg, Count, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Reports
+from .utils import VITAL_METRICS
+
+logger = logging.getLogger('reports.services')
+
+AGGREGATES = ('min', 'max', 'mean', 'count', 'last')
+
+
+class VitalsAggregationService:
+    """Compute per-patient, per-metric vitals statistics in a single grouped query"""
+
+    def __init__(self, metrics: Optional[Iterable[str]] = None):
+        """
+        Args:
+            metrics: Metric names from VITAL_METRICS to compute (default: all)
+        """
+        self.metrics = list(metrics) if metrics else list(VITAL_METRICS)
+        unknown = [m for m in self.metrics if m not in VITAL_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown vital metrics: {', '.join(unknown)}")
+
+    @staticmethod
+    def reading_time_expression():
+        """
+        Timestamp used to place a reading in a time window.
+
+        Rows written before the typed columns existed (and not yet backfilled)
+        have no measured_at, so fall back to manual_datetime and created_at.
+        """
+        return Coalesce('measured_at', 'manual_datetime', 'created_at')
+
+    def windowed_reports(self, patient_ids: List[Any], start=None, end=None):
+        """Reports for the given patients inside [start, end)"""
+        reports = Reports.objects.filter(patient_id__in=patient_ids).annotate(
+            reading_time=self.reading_time_expression()
+        )
+        if start is not None:
+            reports = reports.filter(reading_time__gte=start)
+        if end is not None:
+            reports = reports.filter(reading_time__lt=end)
+        return reports
+
+    def aggregate(self, patient_ids: Iterable[Any], start=None, end=None) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+        """
+        Aggregate vitals for several patients at once.
+
+        Args:
+            patient_ids: Patient primary keys
+            start: Optional inclusive lower bound of the reading time
+            end: Optional exclusive upper bound of the reading time
+
+        Returns:
+            {patient_id: {metric: {'min', 'max', 'mean', 'count', 'last'}}}
+            Patients without readings in the window are returned with empty stats.
+        """
+        patient_ids = list(patient_ids)
+        if not patient_ids:
+            return {}
+
+        annotations = {}
+        for metric in self.metrics:
+            column = VITAL_METRICS[metric]
+            last_value = self.windowed_reports(patient_ids, start, end).filter(
+                patient_id=OuterRef('patient_id'),
+                **{f'{column}__isnull': False},
+            ).order_by('-reading_time', '-id').values(column)[:1]
+
+            annotations.update({
+                f'{metric}__min': Min(column),
+                f'{metric}__max': Max(column),
+                f'{metric}__mean': Avg(column),
+                f'{metric}__count': Count(column),
+                f'{metric}__last': Subquery(last_value),
+            })
+
+        rows = (
+            self.windowed_reports(patient_ids, start, end)
+            .order_by()
+            .values('patient_id')
+            .annotate(**annotations)
+        )
+
+        results = {patient_id: self._empty_stats() for patient_id in patient_ids}
+        for row in rows:
+            results[row['patient_id']] = {
+                metric: {
+                    name: self._clean(name, row[f'{metric}__{name}'])
+                    for name in AGGREGATES
+                }
+                for metric in self.metrics
+            }
+        return results
+
+    def summarize_patient(self, patient, start=None, end=None) -> Dict[str, Dict[str, Any]]:
+        """Aggregate vitals for a single patient"""
+        return self.aggregate([patient.pk], start, end)[patient.pk]
+
+    def _empty_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            metric: {'min': None, 'max': None, 'mean': None, 'count': 0, 'last': None}
+            for metric in self.metrics
+        }
+
+    @staticmethod
+    def _clean(name: str, value: Any) -> Any:
+        """Round means and drop trailing zeros from decimals for display"""
+        if value is None:
+            return 0 if name == 'count' else None
+        if name == 'mean':
+            return round(float(value), 1)
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+
+
+def vitals_range_context(summary: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Flatten a patient summary into the min/max keys the documentation templates use.
+
+    Args:
+        summary: Output of VitalsAggregationService.summarize_patient()
+
+    Returns:
+        Dict with min_bp/max_bp (systolic), min_hr/max_hr, min_spo2/max_spo2, min_temp/max_temp
+    """
+    keys = {
+        'bp': 'systolic',
+        'hr': 'heart_rate',
+        'spo2': 'spo2',
+        'temp': 'temperature',
+    }
+    context = {}
+    for short_name, metric in keys.items():
+        stats = summary.get(metric, {})
+        context[f'min_{short_name}'] = stats.get('min')
+        context[f'max_{short_name}'] = stats.get('max')
+    return context
+
+
+class InvalidCursor(ValueError):
+    """Raised for a malformed or tampered pagination cursor"""
+
+
+class VitalsHistoryService:
+    """
+    Keyset-paginated vitals history, newest first.
+
+    Rows are ordered by (Coalesce(manual_datetime, created_at), id), which the
+    reports_patient_sort_idx expression index serves directly, so every page
+    costs the same however far back the patient's history goes.
+    """
+
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 500
+
+    # Columns the vitals table renders; used when ``fields`` is not given
+    DEFAULT_FIELDS = (
+        'systolic_blood_pressure', 'diastolic_blood_pressure', 'blood_pressure',
+        'pulse', 'heart_rate', 'spo2', 'temperature', 'blood_glucose',
+    )
+    # Always returned: the row id, its display time and whether it was entered manually
+    BASE_FIELDS = ('id', 'sort_datetime', 'manual_datetime', 'data_type')
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        """
+        Args:
+            fields: Reports column names to return (default: DEFAULT_FIELDS)
+
+        Raises:
+            ValueError: If a field is not a selectable Reports column
+        """
+        allowed = self.selectable_fields()
+        self.fields = list(dict.fromkeys(fields)) if fields else list(self.DEFAULT_FIELDS)
+        unknown = [field for field in self.fields if field not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    @staticmethod
+    def selectable_fields():
+        return {
+            field.attname for field in Reports._meta.concrete_fields
+            if field.attname not in ('patient_id', 'ingest_key')
+        }
+
+    @staticmethod
+    def sort_expression():
+        return Coalesce('manual_datetime', 'created_at')
+
+    @staticmethod
+    def encode_cursor(sort_datetime, report_id) -> str:
+        raw = json.dumps([sort_datetime.isoformat(), report_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """
+        Returns:
+            (sort_datetime, report_id) of the last row of the previous page
+
+        Raises:
+            InvalidCursor: If the cursor cannot be decoded
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            sort_value, report_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            sort_datetime = parse_datetime(sort_value)
+            if sort_datetime is None or not isinstance(report_id, int):
+                raise ValueError
+        except (ValueError, TypeError, binascii.Error):
+            raise InvalidCursor("Invalid cursor")
+        return sort_datetime, report_id
+
+    def page(self, patient, cursor: Optional[str] = None, limit: Optional[int] = None,
+             since=None, until=None) -> Dict[str, Any]:
+        """
+        One page of a patient's vitals history.
+
+        Args:
+            patient: Patient instance
+            cursor: next_cursor of the previous page (None for the newest page)
+            limit: Rows per page (capped at MAX_LIMIT)
+            since: Optional inclusive lower bound of the reading time
+            until: Optional exclusive upper bound of the reading time
+
+        Returns:
+            {'reports': [...], 'next_cursor': str or None}
+        """
+        limit = min(max(int(limit or self.DEFAULT_LIMIT), 1), self.MAX_LIMIT)
+
+        reports = Reports.objects.filter(patient=patient).annotate(sort_datetime=self.sort_expression())
+        if since is not None:
+            reports = reports.filter(sort_datetime__gte=since)
+        if until is not None:
+            reports = reports.filter(sort_datetime__lt=until)
+        if cursor:
+            last_datetime, last_id = self.decode_cursor(cursor)
+            reports = reports.filter(
+                Q(sort_datetime__lt=last_datetime) | Q(sort_datetime=last_datetime, id__lt=last_id)
+            )
+
+        columns = list(dict.fromkeys([*self.BASE_FIELDS, *self.fields]))
+        # Fetch one extra row to know whether another page exists
+        rows = list(reports.order_by('-sort_datetime', '-id').values(*columns)[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more:
+            next_cursor = self.encode_cursor(rows[-1]['sort_datetime'], rows[-1]['id'])
+
+        return {
+            'reports': [self._serialize(row) for row in rows],
+            'next_cursor': next_cursor,
+        }
+
+    def _serialize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        item = {'id': row['id']}
+        for field in self.fields:
+            value = row[field]
+            if hasattr(value, 'tzinfo') and hasattr(value, 'hour'):
+                value = timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S")
+            elif isinstance(value, Decimal):
+                value = float(value)
+            item[field] = value
+        # Same display semantics as get_all_reports: created_at is the effective reading time
+        item['created_at'] = timezone.localtime(row['sort_datetime']).strftime("%Y-%m-%d %H:%M:%S")
+        item['manual_datetime'] = (
+            timezone.localtime(row['manual_datetime']).strftime("%Y-%m-%d %H:%M:%S")
+            if row['manual_datetime'] else None
+        )
+        item['is_manual_entry'] = row['data_type'] == 'manual_entry'
+        return item
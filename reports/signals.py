@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models.signals import post_delete, post_init
+from django.dispatch import receiver
+
+from rpm_users.models import Patient
+
+from .models import Reports
+from .rollups import schedule_rollup_refresh
+
+
+@receiver(post_init, sender=Reports)
+def remember_rollup_bucket(sender, instance, **kwargs):
+    """Keep the loaded patient and reading time so an edit that moves a reading refreshes its old bucket too."""
+    # Read from __dict__ so a deferred field is not loaded with an extra query
+    instance._loaded_rollup_bucket = (instance.__dict__.get('patient_id'), instance.__dict__.get('measured_at'))
+
+
+@receiver(post_delete, sender=Reports)
+def refresh_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    """Take a deleted reading out of its hour and day buckets."""
+    # The rollups of a deleted patient are deleted with it
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if issubclass(origin_model, (Patient, User)):
+        return
+    schedule_rollup_refresh(instance.patient_id, instance.measured_at)
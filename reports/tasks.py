@@ -0,0 +1,149 @@
+from celery import shared_task
+from django.core.files import File
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+import tempfile
+
+from .alerts import (
+    claim_cooldown,
+    claim_digest_schedule,
+    digest_minutes,
+    evaluate_reports,
+    release_cooldown,
+    send_alert_email,
+)
+from .models import Reports, VitalsAlert, VitalsExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def _notify(alerts):
+    """
+    Email a batch of alerts and mark them as notified if the email went out.
+
+    Returns:
+        True if the email was sent
+    """
+    if not send_alert_email(alerts):
+        return False
+    VitalsAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(notified_at=timezone.now())
+    return True
+
+
+@shared_task
+def evaluate_vitals_alerts(report_ids):
+    """
+    Check newly stored readings against the alert rules and notify the admin.
+
+    With VITALS_ALERT_DIGEST_MINUTES set, alerts are only recorded here and the
+    first one of each window schedules send_vitals_alert_digest.
+    """
+    reports = Reports.objects.filter(pk__in=report_ids).select_related('patient__user')
+    alerts = [alert for alert in evaluate_reports(reports) if claim_cooldown(alert)]
+    if not alerts:
+        return 0
+
+    alerts = VitalsAlert.objects.bulk_create(alerts)
+    logger.info(f"Recorded {len(alerts)} vitals alert(s) for {len(report_ids)} report(s)")
+
+    minutes = digest_minutes()
+    if minutes > 0:
+        if claim_digest_schedule():
+            send_vitals_alert_digest.apply_async(countdown=minutes * 60)
+        return len(alerts)
+
+    by_report = {}
+    for alert in alerts:
+        by_report.setdefault(alert.report_id, []).append(alert)
+    for report_alerts in by_report.values():
+        if not _notify(report_alerts):
+            # The cooldown was claimed for an email that never went out; let the
+            # next abnormal reading alert again instead of staying silent
+            for alert in report_alerts:
+                release_cooldown(alert)
+    return len(alerts)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=5 * 60)
+def send_vitals_alert_digest(self):
+    """
+    Send one email with every alert that has not been notified yet.
+
+    A failed send is retried; the alerts stay unnotified until one succeeds,
+    so a later digest still includes them if every retry fails.
+    """
+    alerts = list(
+        VitalsAlert.objects.filter(notified_at__isnull=True)
+        .select_related('patient__user', 'report')
+        .order_by('patient_id', 'created_at')
+    )
+    if not alerts:
+        return 0
+    if not _notify(alerts):
+        raise self.retry()
+    return len(alerts)
+
+
+@shared_task
+def refresh_vitals_rollups(buckets):
+    """Recompute the rollups of readings that were stored, moved or deleted ([patient_id, hour ISO] pairs)"""
+    from .rollups import refresh_rollup_buckets
+
+    return refresh_rollup_buckets((patient_id, parse_datetime(hour)) for patient_id, hour in buckets)
+
+
+@shared_task
+def drain_mio_connect_stream():
+    """Store readings buffered by the MioConnect webhook (scheduled by beat and kicked on enqueue)"""
+    from .ingest_buffer import drain_stream, stream_lag
+
+    counts = drain_stream()
+    if counts['read']:
+        lag = stream_lag()
+        logger.info(
+            f"Ingest stream: stored {counts['created']} of {counts['read']} readings, "
+            f"lag {lag['lag']}, pending {lag['pending']}"
+        )
+    return counts
+
+
+@shared_task
+def build_vitals_export(job_id):
+    """Write a VitalsExportJob's zip, reporting progress on the job row as patients are written"""
+    from .exports import count_export_patients, write_bulk_export
+
+    jobs = VitalsExportJob.objects.filter(pk=job_id)
+    # Claim the job so a redelivered task does not build it twice
+    if not jobs.filter(status=VitalsExportJob.STATUS_PENDING).update(status=VitalsExportJob.STATUS_RUNNING):
+        return None
+
+    job = jobs.get()
+    patients = job.patient_queryset()
+    try:
+        jobs.update(total_patients=count_export_patients(patients, job.start, job.end))
+
+        def on_patient(patient_count, row_count):
+            jobs.update(processed_patients=patient_count, rows_written=row_count)
+
+        with tempfile.TemporaryFile() as output:
+            counts = write_bulk_export(
+                output, patients, job.start, job.end,
+                export_format=job.export_format, on_patient=on_patient,
+            )
+            output.seek(0)
+            job.file.save(f"vitals_{job.start:%Y%m%d}_{job.end:%Y%m%d}_{job.pk}.zip", File(output), save=False)
+    except Exception as e:
+        logger.error(f"Vitals export {job.pk} failed: {str(e)}", exc_info=True)
+        jobs.update(status=VitalsExportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+        return None
+
+    jobs.update(
+        status=VitalsExportJob.STATUS_COMPLETED,
+        file=job.file.name,
+        processed_patients=counts['patients'],
+        rows_written=counts['rows'],
+        finished_at=timezone.now(),
+    )
+    logger.info(f"Vitals export {job.pk}: {counts['rows']} readings for {counts['patients']} patient(s)")
+    return counts
@@ -1,3 +1,709 @@
-from django.test import TestCase
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+import io
+import json
+import tempfile
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from celery.exceptions import Retry
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from rpm_users.device_resolver import device_serial_resolver
+from rpm_users.models import Moderator, Patient
+
+from .data_exports import iter_csv
+from .exports import (
+    export_file_name, save_to_tempfile, vitals_export_rows, vitals_workbook, write_bulk_export,
+    write_vitals_csv, write_vitals_sheet,
+)
+from .ingest import RETRY_ERROR_CODE, ingest_mio_connect_batch, mio_connect_ingest_key
+from .ingest_buffer import STREAM_MAX_DELIVERIES, drain_stream
+from .replay import _ClientSender, eager_tasks, endpoint_label, percentile, vary_timestamps
+from . import tasks
+from .alerts import claim_cooldown, evaluate_reports, rules_for_patients
+from .models import Reports, VitalsAlert, VitalsAlertRule, VitalsRollup
+from .rollups import rebuild_rollups, rollup_series
+from .streaming import aiter_batched, stream_under_asgi
+from .services import InvalidCursor, VitalsAggregationService, VitalsHistoryService
+from .utils import compute_typed_vitals, parse_int_vital, parse_measurement_datetime
+
+
+def make_report(**fields):
+    defaults = {
+        'blood_pressure': None,
+        'systolic_blood_pressure': None,
+        'diastolic_blood_pressure': None,
+        'pulse': None,
+        'heart_rate': None,
+        'spo2': None,
+        'temperature': None,
+        'blood_glucose': None,
+        'manual_datetime': None,
+        'measurement_timestamp': None,
+        'created_at_device': None,
+        'data_type': None,
+        'created_at': None,
+    }
+    defaults.update(fields)
+    return SimpleNamespace(**defaults)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reports-tests'}}
+
+
+def mio_payload(serial, ts, systolic=120):
+    return {
+        'deviceId': f'dev-{serial}', 'createdAt': ts * 1000,
+        'data': {'sn': serial, 'ts': ts, 'data_type': 'bpm_gen2_measure', 'sys': systolic, 'dia': 80, 'pul': 70},
+    }
+
+
+def utc(day, hour=8, minute=0):
+    return datetime(2025, 3, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class PatientTestCase(TestCase):
+    """Base for tests that store readings; patient welcome emails are not sent"""
+
+    def setUp(self):
+        patcher = mock.patch('sendgrid.SendGridAPIClient')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_patient(self, serial=None):
+        n = Patient.objects.count()
+        user = User.objects.create_user(username=f'patient{n}@example.com', first_name='Pat', last_name=str(n))
+        return Patient.objects.create(user=user, device_serial_number=serial)
+
+    def add_reading(self, patient, when, **vitals):
+        return Reports.objects.create(patient=patient, manual_datetime=when, **vitals)
+
+
+class TypedVitalsTestCase(SimpleTestCase):
+    def test_device_reading_is_parsed(self):
+        """MioConnect readings are stored as strings and an epoch timestamp"""
+        vitals = compute_typed_vitals(make_report(
+            systolic_blood_pressure='128', diastolic_blood_pressure='84', pulse='72',
+            measurement_timestamp='1700000000', data_type='bpm',
+        ))
+        self.assertEqual(vitals['systolic_value'], 128)
+        self.assertEqual(vitals['diastolic_value'], 84)
+        self.assertEqual(vitals['heart_rate_value'], 72)
+        self.assertEqual(vitals['measured_at'], datetime.fromtimestamp(1700000000, tz=dt_timezone.utc))
+
+    def test_legacy_fields_are_used_as_fallback(self):
+        vitals = compute_typed_vitals(make_report(
+            blood_pressure='120/80', heart_rate='66', spo2='97', temperature='98.6',
+        ))
+        self.assertEqual(vitals['systolic_value'], 120)
+        self.assertEqual(vitals['diastolic_value'], 80)
+        self.assertEqual(vitals['heart_rate_value'], 66)
+        self.assertEqual(vitals['spo2_value'], 97)
+        self.assertEqual(vitals['temperature_value'], Decimal('98.60'))
+
+    def test_garbage_values_become_null(self):
+        """Non-numeric text must never raise - it used to break Reports.save()"""
+        vitals = compute_typed_vitals(make_report(systolic_blood_pressure='', pulse='None', spo2='abc'))
+        self.assertIsNone(vitals['systolic_value'])
+        self.assertIsNone(vitals['heart_rate_value'])
+        self.assertIsNone(vitals['spo2_value'])
+        self.assertIsNone(parse_int_vital('99999'))
+        self.assertIsNone(parse_measurement_datetime('not a date'))
+
+    def test_exponent_values_become_null(self):
+        """Huge exponents must neither raise in quantize() nor hang in int()"""
+        vitals = compute_typed_vitals(make_report(
+            systolic_blood_pressure='1e400000000', pulse='1e30', temperature='1e30', blood_glucose='1e400000000',
+        ))
+        self.assertIsNone(vitals['systolic_value'])
+        self.assertIsNone(vitals['heart_rate_value'])
+        self.assertIsNone(vitals['temperature_value'])
+        self.assertIsNone(vitals['blood_glucose_value'])
+        self.assertEqual(parse_int_vital('1.2e2'), 120)
+
+
+class MioConnectIngestKeyTestCase(SimpleTestCase):
+    def test_key_uses_serial_device_timestamp_and_data_type(self):
+        body = {'createdAt': 1760000000000, 'data': {'sn': '5555', 'ts': 1760000000, 'data_type': 'bpm_gen2_measure'}}
+        self.assertEqual(mio_connect_ingest_key(body), '5555:1760000000:bpm_gen2_measure')
+
+    def test_falls_back_to_created_at(self):
+        body = {'createdAt': 1760000000000, 'data': {'sn': '5555'}}
+        self.assertEqual(mio_connect_ingest_key(body), '5555:1760000000000:')
+
+    def test_no_key_without_timestamp(self):
+        self.assertIsNone(mio_connect_ingest_key({'data': {'sn': '5555'}}))
+
+
+class ReplayTestCase(SimpleTestCase):
+    def test_endpoint_label_groups_ids(self):
+        self.assertEqual(
+            endpoint_label('GET', '/reports/get-all-reports/6f1c2b7e-8a1d-4c3e-9f0a-1b2c3d4e5f60/?resolution=day'),
+            'GET /reports/get-all-reports/{id}/',
+        )
+
+    def test_vary_timestamps_shifts_only_device_times(self):
+        body = {'createdAt': 1000, 'data': {'sn': '1', 'ts': 10}}
+        self.assertEqual(vary_timestamps(body, 2), {'createdAt': 3000, 'data': {'sn': '1', 'ts': 12}})
+        self.assertEqual(body['data']['ts'], 10)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+
+    def replay(self, *args):
+        events = []
+
+        @contextmanager
+        def test_database(fixtures, keepdb):
+            events.append(('create', fixtures))
+            yield
+            events.append('destroy')
+
+        def run_replay(*args, **kwargs):
+            events.append('replay')
+            return {'samples': [], 'elapsed': 1}
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as capture, \
+                mock.patch('reports.management.commands.replay_requests.test_database', test_database), \
+                mock.patch('reports.management.commands.replay_requests.run_replay', run_replay):
+            capture.write('{"method": "GET", "path": "/reports/"}\n')
+            capture.flush()
+            call_command('replay_requests', capture.name, '--no-stubs', *args, stdout=io.StringIO())
+        return events
+
+    def test_client_mode_never_writes_to_the_configured_database(self):
+        self.assertEqual(self.replay('--fixture', 'patients.json'), [('create', ['patients.json']), 'replay', 'destroy'])
+        self.assertEqual(self.replay('--target', 'http://localhost:8000'), ['replay'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReplayClientModeTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        device_serial_resolver.clear_local()
+        self.patient = self.make_patient(serial=5555)
+
+    def test_replayed_reading_runs_its_tasks_in_process(self):
+        """Tasks queued by a replayed reading never reach the configured broker"""
+        from rpm.celery import app
+
+        request = {
+            'method': 'POST', 'path': reverse('data_telemetry_batch'), 'headers': {},
+            'body': [mio_payload('5555', 1760000000)], 'endpoint': 'batch',
+        }
+        with mock.patch.object(app, 'send_task') as send_task, eager_tasks(), \
+                self.captureOnCommitCallbacks(execute=True):
+            status, _ = _ClientSender()(request)
+
+        self.assertEqual(status, 200)
+        send_task.assert_not_called()
+        self.assertFalse(app.conf.task_always_eager)
+        self.assertTrue(VitalsRollup.objects.filter(patient=self.patient, metric='systolic').exists())
+
+
+class VitalsHistoryCursorTestCase(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        moment = datetime(2025, 3, 1, 8, 30, tzinfo=dt_timezone.utc)
+        cursor = VitalsHistoryService.encode_cursor(moment, 42)
+        self.assertEqual(VitalsHistoryService.decode_cursor(cursor), (moment, 42))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            VitalsHistoryService.decode_cursor('not-a-cursor')
+
+
+class VitalsExportTestCase(SimpleTestCase):
+    def test_csv_rows(self):
+        """Missing vitals export as empty cells and decimals as plain numbers"""
+        output = io.StringIO()
+        measured = datetime(2025, 1, 31, 8, 30, tzinfo=dt_timezone.utc)
+        written = write_vitals_csv(output, [(measured, 128, 84, None, None, Decimal('98.60'), None, '0', 'ok')])
+        self.assertEqual(written, 1)
+        header, row = output.getvalue().splitlines()
+        self.assertTrue(header.startswith('Date/Time,Systolic BP (mmHg)'))
+        self.assertEqual(row.split(',')[1:], ['128', '84', '', '', '98.6', '', '0', 'ok'])
+
+    def test_file_name_is_unique_and_safe(self):
+        patient = SimpleNamespace(id='1234', user=SimpleNamespace(first_name='Ann/Marie', last_name="O'Neil"))
+        self.assertEqual(export_file_name(patient, 'csv'), 'O_Neil_Ann_Marie_1234.csv')
+
+
+class DataExportCsvTestCase(SimpleTestCase):
+    def test_json_and_datetime_columns(self):
+        generated = datetime(2025, 1, 31, 8, 30, tzinfo=dt_timezone.utc)
+        row = ('s1', 'p1', 'c1', 'call_1', 'completed', 61000, 'Feeling fine', ['bp ok'], [], {'bp': '120/80'},
+               Decimal('0.90'), generated)
+        header, line = list(iter_csv('call-summaries', [row]))
+        self.assertTrue(header.startswith('id,patient_id,call_session_id'))
+        self.assertEqual(
+            line.strip(),
+            's1,p1,c1,call_1,completed,61000,Feeling fine,"[""bp ok""]",[],"{""bp"": ""120/80""}",0.90,2025-01-31T08:30:00+00:00',
+        )
+
+
+class VitalsAggregationTestCase(PatientTestCase):
+    def test_aggregates_inside_window(self):
+        patient, other = self.make_patient(), self.make_patient()
+        self.add_reading(patient, utc(1), systolic_blood_pressure='120', pulse='60')
+        self.add_reading(patient, utc(2), blood_pressure='140/90', heart_rate='80')
+        self.add_reading(patient, utc(3), systolic_blood_pressure='150')
+        self.add_reading(patient, utc(9), systolic_blood_pressure='200')  # outside the window
+        self.add_reading(other, utc(2), systolic_blood_pressure='110')
+
+        stats = VitalsAggregationService(['systolic', 'heart_rate']).aggregate([patient.pk], utc(1), utc(5))
+        self.assertEqual(stats[patient.pk]['systolic'], {'min': 120, 'max': 150, 'mean': 136.7, 'count': 3, 'last': 150})
+        self.assertEqual(stats[patient.pk]['heart_rate'], {'min': 60, 'max': 80, 'mean': 70.0, 'count': 2, 'last': 80})
+
+    def test_patient_without_readings_gets_empty_stats(self):
+        patient = self.make_patient()
+        summary = VitalsAggregationService(['spo2']).summarize_patient(patient)
+        self.assertEqual(summary, {'spo2': {'min': None, 'max': None, 'mean': None, 'count': 0, 'last': None}})
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            VitalsAggregationService(['weight'])
+
+
+class VitalsRollupTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(tasks.refresh_vitals_rollups, 'delay', side_effect=tasks.refresh_vitals_rollups),
+            mock.patch.object(tasks.evaluate_vitals_alerts, 'delay'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.patient = self.make_patient()
+
+    def rollups(self, resolution):
+        return {
+            (rollup.bucket_start, rollup.metric): (rollup.reading_count, rollup.min_value, rollup.max_value)
+            for rollup in VitalsRollup.objects.filter(patient=self.patient, resolution=resolution)
+        }
+
+    def test_save_and_delete_refresh_buckets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.add_reading(self.patient, utc(1, 16, 10), systolic_blood_pressure='120')
+            second = self.add_reading(self.patient, utc(1, 16, 40), systolic_blood_pressure='140')
+        self.assertEqual(list(self.rollups('hour').values()), [(2, 120, 140)])
+        self.assertEqual(list(self.rollups('day').values()), [(2, 120, 140)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(list(self.rollups('hour').values()), [(1, 120, 120)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reports.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.rollups('hour'), {})
+        self.assertEqual(self.rollups('day'), {})
+
+    def test_moved_reading_leaves_its_old_bucket(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = self.add_reading(self.patient, utc(1, 16), systolic_blood_pressure='120')
+        report = Reports.objects.get(pk=report.pk)
+        report.manual_datetime = utc(2, 18)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.save()
+        self.assertEqual(
+            [start for start, _ in self.rollups('hour')],
+            [timezone.localtime(utc(2, 18))],
+        )
+        self.assertEqual(len(self.rollups('day')), 1)
+
+    def test_rebuild_recomputes_range(self):
+        # Readings stored without their commit callbacks have no rollups yet
+        self.add_reading(self.patient, utc(1, 16), systolic_blood_pressure='120', pulse='70')
+        self.add_reading(self.patient, utc(1, 17), systolic_blood_pressure='130')
+        self.add_reading(self.patient, utc(2, 16), systolic_blood_pressure='150')
+        VitalsRollup.objects.create(
+            patient=self.patient, resolution='day', bucket_start=timezone.localtime(utc(1, 16)).replace(hour=0),
+            metric='spo2', reading_count=1,
+        )
+
+        # Two days of systolic, one of heart rate; three hours of systolic, one of heart rate
+        self.assertEqual(rebuild_rollups(utc(1, 12), utc(2, 20)), 3 + 4)
+        days = rollup_series(self.patient, 'day')
+        self.assertEqual([sorted(day['metrics']) for day in days], [['systolic'], ['heart_rate', 'systolic']])
+        self.assertEqual(days[1]['metrics']['systolic'], {'min': 120.0, 'max': 130.0, 'mean': 125.0, 'count': 2, 'last': 130.0})
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    VITALS_ALERT_COOLDOWN_MINUTES=60,
+    VITALS_ALERT_DIGEST_MINUTES=0,
+)
+class VitalsAlertTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.patient, self.other = self.make_patient(), self.make_patient()
+
+    def evaluate(self, *reports, sent=True):
+        with mock.patch('reports.tasks.send_alert_email', return_value=sent) as send:
+            count = tasks.evaluate_vitals_alerts([report.pk for report in reports])
+        return count, send
+
+    def test_rules_fall_back_from_patient_to_clinic_to_default(self):
+        VitalsAlertRule.objects.create(metric='heart_rate', operator='gt', threshold=100)
+        VitalsAlertRule.objects.create(patient=self.patient, metric='heart_rate', operator='gt', threshold=130)
+        VitalsAlertRule.objects.create(patient=self.patient, metric='spo2', operator='lt', threshold=92, is_active=False)
+
+        rules = rules_for_patients([self.patient.pk, self.other.pk])
+        thresholds = {
+            patient_id: sorted((rule.metric, rule.threshold) for rule in patient_rules)
+            for patient_id, patient_rules in rules.items()
+        }
+        self.assertEqual(thresholds[self.patient.pk], [('heart_rate', 130), ('spo2', 88), ('systolic', 170)])
+        self.assertEqual(thresholds[self.other.pk], [('heart_rate', 100), ('spo2', 88), ('systolic', 170)])
+
+        readings = [self.add_reading(patient, utc(1), pulse='120') for patient in (self.patient, self.other)]
+        alerts = evaluate_reports(Reports.objects.filter(pk__in=[r.pk for r in readings]))
+        self.assertEqual([(alert.patient_id, alert.reason) for alert in alerts],
+                         [(self.other.pk, 'Heart Rate (bpm): 120 bpm (above 100)')])
+
+    def test_cooldown_suppresses_repeat_alerts(self):
+        count, send = self.evaluate(self.add_reading(self.patient, utc(1), pulse='140'))
+        self.assertEqual(count, 1)
+        send.assert_called_once()
+        self.assertIsNotNone(VitalsAlert.objects.get().notified_at)
+
+        count, send = self.evaluate(self.add_reading(self.patient, utc(1, 9), pulse='150'))
+        self.assertEqual(count, 0)
+        send.assert_not_called()
+        # Other metrics and other patients have their own cooldown
+        count, _ = self.evaluate(self.add_reading(self.patient, utc(1, 9), systolic_blood_pressure='190'),
+                                 self.add_reading(self.other, utc(1, 9), pulse='150'))
+        self.assertEqual(count, 2)
+
+    def test_failed_email_releases_cooldown(self):
+        count, _ = self.evaluate(self.add_reading(self.patient, utc(1), pulse='140'), sent=False)
+        self.assertEqual(count, 1)
+        self.assertIsNone(VitalsAlert.objects.get().notified_at)
+
+        count, send = self.evaluate(self.add_reading(self.patient, utc(1, 9), pulse='150'))
+        self.assertEqual(count, 1)
+        send.assert_called_once()
+        self.assertTrue(claim_cooldown(VitalsAlert(patient=self.other, metric='heart_rate')))
+
+    @override_settings(VITALS_ALERT_DIGEST_MINUTES=15)
+    def test_digest_batches_alerts_into_one_email(self):
+        with mock.patch.object(tasks.send_vitals_alert_digest, 'apply_async') as schedule:
+            self.evaluate(self.add_reading(self.patient, utc(1), pulse='140'))
+            self.evaluate(self.add_reading(self.other, utc(1), pulse='140', systolic_blood_pressure='180'))
+        schedule.assert_called_once_with(countdown=15 * 60)
+        self.assertFalse(VitalsAlert.objects.filter(notified_at__isnull=False).exists())
+
+        with mock.patch('reports.tasks.send_alert_email', return_value=False):
+            with self.assertRaises(Retry):
+                tasks.send_vitals_alert_digest()
+        self.assertFalse(VitalsAlert.objects.filter(notified_at__isnull=False).exists())
+
+        with mock.patch('reports.tasks.send_alert_email', return_value=True) as send:
+            self.assertEqual(tasks.send_vitals_alert_digest(), 3)
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.args[0]), 3)
+        self.assertFalse(VitalsAlert.objects.filter(notified_at__isnull=True).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MIO_CONNECT_BATCH_MAX_ITEMS=3)
+class MioConnectBatchEndpointTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        device_serial_resolver.clear_local()
+        self.patient = self.make_patient(serial=5555)
+
+    def post(self, payload):
+        return self.client.post(
+            reverse('data_telemetry_batch'), data=json.dumps(payload), content_type='application/json',
+        )
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('data_telemetry_batch')).status_code, 405)
+        response = self.client.post(reverse('data_telemetry_batch'), data='[{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({'data': {}}).status_code, 400)
+        self.assertEqual(self.post([mio_payload('5555', 1760000000 + n) for n in range(4)]).status_code, 413)
+        self.assertFalse(Reports.objects.exists())
+
+    def test_items_succeed_or_fail_independently(self):
+        response = self.post({'readings': [mio_payload('5555', 1760000000), mio_payload('9999', 1760000000), 'junk']})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['success'], body['created'], body['duplicates'], body['failed']), (False, 1, 0, 2))
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'error', 'error'])
+        self.assertEqual([result.get('code') for result in body['results']], [None, 404, 400])
+        report = Reports.objects.get()
+        self.assertEqual((report.patient_id, report.systolic_value), (self.patient.pk, 120))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MioConnectBatchIdempotencyTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        device_serial_resolver.clear_local()
+        self.patient = self.make_patient(serial=5555)
+        patcher = mock.patch('reports.ingest.schedule_post_ingest')
+        self.post_ingest = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scheduled(self):
+        return [report.pk for call in self.post_ingest.call_args_list for report in call.args[0]]
+
+    def test_retried_batch_stores_each_reading_once(self):
+        payloads = [mio_payload('5555', 1760000000), mio_payload('5555', 1760000060), mio_payload('5555', 1760000000)]
+        first = ingest_mio_connect_batch(payloads)
+        self.assertEqual([result['status'] for result in first], ['created', 'created', 'duplicate'])
+        self.assertEqual(first[2]['report_id'], first[0]['report_id'])
+
+        second = ingest_mio_connect_batch(payloads)
+        self.assertEqual([result['status'] for result in second], ['duplicate'] * 3)
+        self.assertEqual([result['report_id'] for result in second], [first[0]['report_id'], first[1]['report_id'], first[0]['report_id']])
+        self.assertEqual(Reports.objects.count(), 2)
+        self.assertEqual(sorted(self.scheduled()), sorted([first[0]['report_id'], first[1]['report_id']]))
+
+    def test_reading_that_loses_a_race_is_a_duplicate(self):
+        payload = mio_payload('5555', 1760000000)
+        winner = Reports.objects.create(patient=self.patient, ingest_key=mio_connect_ingest_key(payload))
+        # A concurrent retry stored the reading after this batch looked its key up
+        with mock.patch('reports.ingest.existing_report_ids', return_value={}):
+            results = ingest_mio_connect_batch([payload, mio_payload('5555', 1760000060)])
+        self.assertEqual([result['status'] for result in results], ['duplicate', 'created'])
+        self.assertEqual(results[0]['report_id'], winner.pk)
+        self.assertEqual(self.scheduled(), [results[1]['report_id']])
+
+    def test_reading_whose_winner_vanished_is_an_error(self):
+        payload = mio_payload('5555', 1760000000)
+        winner = Reports.objects.create(patient=self.patient, ingest_key=mio_connect_ingest_key(payload))
+        bulk_create = Reports.objects.bulk_create
+
+        def insert_then_delete_winner(objs, **kwargs):
+            created = bulk_create(objs, **kwargs)
+            if kwargs.get('ignore_conflicts'):
+                # The row our insert conflicted with is deleted before it is read back
+                Reports.objects.filter(pk=winner.pk).delete()
+            return created
+
+        with mock.patch('reports.ingest.existing_report_ids', return_value={}), \
+                mock.patch.object(Reports.objects, 'bulk_create', side_effect=insert_then_delete_winner):
+            results = ingest_mio_connect_batch([payload, mio_payload('5555', 1760000060), payload])
+        self.assertEqual([result['status'] for result in results], ['error', 'created', 'error'])
+        self.assertEqual(results[0]['code'], RETRY_ERROR_CODE)
+        self.assertNotIn('report_id', results[0])
+        self.assertEqual(self.scheduled(), [results[1]['report_id']])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MIO_CONNECT_STREAM_KEY='ingest', MIO_CONNECT_STREAM_GROUP='group')
+class IngestStreamDrainTestCase(PatientTestCase):
+    """Drains against a mocked Redis connection: reclaiming, dead-lettering and acknowledgement"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        device_serial_resolver.clear_local()
+        self.patient = self.make_patient(serial=5555)
+        self.conn = mock.Mock()
+        self.conn.xpending_range.return_value = []
+        self.conn.xreadgroup.return_value = []
+        for patcher in (
+            mock.patch('reports.ingest_buffer.get_connection', return_value=self.conn),
+            mock.patch('reports.ingest.schedule_post_ingest'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def entry(self, entry_id, ts):
+        return (entry_id.encode(), {b'payload': json.dumps(mio_payload('5555', ts)).encode()})
+
+    def acked(self):
+        return [entry_id for call in self.conn.xack.call_args_list for entry_id in call.args[2:]]
+
+    def test_new_entries_are_stored_then_acknowledged(self):
+        self.conn.xreadgroup.side_effect = [
+            [(b'ingest', [self.entry('1-0', 1760000000), (b'2-0', {b'payload': b'not json'})])],
+            [],
+        ]
+        self.assertEqual(drain_stream(), {'read': 2, 'created': 1})
+        self.assertEqual(Reports.objects.count(), 1)
+        self.assertEqual(sorted(self.acked()), ['1-0', '2-0'])
+        dead = self.conn.xadd.call_args
+        self.assertEqual(dead.args[0], 'ingest:dead')
+        self.assertEqual((dead.args[1]['entry_id'], dead.args[1]['reason']), ('2-0', 'malformed payload'))
+
+    def test_overdue_entries_are_reclaimed_or_dead_lettered(self):
+        self.conn.xpending_range.return_value = [
+            {'message_id': b'1-0', 'times_delivered': 2},
+            {'message_id': b'2-0', 'times_delivered': STREAM_MAX_DELIVERIES},
+        ]
+        self.conn.xclaim.side_effect = [[self.entry('2-0', 1760000060)], [self.entry('1-0', 1760000000)]]
+
+        self.assertEqual(drain_stream(), {'read': 1, 'created': 1})
+        self.assertEqual([call.args[4] for call in self.conn.xclaim.call_args_list], [[b'2-0'], [b'1-0']])
+        self.assertEqual(self.conn.xadd.call_args.args[1]['reason'], f'failed {STREAM_MAX_DELIVERIES} deliveries')
+        self.assertEqual(sorted(self.acked()), ['1-0', '2-0'])
+        self.assertEqual(Reports.objects.get().measurement_timestamp, '1760000000')
+
+    def test_failed_batch_stays_pending(self):
+        self.conn.xreadgroup.return_value = [(b'ingest', [self.entry('1-0', 1760000000)])]
+        with mock.patch('reports.ingest_buffer.ingest_mio_connect_batch', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                drain_stream()
+        self.conn.xack.assert_not_called()
+
+    def test_retryable_entries_stay_pending(self):
+        self.conn.xreadgroup.side_effect = [
+            [(b'ingest', [self.entry('1-0', 1760000000), self.entry('2-0', 1760000060)])],
+            [],
+        ]
+        results = [
+            {'index': 0, 'status': 'error', 'error': 'retry it', 'code': RETRY_ERROR_CODE},
+            {'index': 1, 'status': 'created', 'report_id': 1, 'patient_id': self.patient.pk},
+        ]
+        with mock.patch('reports.ingest_buffer.ingest_mio_connect_batch', return_value=results):
+            drain_stream()
+        self.assertEqual(self.acked(), ['2-0'])
+        self.conn.xadd.assert_not_called()
+
+
+class VitalsWorkbookTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = self.make_patient()
+        self.add_reading(self.patient, utc(1), systolic_blood_pressure='120', diastolic_blood_pressure='80',
+                         pulse='70', temperature='98.6')
+        self.add_reading(self.patient, utc(2), blood_pressure='130/85', symptoms='Dizzy')
+
+    def test_sheet_layout_and_rows(self):
+        wb = vitals_workbook()
+        summary = VitalsAggregationService(['systolic']).summarize_patient(self.patient)
+        reports = Reports.objects.filter(patient=self.patient).order_by('created_at')
+        self.assertEqual(write_vitals_sheet(wb, self.patient, vitals_export_rows(reports), summary), 2)
+
+        with save_to_tempfile(wb) as output:
+            ws = load_workbook(output)['Vitals Data']
+        self.assertEqual(ws['A1'].value, 'PATIENT VITALS REPORT')
+        self.assertEqual(ws['B3'].value, 'Pat 0')
+        self.assertEqual([ws.cell(row=3, column=col).value for col in range(4, 10)], ['Systolic BP (mmHg)', 120, 130, 125, 2, 130])
+        self.assertEqual(ws['A9'].value, 'Date/Time')
+        self.assertEqual(ws.freeze_panes, 'A10')
+        self.assertEqual(ws['A9'].style, 'vitals_header')
+        rows = [[cell.value for cell in row[1:]] for row in ws.iter_rows(min_row=10)]
+        self.assertEqual(rows, [[120, 80, 70, None, 98.6, None, None, None], [130, 85, None, None, None, None, None, 'Dizzy']])
+
+    def test_bulk_export_writes_one_workbook_per_patient(self):
+        other = self.make_patient()
+        self.add_reading(other, utc(1), pulse='65')
+        self.make_patient()  # no readings in range
+        output = io.BytesIO()
+        counts = write_bulk_export(output, Patient.objects.all(), utc(1), utc(5))
+        self.assertEqual(counts, {'patients': 2, 'rows': 3})
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(sorted(archive.namelist()), sorted([
+                export_file_name(self.patient, 'xlsx'), export_file_name(other, 'xlsx'),
+            ]))
+            ws = load_workbook(io.BytesIO(archive.read(export_file_name(other, 'xlsx')))).active
+        self.assertEqual(ws['D10'].value, 65)
+
+    def test_export_streams_through_async_iterator_under_asgi(self):
+        user = User.objects.create_user(username='moderator@example.com')
+        Moderator.objects.create(user=user)
+        self.async_client.force_login(user)
+
+        async def read():
+            response = await self.async_client.get(reverse('export_vitals_excel', args=[self.patient.pk]))
+            return response, b''.join([chunk async for chunk in response])
+
+        response, content = async_to_sync(read)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        ws = load_workbook(io.BytesIO(content))['Vitals Data']
+        self.assertEqual(ws['A1'].value, 'PATIENT VITALS REPORT')
+
+
+class DataExportEndpointTestCase(PatientTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='moderator@example.com')
+        Moderator.objects.create(user=user)
+        self.client.force_login(user)
+
+    def export(self, dataset, **params):
+        return self.client.get(reverse('export_dataset', args=[dataset]), params)
+
+    def test_malformed_owner_ids_are_bad_requests(self):
+        self.assertEqual(self.export('lead-call-summaries', lead_id='abc').status_code, 400)
+        self.assertEqual(self.export('reports', patient_id='not-a-uuid').status_code, 400)
+
+    def test_patient_filter(self):
+        patient = self.make_patient()
+        self.add_reading(patient, utc(1), pulse='70')
+        self.add_reading(self.make_patient(), utc(1), pulse='80')
+        response = self.export('reports', patient_id=str(patient.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+    def test_csv_streams_through_async_iterator_under_asgi(self):
+        patient = self.make_patient()
+        for day in (1, 2, 3):
+            self.add_reading(patient, utc(day), pulse='70')
+        self.async_client.force_login(User.objects.get(username='moderator@example.com'))
+
+        async def read():
+            response = await self.async_client.get(reverse('export_dataset', args=['reports']))
+            return response, b''.join([chunk async for chunk in response])
+
+        response, content = async_to_sync(read)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(content.decode().splitlines()), 4)
+
+    def test_parquet_streams_through_async_iterator_under_asgi(self):
+        self.add_reading(self.make_patient(), utc(1), pulse='70')
+        self.async_client.force_login(User.objects.get(username='moderator@example.com'))
+
+        async def read():
+            response = await self.async_client.get(reverse('export_dataset', args=['reports']), {'format': 'parquet'})
+            return response, b''.join([chunk async for chunk in response])
+
+        response, content = async_to_sync(read)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        self.assertTrue(content.startswith(b'PAR1'))
+
+
+class StreamUnderAsgiTestCase(SimpleTestCase):
+    def test_batches_are_pulled_lazily(self):
+        pulled = []
+
+        def rows():
+            for number in range(10):
+                pulled.append(number)
+                yield number
+
+        async def first_two():
+            iterator = aiter_batched(rows(), batch_size=3)
+            return [await anext(iterator), await anext(iterator)]
+
+        self.assertEqual(async_to_sync(first_two)(), [0, 1])
+        self.assertEqual(pulled, [0, 1, 2])
+
+    def test_wsgi_response_is_unchanged(self):
+        response = StreamingHttpResponse(iter([b'a', b'b']))
+        self.assertIs(stream_under_asgi(RequestFactory().get('/'), response), response)
+        self.assertFalse(response.is_async)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
@@ -7,6 +7,7 @@ urlpatterns = [
     path('create-report/', view=views.create_report),
     path('get-your-report/', view=views.get_your_reports),
     path('get-all-reports/<uuid:patient_id>/', view=views.get_all_reports, name='get_all_reports'),
+    path('vitals-history/<uuid:patient_id>/', views.get_vitals_history, name='get_vitals_history'),
     path('get-patient-report/', view=views.get_patients_reports),
     path('get-single-report/<int:report_id>/', view=views.get_single_report, name='get_single_report'),
     path('get-single-report/<str:report_id>/', view=views.get_single_report, name='get_single_report'),
@@ -14,6 +15,8 @@ urlpatterns = [
     path('edit-documentation/<int:doc_id>/', views.edit_documentation, name='edit_documentation'),
     path('delete-documentation/<int:doc_id>/', views.delete_documentation, name='delete_documentation'),
     path('data-telemetry/', views.data_from_mio_connect, name='data_telemetry'),
+    path('data-telemetry/batch/', views.data_from_mio_connect_batch, name='data_telemetry_batch'),
+    path('data-telemetry/buffer-status/', views.ingest_buffer_status, name='ingest_buffer_status'),
     path('edit-patient/<uuid:patient_id>/', views.edit_patient, name='edit_patient'),
     path('documentation/<int:doc_id>/view/', views.documentation_share_view, name='documentation_share_view'),
     
@@ -24,4 +27,8 @@ urlpatterns = [
     
     # Export vitals endpoint
     path('export-vitals/<uuid:patient_id>/', views.export_vitals_excel, name='export_vitals_excel'),
+    path('export-jobs/', views.create_vitals_export_job, name='create_vitals_export_job'),
+    path('export-jobs/<uuid:job_id>/', views.vitals_export_job_status, name='vitals_export_job_status'),
+    path('export-jobs/<uuid:job_id>/download/', views.download_vitals_export_job, name='vitals_export_job_download'),
+    path('data-export/<slug:dataset>/', views.export_dataset, name='export_dataset'),
 ]
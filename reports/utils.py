@@ -0,0 +1,248 @@
+"""
+Utility functions for the reports app.
+
+Vitals arrive as strings from MioConnect devices, the legacy report API and
+manual entry. These helpers turn them into typed values once, at write time,
+so reads can aggregate in the database instead of re-parsing every row.
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+logger = logging.getLogger('reports.utils')
+
+SMALLINT_MIN = -32768
+SMALLINT_MAX = 32767
+
+# Device timestamps above this are epoch milliseconds rather than seconds
+EPOCH_MILLIS_THRESHOLD = 10 ** 12
+
+# Metric name -> typed column on Reports. The typed columns already fall back to
+# the legacy text fields ("120/80" blood_pressure, heart_rate) when they are parsed.
+VITAL_METRICS = {
+    'systolic': 'systolic_value',
+    'diastolic': 'diastolic_value',
+    'heart_rate': 'heart_rate_value',
+    'spo2': 'spo2_value',
+    'temperature': 'temperature_value',
+    'blood_glucose': 'blood_glucose_value',
+}
+
+VITAL_METRIC_LABELS = {
+    'systolic': 'Systolic BP (mmHg)',
+    'diastolic': 'Diastolic BP (mmHg)',
+    'heart_rate': 'Heart Rate (bpm)',
+    'spo2': 'SpO2 (%)',
+    'temperature': 'Temperature (°F)',
+    'blood_glucose': 'Blood Glucose',
+}
+
+MEASUREMENT_DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+)
+
+
+def parse_int_vital(value):
+    """
+    Parse a vital stored as text into an int that fits a smallint column.
+
+    Args:
+        value: Raw value (e.g. "120", "120.0", "", "None")
+
+    Returns:
+        int or None if the value is empty, non-numeric or out of range
+    """
+    number = parse_decimal_vital(value)
+    # Compare before int(): int(Decimal("1e400000000")) builds a 400-million-digit integer
+    if number is None or not (SMALLINT_MIN <= number <= SMALLINT_MAX):
+        return None
+    return int(number)
+
+
+def parse_decimal_vital(value, max_digits=None, decimal_places=None):
+    """
+    Parse a vital stored as text into a Decimal.
+
+    Args:
+        value: Raw value (e.g. "98.6", "", "None")
+        max_digits: Optional column precision; values that do not fit return None
+        decimal_places: Optional column scale used to quantize the result
+
+    Returns:
+        Decimal or None if the value is empty or non-numeric
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ('none', 'null', 'nan'):
+        return None
+    try:
+        number = Decimal(text)
+    except (InvalidOperation, ValueError):
+        return None
+    if not number.is_finite():
+        return None
+    # Check the exponent first: "1e30" cannot be quantized to the column scale
+    if max_digits is not None and number and number.adjusted() >= max_digits - (decimal_places or 0):
+        return None
+    if decimal_places is not None:
+        try:
+            number = number.quantize(Decimal(1).scaleb(-decimal_places))
+        except InvalidOperation:
+            return None
+    if max_digits is not None and len(number.as_tuple().digits) > max_digits:
+        return None
+    return number
+
+
+def split_blood_pressure(bp_string):
+    """
+    Split a legacy "systolic/diastolic" blood pressure string.
+
+    Args:
+        bp_string: Blood pressure string in format "120/80"
+
+    Returns:
+        Tuple of (systolic, diastolic) strings, empty strings if parsing fails
+    """
+    if not bp_string or '/' not in bp_string:
+        return '', ''
+
+    parts = bp_string.split('/')
+    if len(parts) < 2:
+        return '', ''
+    return parts[0].strip(), parts[1].strip()
+
+
+def parse_measurement_datetime(value):
+    """
+    Parse a device or manual-entry measurement timestamp.
+
+    Args:
+        value: Epoch seconds/milliseconds (as sent by MioConnect) or a
+            "%Y-%m-%d %H:%M:%S" string (as written by manual entry)
+
+    Returns:
+        Aware datetime or None if the value cannot be parsed
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ('none', 'null'):
+        return None
+
+    if text.isdigit():
+        epoch = int(text)
+        if epoch >= EPOCH_MILLIS_THRESHOLD:
+            epoch = epoch / 1000
+        try:
+            return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    for fmt in MEASUREMENT_DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    return None
+
+
+def _first_parsed(parser, *values):
+    """Return the first value that parses successfully"""
+    for value in values:
+        parsed = parser(value)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def compute_typed_vitals(report):
+    """
+    Derive the typed vitals columns from a report's text fields.
+
+    Only reads attributes, so it works for historical models inside
+    migrations as well as for live ``Reports`` instances.
+
+    Args:
+        report: Reports instance (saved or unsaved)
+
+    Returns:
+        Dict of typed field name -> parsed value
+    """
+    legacy_systolic, legacy_diastolic = split_blood_pressure(report.blood_pressure)
+
+    # Manual entries store a naive wall-clock measurement_timestamp, so only
+    # trust the device timestamps for readings that came from a device
+    measured_at = report.manual_datetime
+    if measured_at is None and report.data_type != 'manual_entry':
+        measured_at = (
+            parse_measurement_datetime(report.measurement_timestamp)
+            or parse_measurement_datetime(report.created_at_device)
+        )
+
+    return {
+        'systolic_value': _first_parsed(parse_int_vital, report.systolic_blood_pressure, legacy_systolic),
+        'diastolic_value': _first_parsed(parse_int_vital, report.diastolic_blood_pressure, legacy_diastolic),
+        'heart_rate_value': _first_parsed(parse_int_vital, report.pulse, report.heart_rate),
+        'spo2_value': parse_int_vital(report.spo2),
+        'temperature_value': parse_decimal_vital(report.temperature, max_digits=5, decimal_places=2),
+        'blood_glucose_value': parse_decimal_vital(report.blood_glucose, max_digits=7, decimal_places=2),
+        'measured_at': measured_at or report.created_at or timezone.now(),
+    }
+
+
+TYPED_VITALS_FIELDS = (
+    'systolic_value',
+    'diastolic_value',
+    'heart_rate_value',
+    'spo2_value',
+    'temperature_value',
+    'blood_glucose_value',
+    'measured_at',
+)
+
+
+def backfill_typed_vitals(queryset, chunk_size=1000, progress=None):
+    """
+    Populate the typed vitals columns for existing rows in primary-key chunks.
+
+    Each chunk is read with a keyset query (``pk > last_pk``) and written back
+    with a single ``bulk_update``, so memory stays bounded and no long-running
+    transaction holds locks on the reports table.
+
+    Args:
+        queryset: Reports queryset to convert (a historical model's manager works too)
+        chunk_size: Rows per read/write batch
+        progress: Optional callable receiving the running count after each chunk
+
+    Returns:
+        Number of rows updated
+    """
+    updated = 0
+    last_pk = 0
+    queryset = queryset.order_by('pk')
+
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+
+        for report in chunk:
+            for field, value in compute_typed_vitals(report).items():
+                setattr(report, field, value)
+
+        queryset.model._default_manager.bulk_update(chunk, TYPED_VITALS_FIELDS)
+        updated += len(chunk)
+        last_pk = chunk[-1].pk
+
+        if progress:
+            progress(updated)
+
+    return updated
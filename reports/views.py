@@ -2,12 +2,37 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from .models import Reports, Documentation
+from .models import Reports, Documentation, VitalsExportJob, VitalsRollup
 from rpm_users.models import Patient, Moderator
+from rpm_users.device_resolver import device_serial_resolver
 from .serializers import ReportSerializer
+from .services import (
+    VitalsAggregationService,
+    VitalsHistoryService,
+    vitals_range_context,
+)
+from .rollups import rollup_series, days_with_readings
+from .exports import XLSX_CONTENT_TYPE, save_to_tempfile, vitals_export_rows, vitals_workbook, write_vitals_sheet
+from .data_exports import (
+    EXPORT_DATASETS,
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMATS,
+    PARQUET_CONTENT_TYPE,
+    export_rows,
+    iter_csv,
+    write_parquet,
+)
+from .ingest import ingest_mio_connect_batch, store_mio_connect_reading
+from .ingest_buffer import buffering_enabled, enqueue_reading, request_drain, stream_lag
+from .streaming import stream_under_asgi
+from .tasks import build_vitals_export
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from .forms import DocumentationForm  # Ensure you have a Django form for validation
 from django.http import JsonResponse
@@ -24,15 +49,9 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
-from datetime import timedelta
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+from datetime import datetime, timedelta
+from django.utils.dateparse import parse_date, parse_datetime
 
-# Excel styling constants
-EXCEL_HEADER_COLOR = "7928CA"
-EXCEL_HEADER_FONT_COLOR = "FFFFFF"
-EXCEL_PATIENT_INFO_COLOR = "E0C3FC"
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -120,6 +139,10 @@ def get_all_reports(request, patient_id):
     # Check if the logged-in user is the patient or a moderator
     is_patient = Patient.objects.filter(user=user, id=patient_id).exists()
     
+    if (is_moderator or is_patient) and request.GET.get('resolution'):
+        # Long time ranges are served from the hourly/daily rollups instead of raw rows
+        return _get_rollup_reports(request, patient)
+    
     if is_moderator or is_patient:
         # Get all reports and sort by effective datetime (manual_datetime if set, else created_at)
         from django.db.models.functions import Coalesce
@@ -152,6 +175,87 @@ def get_all_reports(request, patient_id):
 
     return JsonResponse(data, safe=False)
 
+@login_required
+def get_vitals_history(request, patient_id):
+    """
+    Cursor-paginated vitals history for a patient, newest first.
+
+    Query parameters:
+        limit: Rows per page (default 50, max 500)
+        cursor: next_cursor from the previous page
+        fields: Comma-separated Reports columns to return (default: the vitals table columns)
+        since/until: Optional ISO date/datetime bounds on the reading time
+    """
+    patient = Patient.objects.filter(id=patient_id).first()
+    if not patient:
+        return JsonResponse({"error": "Patient not found"}, status=404)
+
+    is_moderator = Moderator.objects.filter(user=request.user).exists()
+    if not is_moderator and patient.user_id != request.user.id:
+        return JsonResponse({"error": "Not authorized to view these reports"}, status=403)
+
+    fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+    try:
+        service = VitalsHistoryService(fields=fields)
+        since = _parse_datetime_param(request.GET.get('since'))
+        until = _parse_datetime_param(request.GET.get('until'))
+        limit = int(request.GET.get('limit') or VitalsHistoryService.DEFAULT_LIMIT)
+        page = service.page(patient, cursor=request.GET.get('cursor'), limit=limit, since=since, until=until)
+    except ValueError as e:
+        # Unknown fields, malformed dates/limit and invalid cursors (InvalidCursor)
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(page)
+
+
+def _parse_datetime_param(value):
+    """
+    Parse a "since"/"until" query parameter.
+    
+    Args:
+        value: ISO date ("2025-01-31") or datetime ("2025-01-31T08:00:00")
+    
+    Returns:
+        Aware datetime, None if the parameter is empty
+    
+    Raises:
+        ValueError: If the value is not a valid date/datetime
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(parsed_date, datetime.min.time())
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _get_rollup_reports(request, patient):
+    """Serve get_all_reports from the vitals rollups (resolution=hour|day)"""
+    resolution = request.GET.get('resolution')
+    if resolution not in dict(VitalsRollup.RESOLUTION_CHOICES):
+        return JsonResponse({"error": "resolution must be 'hour' or 'day'"}, status=400)
+    
+    try:
+        since = _parse_datetime_param(request.GET.get('since'))
+        until = _parse_datetime_param(request.GET.get('until'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    buckets = rollup_series(patient, resolution, start=since, end=until)
+    return JsonResponse({
+        "resolution": resolution,
+        "days_with_readings": days_with_readings(patient, start=since, end=until),
+        "buckets": [
+            {
+                **bucket,
+                "bucket_start": timezone.localtime(bucket["bucket_start"]).strftime("%Y-%m-%d %H:%M:%S"),
+            } for bucket in buckets
+        ],
+    })
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_report(request):
@@ -205,90 +309,12 @@ def create_report(request):
 def add_documentation(request, patient_id):
     patient = get_object_or_404(Patient, id=patient_id)
     
-    # Get reports from the last month
+    # Summarize the last month of vitals in one grouped query
     one_month_ago = timezone.now() - timedelta(days=30)
+    vitals_summary = VitalsAggregationService().summarize_patient(patient, start=one_month_ago)
     reports = Reports.objects.filter(
         patient=patient,
     ).order_by('-created_at')
-    # Calculate min/max values for vitals
-    min_bp = None
-    max_bp = None
-    min_hr = None
-    max_hr = None
-    min_spo2 = None
-    max_spo2 = None
-    min_temp = None
-    max_temp = None
-
-    for report in reports:
-        # Blood Pressure - try both old and new fields
-        bp_value = None
-        if report.blood_pressure:
-            try:
-                bp_values = [int(x.strip()) for x in report.blood_pressure.split('/')]
-                if len(bp_values) == 2:
-                    bp_value = bp_values[0]
-            except (ValueError, AttributeError):
-                pass
-        elif report.systolic_blood_pressure:
-            try:
-                bp_value = int(report.systolic_blood_pressure)
-            except (ValueError, AttributeError):
-                pass
-
-        if bp_value is not None:
-            if min_bp is None or bp_value < min_bp:
-                min_bp = bp_value
-            if max_bp is None or bp_value > max_bp:
-                max_bp = bp_value
-
-        # Heart Rate - try both old and new fields
-        hr_value = None
-        if report.heart_rate:
-            try:
-                hr_value = int(report.heart_rate)
-            except (ValueError, AttributeError):
-                pass
-        elif report.pulse:
-            try:
-                hr_value = int(report.pulse)
-            except (ValueError, AttributeError):
-                pass
-
-        if hr_value is not None:
-            if min_hr is None or hr_value < min_hr:
-                min_hr = hr_value
-            if max_hr is None or hr_value > max_hr:
-                max_hr = hr_value
-
-        # SpO2
-        if report.spo2:
-            try:
-                spo2 = int(report.spo2)
-                if min_spo2 is None or spo2 < min_spo2:
-                    min_spo2 = spo2
-                if max_spo2 is None or spo2 > max_spo2:
-                    max_spo2 = spo2
-            except (ValueError, AttributeError):
-                pass
-
-        # Temperature
-        if report.temperature:
-            try:
-                temp = float(report.temperature)
-                if min_temp is None or temp < min_temp:
-                    min_temp = temp
-                if max_temp is None or temp > max_temp:
-                    max_temp = temp
-            except (ValueError, AttributeError):
-                pass
-    print("min_bp", min_bp)
-    print("max_bp", max_bp)
-    print("min_hr", min_hr)
-    print("max_hr", max_hr)
-    print("min_spo2", min_spo2)
-    print("max_spo2", max_spo2)
-    print("min_temp", min_temp)
     if request.method == 'POST':
         form = DocumentationForm(request.POST, request.FILES)
         if form.is_valid():
@@ -316,18 +342,12 @@ def add_documentation(request, patient_id):
     context = {
         'form': form,
         'patient': patient,
-        'reports': reports,
-        'min_bp': min_bp,
-        'max_bp': max_bp,
-        'min_hr': min_hr,
-        'max_hr': max_hr,
-        'min_spo2': min_spo2,
-        'max_spo2': max_spo2,
-        'min_temp': min_temp,
-        'max_temp': max_temp,
+        # The template only renders the latest five readings
+        'reports': reports[:5],
+        'vitals_summary': vitals_summary,
+        **vitals_range_context(vitals_summary),
         'now': timezone.now()
     }
-    print("context", context)
     return render(request, 'reports/add_docs.html', context)
 
 
@@ -349,75 +369,100 @@ def data_from_mio_connect(request):
         if not device_serial:
             return JsonResponse({"error": "Missing device serial number"}, status=400)
 
-        patient = Patient.objects.filter(device_serial_number=device_serial).first()
-        if not patient:
+        patient_id = device_serial_resolver.resolve(device_serial)
+        if not patient_id:
             return JsonResponse({"error": f"No patient found with device serial number: {device_serial}"}, status=404)
 
-        # List all possible fields from both device types
-        report_fields = {
-            # Common
-            'device_id': body.get('deviceId', ''),
-            'created_at_device': str(body.get('createdAt', '')),
-            'data_type': data.get('data_type', ''),
-            'imei': data.get('imei', ''),
-            'iccid': data.get('iccid', ''),
-            'serial_number': data.get('sn', ''),
-            'model_number': body.get('modelNumber', ''),
-            'is_test': str(body.get('isTest', '')),
-            # Sphygmomanometer
-            'user_id': str(data.get('user', '')),
-            'systolic_blood_pressure': str(data.get('sys', '')),
-            'diastolic_blood_pressure': str(data.get('dia', '')),
-            'pulse': str(data.get('pul', '')),
-            'irregular_heartbeat': str(data.get('ihb', '')),
-            'hand_shaking': str(data.get('hand', '')),
-            'triple_mode': str(data.get('tri', '')),
-            'battery_level': str(data.get('bat', '')),
-            'signal_strength': str(data.get('sig', '')),
-            'measurement_timestamp': str(data.get('ts', '')),
-            'timezone': str(data.get('tz', '')),
-            # Blood Glucose Meter
-            'blood_glucose': str(data.get('data', '')),
-            'glucose_unit': str(data.get('unit', '')),
-            'test_paper_type': str(data.get('sample', '')),
-            'sample_type': str(data.get('target', '')),
-            'meal_mark': str(data.get('meal', '')),
-            'signal_level': str(data.get('sig_lvl', '')),
-            'measurement_timezone': str(data.get('ts_tz', '')),
-            'upload_timestamp': str(data.get('uptime', '')),
-            'upload_timezone': str(data.get('uptime_tz', '')),
-        }
+        if buffering_enabled():
+            try:
+                entry_id = enqueue_reading(body)
+            except Exception as e:
+                # Without the buffer, fall back to storing the reading directly
+                logger.error(f"MioConnect ingest stream unavailable, storing synchronously: {str(e)}")
+            else:
+                request_drain()
+                return JsonResponse({
+                    "success": True,
+                    "accepted": True,
+                    "stream_id": entry_id,
+                    "patient_id": patient_id
+                }, status=202)
 
-        # For compatibility, also fill old fields if possible
-        if report_fields['systolic_blood_pressure'] and report_fields['diastolic_blood_pressure']:
-            report_fields['blood_pressure'] = f"{report_fields['systolic_blood_pressure']}/{report_fields['diastolic_blood_pressure']}"
-        else:
-            report_fields['blood_pressure'] = ''
-        report_fields['heart_rate'] = report_fields['pulse']
-        report_fields['spo2'] = ''
-        report_fields['temperature'] = ''
-        report_fields['symptoms'] = ''
         try:
-            report = Reports.objects.create(patient=patient, **report_fields)
-            # Send the email using sendgrid
-            # Check the critical fields
-            if int(report_fields['systolic_blood_pressure']) > 170:
-                pass #send the email
-
+            # Retried deliveries return the report stored the first time
+            report_id, created = store_mio_connect_reading(patient_id, body)
         except Exception as e:
             print(f"Error creating report: {str(e)}")
             return JsonResponse({"error": f"Failed to create report: {str(e)}"}, status=500)
         return JsonResponse({
             "success": True,
+            "duplicate": not created,
             "received_data": body,
-            "saved_report_id": report.id,
-            "patient_id": patient.id
+            "saved_report_id": report_id,
+            "patient_id": patient_id
         })
     except Exception as err:
         print(f"Unexpected error: {str(err)}")
         return JsonResponse({"error": "An unexpected error occurred while processing the request"}, status=500)
 
 
+@csrf_exempt
+def data_from_mio_connect_batch(request):
+    """
+    Store a backlog of MioConnect readings in one request.
+
+    Accepts a JSON array of MioConnect payloads (or {"readings": [...]}) and
+    returns one result per payload in the same order.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+    try:
+        payloads = json.loads(request.body)
+    except json.JSONDecodeError as e:
+        return JsonResponse({"error": f"Invalid JSON data: {str(e)}"}, status=400)
+
+    if isinstance(payloads, dict):
+        payloads = payloads.get('readings')
+    if not isinstance(payloads, list):
+        return JsonResponse({"error": "Expected a JSON array of readings"}, status=400)
+
+    max_items = settings.MIO_CONNECT_BATCH_MAX_ITEMS
+    if len(payloads) > max_items:
+        return JsonResponse({"error": f"Batch too large: {len(payloads)} readings (max {max_items})"}, status=413)
+
+    try:
+        results = ingest_mio_connect_batch(payloads)
+    except Exception as err:
+        logger.error(f"MioConnect batch ingest failed: {str(err)}")
+        return JsonResponse({"error": "An unexpected error occurred while processing the request"}, status=500)
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+    failed = len(results) - created - duplicates
+    return JsonResponse({
+        "success": failed == 0,
+        "received": len(results),
+        "created": created,
+        "duplicates": duplicates,
+        "failed": failed,
+        "results": results,
+    })
+
+
+@login_required
+def ingest_buffer_status(request):
+    """Backlog of the MioConnect ingest stream (moderators only)"""
+    if not Moderator.objects.filter(user=request.user).exists():
+        return JsonResponse({"error": "Only moderators can view ingest status"}, status=403)
+    try:
+        lag = stream_lag()
+    except Exception as err:
+        logger.error(f"Failed to read ingest stream status: {str(err)}")
+        return JsonResponse({"error": "Ingest stream unavailable"}, status=503)
+    return JsonResponse({"mode": settings.MIO_CONNECT_INGEST_MODE, **lag})
+
+
 @login_required
 def view_documentation(request):
     # Check if the user is a moderator
@@ -634,12 +679,24 @@ def edit_documentation(request, doc_id):
         print("initial_data", initial_data)
         form = DocumentationForm(instance=documentation, initial=initial_data)
         print("Form",form)
+    
+    # Summarize the month of vitals leading up to when the note was written
+    window_end = documentation.created_at
+    window_start = window_end - timedelta(days=30)
+    vitals_summary = VitalsAggregationService().summarize_patient(patient, start=window_start, end=window_end)
+    reports = Reports.objects.filter(
+        patient=patient,
+        created_at__lt=window_end,
+    ).order_by('-created_at')[:5]
+    
     context = {
         'form': form,
         'documentation': documentation,
         'doc_id': documentation.id,  # <-- Add this line
         'patient': patient,
-        # 'reports': reports,
+        'reports': reports,
+        'vitals_summary': vitals_summary,
+        **vitals_range_context(vitals_summary),
         'now': timezone.now(),
         'full_documentation': documentation.history_of_present_illness
     }
@@ -872,21 +929,17 @@ def get_recent_reports(request, patient_id):
         for report in reports:
             # Create a summary of vital signs for display
             vitals_summary = []
-            if report.systolic_blood_pressure and report.diastolic_blood_pressure:
-                vitals_summary.append(f"BP: {report.systolic_blood_pressure}/{report.diastolic_blood_pressure}")
-            elif report.blood_pressure:
-                vitals_summary.append(f"BP: {report.blood_pressure}")
+            if report.systolic_value is not None and report.diastolic_value is not None:
+                vitals_summary.append(f"BP: {report.systolic_value}/{report.diastolic_value}")
             
-            if report.pulse:
-                vitals_summary.append(f"HR: {report.pulse}")
-            elif report.heart_rate:
-                vitals_summary.append(f"HR: {report.heart_rate}")
+            if report.heart_rate_value is not None:
+                vitals_summary.append(f"HR: {report.heart_rate_value}")
             
-            if report.spo2:
-                vitals_summary.append(f"SpO2: {report.spo2}%")
+            if report.spo2_value is not None:
+                vitals_summary.append(f"SpO2: {report.spo2_value}%")
             
-            if report.temperature:
-                vitals_summary.append(f"Temp: {report.temperature}°F")
+            if report.temperature_value is not None:
+                vitals_summary.append(f"Temp: {report.temperature_value.normalize():f}°F")
             
             reports_data.append({
                 'id': report.id,
@@ -903,29 +956,6 @@ def get_recent_reports(request, patient_id):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-def _parse_blood_pressure(bp_string, index):
-    """
-    Helper function to safely parse blood pressure values
-    
-    Args:
-        bp_string: Blood pressure string in format "systolic/diastolic"
-        index: 0 for systolic, 1 for diastolic
-    
-    Returns:
-        Parsed BP value or empty string if parsing fails
-    """
-    if not bp_string or '/' not in bp_string:
-        return ''
-    
-    try:
-        bp_parts = bp_string.split('/')
-        if len(bp_parts) >= 2:
-            return bp_parts[index].strip()
-    except (AttributeError, IndexError):
-        pass
-    
-    return ''
-
 @login_required
 def export_vitals_excel(request, patient_id):
     """
@@ -941,137 +971,16 @@ def export_vitals_excel(request, patient_id):
         return JsonResponse({"error": "Not authorized to export this patient's data"}, status=403)
     
     try:
-        patient = get_object_or_404(Patient, id=patient_id)
+        patient = get_object_or_404(Patient.objects.select_related('user'), id=patient_id)
         reports = Reports.objects.filter(patient=patient).order_by('-created_at')
         
         if not reports.exists():
             return JsonResponse({"error": "No vitals data available to export"}, status=404)
         
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Vitals Data"
-        
-        # Define styles using constants
-        header_fill = PatternFill(start_color=EXCEL_HEADER_COLOR, end_color=EXCEL_HEADER_COLOR, fill_type="solid")
-        header_font = Font(bold=True, color=EXCEL_HEADER_FONT_COLOR, size=12)
-        patient_info_fill = PatternFill(start_color=EXCEL_PATIENT_INFO_COLOR, end_color=EXCEL_PATIENT_INFO_COLOR, fill_type="solid")
-        patient_info_font = Font(bold=True, size=11)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Patient Information Section
-        ws.merge_cells('A1:F1')
-        ws['A1'] = 'PATIENT VITALS REPORT'
-        ws['A1'].font = Font(bold=True, size=16, color="7928CA")
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-        
-        ws['A3'] = 'Patient Name:'
-        ws['A3'].font = patient_info_font
-        ws['B3'] = f"{patient.user.first_name} {patient.user.last_name}"
-        
-        ws['A4'] = 'Date of Birth:'
-        ws['A4'].font = patient_info_font
-        ws['B4'] = str(patient.date_of_birth) if patient.date_of_birth else 'N/A'
-        
-        ws['A5'] = 'Email:'
-        ws['A5'].font = patient_info_font
-        ws['B5'] = patient.user.email
-        
-        ws['A6'] = 'Phone:'
-        ws['A6'].font = patient_info_font
-        ws['B6'] = patient.phone_number if patient.phone_number else 'N/A'
-        
-        ws['A7'] = 'Report Generated:'
-        ws['A7'].font = patient_info_font
-        ws['B7'] = timezone.now().strftime('%m/%d/%Y %H:%M')
-        
-        # Headers for vitals data (starting at row 9)
-        headers = [
-            'Date/Time',
-            'Systolic BP (mmHg)',
-            'Diastolic BP (mmHg)',
-            'Heart Rate (bpm)',
-            'SpO2 (%)',
-            'Temperature (°F)',
-            'Blood Glucose',
-            'Irregular Heartbeat',
-            'Symptoms'
-        ]
-        
-        header_row = 9
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=header_row, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Data rows
-        row_num = header_row + 1
-        for report in reports:
-            # Date/Time
-            ws.cell(row=row_num, column=1).value = timezone.localtime(report.created_at).strftime('%m/%d/%Y %H:%M')
-            
-            # Systolic BP - using helper function
-            systolic = report.systolic_blood_pressure or _parse_blood_pressure(report.blood_pressure, 0)
-            ws.cell(row=row_num, column=2).value = systolic
-            
-            # Diastolic BP - using helper function
-            diastolic = report.diastolic_blood_pressure or _parse_blood_pressure(report.blood_pressure, 1)
-            ws.cell(row=row_num, column=3).value = diastolic
-            
-            # Heart Rate
-            heart_rate = report.pulse or report.heart_rate or ''
-            ws.cell(row=row_num, column=4).value = heart_rate
-            
-            # SpO2
-            ws.cell(row=row_num, column=5).value = report.spo2 or ''
-            
-            # Temperature
-            ws.cell(row=row_num, column=6).value = report.temperature or ''
-            
-            # Blood Glucose
-            ws.cell(row=row_num, column=7).value = report.blood_glucose or ''
-            
-            # Irregular Heartbeat
-            ws.cell(row=row_num, column=8).value = report.irregular_heartbeat or ''
-            
-            # Symptoms
-            ws.cell(row=row_num, column=9).value = report.symptoms or ''
-            
-            # Apply borders and alignment to data cells
-            for col_num in range(1, 10):
-                cell = ws.cell(row=row_num, column=col_num)
-                cell.border = border
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            
-            row_num += 1
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 18
-        ws.column_dimensions['B'].width = 18
-        ws.column_dimensions['C'].width = 20
-        ws.column_dimensions['D'].width = 18
-        ws.column_dimensions['E'].width = 12
-        ws.column_dimensions['F'].width = 18
-        ws.column_dimensions['G'].width = 15
-        ws.column_dimensions['H'].width = 18
-        ws.column_dimensions['I'].width = 30
-        
-        # Freeze header row (freeze at the row after headers)
-        freeze_row = header_row + 1
-        ws.freeze_panes = ws[f'A{freeze_row}']
-        
-        # Create HTTP response with Excel file
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        # Write-only workbook: rows are streamed from the database into a temp file
+        wb = vitals_workbook()
+        vitals_summary = VitalsAggregationService().summarize_patient(patient)
+        write_vitals_sheet(wb, patient, vitals_export_rows(reports), summary=vitals_summary)
         
         # Sanitize filename to prevent path traversal and special character issues
         safe_last_name = re.sub(r'[^\w\s-]', '', patient.user.last_name)[:50] or 'Unknown'
@@ -1079,12 +988,204 @@ def export_vitals_excel(request, patient_id):
         timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
         filename = f"vitals_{safe_last_name}_{safe_first_name}_{timestamp}.xlsx"
         
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        wb.save(response)
-        return response
+        # FileResponse streams the file in chunks and closes it when done
+        response = FileResponse(
+            save_to_tempfile(wb),
+            as_attachment=True,
+            filename=filename,
+            content_type=XLSX_CONTENT_TYPE,
+        )
+        return stream_under_asgi(request, response)
         
     except Exception as e:
         # Log error with full details but don't expose to user
         logger.error(f"Error exporting vitals for patient: {str(e)}", exc_info=True)
         return JsonResponse({"error": "Failed to export vitals. Please contact support if the issue persists."}, status=500)
+
+
+def _export_job_range(data):
+    """
+    Reading time range of a bulk export.
+
+    Args:
+        data: Request data with "month" ("2025-01") or "start"/"end" ISO dates
+
+    Returns:
+        (start, end) aware datetimes; end is exclusive
+
+    Raises:
+        ValueError: If the range is missing or invalid
+    """
+    month = data.get('month')
+    if month:
+        try:
+            parsed = parse_date(f"{month}-01") if re.fullmatch(r'\d{4}-\d{2}', month) else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(f"Invalid month: {month}")
+        next_month = (parsed.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return _parse_datetime_param(parsed.isoformat()), _parse_datetime_param(next_month.isoformat())
+
+    start = _parse_datetime_param(data.get('start'))
+    end = _parse_datetime_param(data.get('end'))
+    if start is None or end is None:
+        raise ValueError("Provide a month or both start and end")
+    if end <= start:
+        raise ValueError("end must be after start")
+    return start, end
+
+
+def _export_job_payload(job):
+    payload = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "scope": job.scope,
+        "format": job.export_format,
+        "start": job.start.isoformat(),
+        "end": job.end.isoformat(),
+        "total_patients": job.total_patients,
+        "processed_patients": job.processed_patients,
+        "rows_written": job.rows_written,
+        "progress": job.progress,
+        "status_url": reverse('vitals_export_job_status', args=[job.id]),
+        "download_url": None,
+        "error": job.error,
+    }
+    if job.status == VitalsExportJob.STATUS_COMPLETED and job.file:
+        payload["download_url"] = reverse('vitals_export_job_download', args=[job.id])
+    return payload
+
+
+def _get_own_export_job(request, job_id):
+    """The export job if the requesting user started it (or is a superuser), else None"""
+    jobs = VitalsExportJob.objects.filter(id=job_id)
+    if not request.user.is_superuser:
+        jobs = jobs.filter(requested_by=request.user)
+    return jobs.first()
+
+
+@login_required
+@csrf_exempt
+def create_vitals_export_job(request):
+    """
+    Start a multi-patient vitals export (moderators only).
+
+    JSON body:
+        scope: "moderator" (default; the requesting moderator's patients, or moderator_id's) or "clinic"
+        format: "xlsx" (default; one workbook per patient) or "csv" (one file per patient)
+        month: "2025-01", or start/end ISO dates (end exclusive)
+
+    Returns 202 with the job status; poll status_url until download_url is set.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    moderator = Moderator.objects.filter(user=request.user).first()
+    if not moderator and not request.user.is_superuser:
+        return JsonResponse({"error": "Only moderators can export vitals"}, status=403)
+
+    try:
+        data = json.loads(request.body or '{}')
+        start, end = _export_job_range(data)
+    except json.JSONDecodeError as e:
+        return JsonResponse({"error": f"Invalid JSON data: {str(e)}"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    scope = data.get('scope', VitalsExportJob.SCOPE_MODERATOR)
+    if scope not in dict(VitalsExportJob.SCOPE_CHOICES):
+        return JsonResponse({"error": "scope must be 'moderator' or 'clinic'"}, status=400)
+    export_format = data.get('format', VitalsExportJob.FORMAT_XLSX)
+    if export_format not in dict(VitalsExportJob.FORMAT_CHOICES):
+        return JsonResponse({"error": "format must be 'xlsx' or 'csv'"}, status=400)
+
+    if scope == VitalsExportJob.SCOPE_MODERATOR:
+        if data.get('moderator_id'):
+            moderator = Moderator.objects.filter(id=data['moderator_id']).first()
+        if not moderator:
+            return JsonResponse({"error": "Moderator not found"}, status=404)
+    else:
+        moderator = None
+
+    job = VitalsExportJob.objects.create(
+        requested_by=request.user,
+        scope=scope,
+        moderator=moderator,
+        export_format=export_format,
+        start=start,
+        end=end,
+    )
+    transaction.on_commit(lambda: build_vitals_export.delay(str(job.id)))
+    return JsonResponse(_export_job_payload(job), status=202)
+
+
+@login_required
+def vitals_export_job_status(request, job_id):
+    """Progress of a bulk vitals export; download_url is set once the zip is ready"""
+    job = _get_own_export_job(request, job_id)
+    if not job:
+        return JsonResponse({"error": "Export not found"}, status=404)
+    return JsonResponse(_export_job_payload(job))
+
+
+@login_required
+def download_vitals_export_job(request, job_id):
+    """Download the zip of a completed bulk vitals export"""
+    job = _get_own_export_job(request, job_id)
+    if not job:
+        return JsonResponse({"error": "Export not found"}, status=404)
+    if job.status != VitalsExportJob.STATUS_COMPLETED or not job.file:
+        return JsonResponse({"error": "Export is not ready"}, status=409)
+
+    filename = f"vitals_{timezone.localtime(job.start):%Y%m%d}_{timezone.localtime(job.end):%Y%m%d}.zip"
+    response = FileResponse(job.file.open('rb'), as_attachment=True, filename=filename, content_type='application/zip')
+    return stream_under_asgi(request, response)
+
+
+@login_required
+def export_dataset(request, dataset):
+    """
+    Export Reports, call summaries or lab results for analytics (moderators only).
+
+    Query parameters:
+        format: "csv" (default, streamed) or "parquet"
+        since/until: Optional ISO date/datetime bounds on the dataset's date column (until exclusive)
+        patient_id: Only this patient's rows (lead_id for lead-call-summaries)
+    """
+    if not Moderator.objects.filter(user=request.user).exists() and not request.user.is_superuser:
+        return JsonResponse({"error": "Only moderators can export data"}, status=403)
+    if dataset not in EXPORT_DATASETS:
+        return JsonResponse({"error": f"Unknown dataset. Choose from: {', '.join(EXPORT_DATASETS)}"}, status=404)
+
+    export_format = request.GET.get('format', EXPORT_FORMAT_CSV)
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": "format must be 'csv' or 'parquet'"}, status=400)
+    try:
+        since = _parse_datetime_param(request.GET.get('since'))
+        until = _parse_datetime_param(request.GET.get('until'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        rows = export_rows(dataset, since=since, until=until, filters=request.GET)
+    except ValidationError as e:
+        # Malformed patient_id (UUID)
+        return JsonResponse({"error": "; ".join(e.messages)}, status=400)
+    except ValueError as e:
+        # Malformed lead_id (integer)
+        return JsonResponse({"error": str(e)}, status=400)
+    filename = f"{dataset}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+
+    if export_format == EXPORT_FORMAT_CSV:
+        response = StreamingHttpResponse(iter_csv(dataset, rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return stream_under_asgi(request, response)
+
+    try:
+        output, _ = write_parquet(dataset, rows)
+    except Exception as e:
+        logger.error(f"Parquet export of {dataset} failed: {str(e)}", exc_info=True)
+        return JsonResponse({"error": "Failed to export data"}, status=500)
+    response = FileResponse(output, as_attachment=True, filename=filename, content_type=PARQUET_CONTENT_TYPE)
+    return stream_under_asgi(request, response)
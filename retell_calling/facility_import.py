@@ -0,0 +1,127 @@
+"""
+Facility list import for bulk facility calling.
+
+Rows from ``rpm_users.imports.iter_spreadsheet_rows`` are written with
+``update_or_create`` on name, address, city, state, ZIP and phone, one
+transaction per chunk, so ImportJob can resume after the last committed chunk.
+"""
+
+import logging
+from typing import Callable, Iterable, Optional, Sequence
+
+from django.db import transaction
+
+from rpm_users.imports import IMPORT_CHUNK_SIZE, ImportFileError, ImportResult, cell_text, iter_chunks
+
+from .models import FacilityCallTarget
+
+logger = logging.getLogger(__name__)
+
+FACILITY_UPLOAD_HEADERS = {
+    'facility_name': 'Facility Name',
+    'address': 'Address',
+    'city': 'City',
+    'state': 'State',
+    'zip_code': 'ZIP',
+    'phone_number': 'Phone',
+    'phone_missing_in': 'Phone Missing In',
+    'notes_type': 'Notes / Type',
+    'county': 'County',
+    'source_name': 'Source Name',
+}
+
+
+def _normalize_header(value):
+    if value is None:
+        return ''
+    return ' '.join(str(value).strip().lower().replace('_', ' ').replace('/', ' / ').split())
+
+
+def map_facility_columns(headers: Sequence):
+    """Map FacilityCallTarget fields to 0-based column positions from the header row"""
+    header_index = {}
+    for idx, header in enumerate(headers):
+        for field_name, expected_header in FACILITY_UPLOAD_HEADERS.items():
+            if _normalize_header(header) == _normalize_header(expected_header):
+                header_index[field_name] = idx
+    return header_index
+
+
+def import_facilities(rows: Iterable[Sequence], chunk_size: int = IMPORT_CHUNK_SIZE,
+                      on_chunk: Optional[Callable[[int, ImportResult], None]] = None,
+                      skip_rows: int = 0) -> ImportResult:
+    """
+    Create or update facilities from spreadsheet rows (header row first).
+
+    Args:
+        rows: Rows from iter_spreadsheet_rows()
+        chunk_size: Rows written per transaction
+        on_chunk: Called with (data rows processed, running result) after each
+            chunk, inside the chunk's transaction
+        skip_rows: Data rows already imported by an interrupted run
+
+    Returns:
+        ImportResult with created/updated/skipped counts and per-row error messages
+
+    Raises:
+        ImportFileError: If the file is empty or has no Facility Name column
+    """
+    rows = iter(rows)
+    headers = next(rows, None)
+    if not headers:
+        raise ImportFileError('File is empty')
+    header_index = map_facility_columns(list(headers))
+    if 'facility_name' not in header_index:
+        raise ImportFileError('Facility Name column is required.')
+
+    result = ImportResult()
+    processed = skip_rows
+    for chunk in iter_chunks(rows, chunk_size, skip_rows):
+        processed += len(chunk)
+        with transaction.atomic():
+            for row_num, row in chunk:
+                row_data = {
+                    field_name: cell_text(row[index]) if index < len(row) else ''
+                    for field_name, index in header_index.items()
+                }
+                facility_name = row_data.get('facility_name', '')
+                if not facility_name:
+                    continue
+
+                defaults = {
+                    'address': row_data.get('address', ''),
+                    'city': row_data.get('city', ''),
+                    'state': row_data.get('state', ''),
+                    'zip_code': row_data.get('zip_code', ''),
+                    'phone_number': row_data.get('phone_number', ''),
+                    'phone_missing_in': row_data.get('phone_missing_in', ''),
+                    'notes_type': row_data.get('notes_type', ''),
+                    'county': row_data.get('county', ''),
+                    'source_name': row_data.get('source_name', ''),
+                    'source_row_data': row_data,
+                }
+                try:
+                    # Savepoint so one bad row doesn't abort the rest of the chunk
+                    with transaction.atomic():
+                        _, created = FacilityCallTarget.objects.update_or_create(
+                            facility_name=facility_name,
+                            address=defaults['address'] or None,
+                            city=defaults['city'] or None,
+                            state=defaults['state'] or None,
+                            zip_code=defaults['zip_code'] or None,
+                            phone_number=defaults['phone_number'] or None,
+                            defaults=defaults,
+                        )
+                except Exception as e:
+                    result.skipped += 1
+                    result.errors.append(f'Row {row_num}: {str(e)}')
+                    continue
+                if created:
+                    result.created += 1
+                else:
+                    result.updated += 1
+            if on_chunk:
+                on_chunk(processed, result)
+
+    logger.info(f"Facility import finished: {result.created} created, {result.updated} updated")
+    return result
@@ -12,7 +12,8 @@ from rest_framework import status
 import json
 import logging
 
-from rpm_users.models import Patient, InterestLead
+from rpm_users.models import Patient, InterestLead, ImportJob
+from rpm_users.views import start_import_job
 from reports.models import Reports
 from rpm_users.models import  PastMedicalHistory
 from django.utils import timezone
@@ -25,72 +26,6 @@ from .models import RetellCallSession, CallSummary, LeadCallSession, LeadCallSum
 logger = logging.getLogger('retell_calling.views')
 
 
-FACILITY_UPLOAD_HEADERS = {
-    'facility_name': 'Facility Name',
-    'address': 'Address',
-    'city': 'City',
-    'state': 'State',
-    'zip_code': 'ZIP',
-    'phone_number': 'Phone',
-    'phone_missing_in': 'Phone Missing In',
-    'notes_type': 'Notes / Type',
-    'county': 'County',
-    'source_name': 'Source Name',
-}
-
-
-def _normalize_header(value):
-    if value is None:
-        return ''
-    return ' '.join(str(value).strip().lower().replace('_', ' ').replace('/', ' / ').split())
-
-
-def _load_spreadsheet_rows(uploaded_file):
-    import csv
-    import tempfile
-    import os
-    from openpyxl import load_workbook, Workbook
-
-    file_name_lower = uploaded_file.name.lower()
-    suffix = '.csv' if file_name_lower.endswith('.csv') else '.xlsx'
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-        for chunk in uploaded_file.chunks():
-            tmp_file.write(chunk)
-        tmp_file_path = tmp_file.name
-
-    try:
-        if suffix == '.csv':
-            with open(tmp_file_path, 'r', encoding='utf-8-sig') as csvfile:
-                rows = list(csv.reader(csvfile))
-            if not rows:
-                raise ValueError('CSV file is empty')
-
-            workbook = Workbook()
-            worksheet = workbook.active
-            for row_idx, row in enumerate(rows, 1):
-                for col_idx, value in enumerate(row, 1):
-                    worksheet.cell(row=row_idx, column=col_idx, value=value)
-            return worksheet
-
-        try:
-            workbook = load_workbook(tmp_file_path)
-            return workbook.active
-        except Exception:
-            import pandas as pd
-            dataframe = pd.read_excel(tmp_file_path)
-            converted_path = tmp_file_path.replace(suffix, '_converted.xlsx')
-            dataframe.to_excel(converted_path, index=False, engine='openpyxl')
-            workbook = load_workbook(converted_path)
-            os.unlink(converted_path)
-            return workbook.active
-    finally:
-        try:
-            os.unlink(tmp_file_path)
-        except Exception:
-            pass
-
-
 @api_view(['POST'])
 def trigger_call(request):
     """
@@ -1252,16 +1187,20 @@ def call_summaries_list(request):
     Display all patients with their call summary counts for admin access.
     """
     try:
-        # Get all patients with their call summary counts
-        patients_with_calls = Patient.objects.select_related('user').annotate(
-            call_count=models.Count('call_summaries'),
-            latest_call=models.Max('call_summaries__generated_at')
-        ).filter(call_count__gt=0).order_by('-latest_call')
+        # Call summary counts come from the per-patient activity summary
+        patients_with_calls = Patient.objects.select_related('user').filter(
+            activity_summary__call_summary_count__gt=0
+        ).annotate(
+            call_count=models.F('activity_summary__call_summary_count'),
+            latest_call=models.F('activity_summary__last_call_summary_at')
+        ).order_by('-latest_call')
         
         # Get patients without calls
-        patients_without_calls = Patient.objects.select_related('user').annotate(
-            call_count=models.Count('call_summaries')
-        ).filter(call_count=0).order_by('user__first_name', 'user__last_name')
+        patients_without_calls = Patient.objects.select_related('user').exclude(
+            activity_summary__call_summary_count__gt=0
+        ).annotate(
+            call_count=models.Value(0)
+        ).order_by('user__first_name', 'user__last_name')
         
         context = {
             'patients_with_calls': patients_with_calls,
@@ -1771,76 +1710,13 @@ def trigger_lead_call(request):
 @user_passes_test(lambda u: u.is_superuser, login_url='admin_login')
 def facility_calls_dashboard(request):
     """Admin page for uploading facility lists and starting bulk facility calls."""
-    imported_count = 0
-    updated_count = 0
-    import_errors = []
-
     if request.method == 'POST' and request.FILES.get('facility_file'):
-        try:
-            worksheet = _load_spreadsheet_rows(request.FILES['facility_file'])
-            headers = [_normalize_header(cell.value) for cell in worksheet[1]]
-            header_index = {}
-            for idx, header in enumerate(headers, 1):
-                for field_name, expected_header in FACILITY_UPLOAD_HEADERS.items():
-                    if header == _normalize_header(expected_header):
-                        header_index[field_name] = idx
-
-            if 'facility_name' not in header_index:
-                messages.error(request, 'Facility Name column is required.')
-                return redirect('retell_calling:facility_calls_dashboard')
-
-            for row_num in range(2, worksheet.max_row + 1):
-                row_data = {}
-                for field_name, column_index in header_index.items():
-                    value = worksheet.cell(row=row_num, column=column_index).value
-                    row_data[field_name] = str(value).strip() if value is not None else ''
-
-                facility_name = row_data.get('facility_name', '').strip()
-                if not facility_name:
-                    continue
-
-                defaults = {
-                    'address': row_data.get('address', ''),
-                    'city': row_data.get('city', ''),
-                    'state': row_data.get('state', ''),
-                    'zip_code': row_data.get('zip_code', ''),
-                    'phone_number': row_data.get('phone_number', ''),
-                    'phone_missing_in': row_data.get('phone_missing_in', ''),
-                    'notes_type': row_data.get('notes_type', ''),
-                    'county': row_data.get('county', ''),
-                    'source_name': row_data.get('source_name', ''),
-                    'source_row_data': row_data,
-                }
-
-                facility, created = FacilityCallTarget.objects.update_or_create(
-                    facility_name=facility_name,
-                    address=defaults['address'] or None,
-                    city=defaults['city'] or None,
-                    state=defaults['state'] or None,
-                    zip_code=defaults['zip_code'] or None,
-                    phone_number=defaults['phone_number'] or None,
-                    defaults=defaults,
-                )
-
-                if created:
-                    imported_count += 1
-                else:
-                    updated_count += 1
-
-            if imported_count or updated_count:
-                messages.success(
-                    request,
-                    f'Imported {imported_count} new facilities and updated {updated_count} existing records.'
-                )
-            else:
-                messages.warning(request, 'No facility rows were imported.')
-
+        facility_file = request.FILES['facility_file']
+        job = start_import_job(request, facility_file, ImportJob.KIND_FACILITIES)
+        if job is None:
             return redirect('retell_calling:facility_calls_dashboard')
-
-        except Exception as e:
-            logger.error(f"Facility import failed: {str(e)}")
-            import_errors.append(str(e))
-            messages.error(request, f'Failed to import facilities: {str(e)}')
+        messages.info(request, f'Importing facilities from {facility_file.name}. You can leave this page; the import continues in the background.')
+        return redirect('import_job_detail', job_id=job.id)
 
     facility_call_qs = FacilityCallTarget.objects.annotate(
         call_count=models.Count('facility_call_sessions'),
@@ -1859,7 +1735,7 @@ def facility_calls_dashboard(request):
         'facilities': facility_call_qs,
         'recent_summaries': recent_summaries,
         'latest_bulk_session': latest_bulk_session,
-        'import_errors': import_errors,
+        'recent_imports': ImportJob.objects.filter(kind=ImportJob.KIND_FACILITIES)[:5],
     }
 
     return render(request, 'retell_calling/facility_calls_dashboard.html', context)
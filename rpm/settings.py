@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # System apps
     'rpm_users',
@@ -163,6 +164,43 @@ CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
+CELERY_BEAT_SCHEDULE = {
+    # Safety net for the MioConnect ingest stream; the webhook also triggers a drain on enqueue
+    'drain-mio-connect-stream': {
+        'task': 'reports.tasks.drain_mio_connect_stream',
+        'schedule': 10.0,
+    },
+    # Restart imports whose worker died mid-file (rpm_users.ImportJob)
+    'resume-stale-import-jobs': {
+        'task': 'rpm_users.tasks.resume_stale_import_jobs',
+        'schedule': 300.0,
+    },
+}
+
+# Abnormal vitals alerts (reports.alerts)
+# Suppress repeat alerts for the same patient and metric within the cooldown
+VITALS_ALERT_COOLDOWN_MINUTES = int(os.environ.get('VITALS_ALERT_COOLDOWN_MINUTES', 60))
+# 0 sends one email per reading; otherwise pending alerts are batched into a digest
+VITALS_ALERT_DIGEST_MINUTES = int(os.environ.get('VITALS_ALERT_DIGEST_MINUTES', 0))
+
+# Largest backlog accepted by the MioConnect batch endpoint in one request
+MIO_CONNECT_BATCH_MAX_ITEMS = int(os.environ.get('MIO_CONNECT_BATCH_MAX_ITEMS', 1000))
+
+# 'sync' stores readings in the webhook; 'buffered' appends them to a Redis stream
+# and returns 202, and Celery drains the stream into Reports (reports.ingest_buffer)
+MIO_CONNECT_INGEST_MODE = os.environ.get('MIO_CONNECT_INGEST_MODE', 'sync')
+MIO_CONNECT_STREAM_KEY = os.environ.get('MIO_CONNECT_STREAM_KEY', 'reports:mioconnect:ingest')
+MIO_CONNECT_STREAM_GROUP = 'reports-ingest'
+# Approximate cap on stream length; keep it well above any expected backlog
+MIO_CONNECT_STREAM_MAXLEN = int(os.environ.get('MIO_CONNECT_STREAM_MAXLEN', 1000000))
+
+# Bulk vitals exports (reports.VitalsExportJob); kept out of MEDIA_ROOT because nginx serves it
+VITALS_EXPORT_ROOT = os.environ.get('VITALS_EXPORT_ROOT', os.path.join(BASE_DIR, 'private', 'exports'))
+
+# Uploaded lead and facility lists waiting for rpm_users.ImportJob; private for the same reason
+IMPORT_UPLOAD_ROOT = os.environ.get('IMPORT_UPLOAD_ROOT', os.path.join(BASE_DIR, 'private', 'imports'))
+# A running import whose last checkpoint is older than this is assumed dead and resumed
+IMPORT_JOB_STALE_MINUTES = int(os.environ.get('IMPORT_JOB_STALE_MINUTES', 10))
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -278,6 +316,8 @@ RETELL_FROM_NUMBER = os.environ.get('RETELL_FROM_NUMBER')
 
 # Gemini AI configuration
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+# "No interaction" answers cached in the interaction matrix are re-asked after this many days
+MEDICINE_NO_INTERACTION_TTL_DAYS = int(os.environ.get('MEDICINE_NO_INTERACTION_TTL_DAYS', 30))
 
 # Twilio-related settings
 if not TWILIO_ACCOUNT_SID:
@@ -334,6 +374,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'reports': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
         'retell_calling': {
             'handlers': ['file', 'console'],
             'level': 'INFO',
@@ -0,0 +1,47 @@
+"""
+Batch work scheduled during a transaction into one callback after it commits.
+
+Signals fire once per row, so a QuerySet delete or a bulk ingest would queue
+one on_commit callback per row. ``on_commit_batched`` collects the items of
+a transaction per name and hands them to a single callback call instead.
+"""
+
+import threading
+from typing import Any, Callable, Hashable, Iterable, List
+
+from django.db import transaction
+
+# Items waiting for the current transaction to commit, per thread and name. Items of
+# a rolled-back transaction go out with the next commit, so callbacks must tolerate them.
+_local = threading.local()
+
+
+def on_commit_batched(name: str, items: Iterable[Hashable], callback: Callable[[List[Any]], Any]):
+    """
+    Call ``callback`` with every item scheduled under ``name`` once the surrounding transaction commits.
+
+    Each item is passed once, in sorted order. The callback runs as a robust
+    on_commit hook: an exception is logged instead of failing a request whose
+    writes have already been committed.
+    """
+    items = set(items)
+    if not items:
+        return
+    pending = _pending(name)
+    pending.update(items)
+
+    def flush():
+        # The first callback of the transaction sends everything; the rest find nothing left
+        if not pending:
+            return
+        batch = sorted(pending)
+        pending.clear()
+        callback(batch)
+
+    transaction.on_commit(flush, robust=True)
+
+
+def _pending(name: str) -> set:
+    if not hasattr(_local, 'pending'):
+        _local.pending = {}
+    return _local.pending.setdefault(name, set())
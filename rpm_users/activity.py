@@ -0,0 +1,140 @@
+"""
+Maintenance of PatientActivitySummary.
+
+Patient lists show each patient's latest vital, documentation and call and
+their call summary count. Signals keep one summary row per patient current
+as those rows are written, so list views join one row per patient instead of
+running four subqueries. ``rebuild_activity_summaries`` (the
+``rebuild_activity_summaries`` management command) recomputes the rows from
+scratch and repairs any drift.
+"""
+
+from typing import Any, Iterable, Optional
+
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from rpm.transactions import on_commit_batched
+
+from .models import Patient, PatientActivitySummary
+
+
+def _advance(patient_id: Any, time_field: str, **values):
+    """
+    Point a patient's summary at a newer row.
+
+    The update only applies if the row is at least as recent as the one
+    already recorded, so out-of-order writes never move the summary back.
+    """
+    if not patient_id:
+        return
+    newer = models.Q(**{f'{time_field}__isnull': True}) | models.Q(**{f'{time_field}__lte': values[time_field]})
+    if PatientActivitySummary.objects.filter(newer, patient_id=patient_id).update(**values):
+        return
+    # Either the patient has no summary yet or it already points at something newer
+    PatientActivitySummary.objects.get_or_create(patient_id=patient_id, defaults=values)
+
+
+def record_vital(report):
+    _advance(report.patient_id, 'last_vital_at', last_vital_id=report.pk, last_vital_at=report.created_at)
+
+
+def record_vitals(reports: Iterable[Any]):
+    """Record bulk-created reports (bulk_create sends no post_save) with one update per patient"""
+    latest = {}
+    for report in reports:
+        current = latest.get(report.patient_id)
+        if current is None or (report.created_at, report.pk) > (current.created_at, current.pk):
+            latest[report.patient_id] = report
+    for report in latest.values():
+        record_vital(report)
+
+
+def record_documentation(documentation):
+    _advance(
+        documentation.patient_id, 'last_documentation_at',
+        last_documentation_id=documentation.pk, last_documentation_at=documentation.created_at,
+    )
+
+
+def record_call(call_session):
+    """Called on every save, so status changes of the latest call are picked up too"""
+    _advance(
+        call_session.patient_id, 'last_call_at',
+        last_call_status=call_session.call_status, last_call_at=call_session.created_at,
+    )
+
+
+def _summary_stats():
+    from retell_calling.models import CallSummary
+
+    summaries = CallSummary.objects.filter(patient=models.OuterRef('patient_id')).order_by()
+    return {
+        'call_summary_count': Coalesce(
+            models.Subquery(summaries.values('patient').annotate(count=models.Count('pk')).values('count')), 0,
+        ),
+        'last_call_summary_at': models.Subquery(
+            summaries.values('patient').annotate(latest=models.Max('generated_at')).values('latest'),
+        ),
+    }
+
+
+def refresh_call_summaries(patient_id: Any):
+    """Recount a patient's call summaries after one is created"""
+    if not patient_id:
+        return
+    PatientActivitySummary.objects.get_or_create(patient_id=patient_id)
+    PatientActivitySummary.objects.filter(patient_id=patient_id).update(**_summary_stats())
+
+
+def schedule_rebuild(patient_id: Any):
+    """
+    Rebuild a patient's summary once the surrounding transaction commits.
+
+    A QuerySet delete sends post_delete per row; all patients scheduled in one
+    transaction are rebuilt together, once each.
+    """
+    if not patient_id:
+        return
+    # A failed rebuild is logged; the rebuild_activity_summaries command repairs it
+    on_commit_batched('activity_summaries', [patient_id], rebuild_activity_summaries)
+
+
+def rebuild_activity_summaries(patient_ids: Optional[Iterable[Any]] = None, batch_size: int = 500) -> int:
+    """
+    Recompute summaries from Reports, Documentation, RetellCallSession and CallSummary.
+
+    Args:
+        patient_ids: Optional patients to restrict the rebuild to
+        batch_size: Patients rebuilt per UPDATE statement
+
+    Returns:
+        Number of summary rows rebuilt
+    """
+    from reports.models import Documentation, Reports
+    from retell_calling.models import RetellCallSession
+
+    patients = Patient.objects.order_by('pk')
+    if patient_ids is not None:
+        patients = patients.filter(pk__in=list(patient_ids))
+    all_ids = list(patients.values_list('pk', flat=True))
+
+    latest_vital = Reports.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at', '-id')
+    latest_doc = Documentation.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at', '-id')
+    latest_call = RetellCallSession.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at')
+    rebuilt = 0
+    for offset in range(0, len(all_ids), batch_size):
+        batch = all_ids[offset:offset + batch_size]
+        PatientActivitySummary.objects.bulk_create(
+            [PatientActivitySummary(patient_id=patient_id) for patient_id in batch], ignore_conflicts=True,
+        )
+        rebuilt += PatientActivitySummary.objects.filter(patient_id__in=batch).update(
+            last_vital_id=models.Subquery(latest_vital.values('id')[:1]),
+            last_vital_at=models.Subquery(latest_vital.values('created_at')[:1]),
+            last_documentation_id=models.Subquery(latest_doc.values('id')[:1]),
+            last_documentation_at=models.Subquery(latest_doc.values('created_at')[:1]),
+            last_call_status=models.Subquery(latest_call.values('call_status')[:1]),
+            last_call_at=models.Subquery(latest_call.values('created_at')[:1]),
+            **_summary_stats(),
+        )
+    return rebuilt
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Moderator, Patient, PastMedicalHistory, Interest, InterestPastMedicalHistory, InterestLead, Doctor
+from .models import Moderator, Patient, PastMedicalHistory, Interest, InterestPastMedicalHistory, InterestLead, Doctor, ImportJob
 from reports.models import Reports
 
 # class ReportInline(admin.TabularInline):
@@ -23,6 +23,7 @@ from reports.models import Reports
 # Register the Patient model
 admin.site.register(Patient)
 admin.site.register(Doctor)
+admin.site.register(ImportJob)
 
 # Register the Moderator model
 admin.site.register(Moderator)
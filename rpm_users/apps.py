@@ -7,3 +7,4 @@ class UsersConfig(AppConfig):
     
     def ready(self):
         import rpm_users.signals
+        import rpm_users.search
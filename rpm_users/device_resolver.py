@@ -0,0 +1,205 @@
+"""
+Device serial number -> patient resolution for device webhooks.
+
+Every MioConnect reading has to be mapped to a patient by its serial number
+before anything else happens. The mapping changes rarely, so it is cached in two
+tiers: a small process-local LRU in front of the shared django-redis cache.
+Patient post_save/post_delete signals (see rpm_users.signals) clear the shared
+cache and the local tier of the current process once the change commits; other
+processes drop their local copy after ``local_ttl`` seconds.
+
+A request may read a serial's old patient from the database just before a
+reassignment commits and write it to the cache after the invalidation ran.
+Invalidation therefore also gives the serial a new generation token, and shared
+entries are stored with the generation that was current before the database
+read, so such late writes are ignored instead of being served for a day.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'device-serial-patient'
+GENERATION_KEY_PREFIX = 'device-serial-generation'
+
+# Patient.device_serial_number is a bigint
+MAX_SERIAL = 2 ** 63 - 1
+
+# Stored for serials that do not belong to any patient, so unknown devices do not hit the database
+NOT_FOUND = ''
+
+
+def normalize_serial(device_serial: Any) -> Optional[int]:
+    """Patient.device_serial_number is a bigint; other serials cannot match a patient"""
+    try:
+        serial = int(str(device_serial).strip())
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= serial <= MAX_SERIAL:
+        return None
+    return serial
+
+
+class DeviceSerialResolver:
+    """Resolve device serial numbers to patient ids through a local LRU and the shared cache"""
+
+    def __init__(self, max_entries: int = 10000, local_ttl: int = 30,
+                 cache_ttl: int = 24 * 60 * 60, not_found_ttl: int = 60):
+        """
+        Args:
+            max_entries: Serials kept in the process-local LRU
+            local_ttl: Seconds a local entry is trusted (bounds staleness in other processes)
+            cache_ttl: Seconds a known serial stays in the shared cache
+            not_found_ttl: Seconds an unknown serial stays cached
+        """
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.cache_ttl = cache_ttl
+        self.not_found_ttl = not_found_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(); a load that overlapped an invalidation is not kept locally
+        self._invalidations = 0
+
+    @staticmethod
+    def cache_key(serial: int) -> str:
+        return f'{CACHE_KEY_PREFIX}:{serial}'
+
+    @staticmethod
+    def generation_key(serial: int) -> str:
+        return f'{GENERATION_KEY_PREFIX}:{serial}'
+
+    def resolve(self, device_serial: Any) -> Optional[str]:
+        """
+        Returns:
+            Patient id (as a string) or None if no patient has this device
+        """
+        serial = normalize_serial(device_serial)
+        if serial is None:
+            return None
+        return self.resolve_many([serial]).get(serial)
+
+    def resolve_many(self, device_serials: Iterable[Any]) -> Dict[int, str]:
+        """
+        Resolve several serials with at most one cache round-trip and one query.
+
+        Returns:
+            {normalized serial: patient id} for serials that belong to a patient
+        """
+        serials = {serial for serial in map(normalize_serial, device_serials) if serial is not None}
+        found = {}
+
+        missing = set()
+        for serial in serials:
+            patient_id = self._get_local(serial)
+            if patient_id is None:
+                missing.add(serial)
+            elif patient_id != NOT_FOUND:
+                found[serial] = patient_id
+        if not missing:
+            return found
+
+        keys = [self.cache_key(serial) for serial in missing] + [self.generation_key(serial) for serial in missing]
+        try:
+            shared = cache.get_many(keys)
+        except Exception as e:
+            # A cache outage must not stop ingestion; fall through to the database
+            logger.error(f"Device serial cache unavailable: {str(e)}")
+            shared = {}
+        generations = {serial: shared.get(self.generation_key(serial)) for serial in missing}
+        for serial in list(missing):
+            entry = shared.get(self.cache_key(serial))
+            # Entries written before the serial's last invalidation are stale
+            if not isinstance(entry, tuple) or entry[0] != generations[serial]:
+                continue
+            patient_id = entry[1]
+            missing.discard(serial)
+            self._set_local(serial, patient_id)
+            if patient_id != NOT_FOUND:
+                found[serial] = patient_id
+        if not missing:
+            return found
+
+        invalidations = self._invalidations
+        loaded = self._load(missing)
+        known = {
+            self.cache_key(serial): (generations[serial], patient_id) for serial, patient_id in loaded.items()
+        }
+        unknown = {
+            self.cache_key(serial): (generations[serial], NOT_FOUND) for serial in missing if serial not in loaded
+        }
+        try:
+            if known:
+                cache.set_many(known, timeout=self.cache_ttl)
+            if unknown:
+                cache.set_many(unknown, timeout=self.not_found_ttl)
+        except Exception as e:
+            logger.error(f"Failed to populate device serial cache: {str(e)}")
+        if invalidations == self._invalidations:
+            for serial in missing:
+                self._set_local(serial, loaded.get(serial, NOT_FOUND))
+
+        found.update(loaded)
+        return found
+
+    @staticmethod
+    def _load(serials: Iterable[int]) -> Dict[int, str]:
+        from .models import Patient
+
+        return {
+            serial: str(patient_id)
+            for serial, patient_id in Patient.objects.filter(
+                device_serial_number__in=serials
+            ).values_list('device_serial_number', 'id')
+        }
+
+    def invalidate(self, *device_serials: Any):
+        """Forget cached mappings for the given serials (None values are ignored)"""
+        serials = {serial for serial in map(normalize_serial, device_serials) if serial is not None}
+        if not serials:
+            return
+        with self._lock:
+            self._invalidations += 1
+            for serial in serials:
+                self._local.pop(serial, None)
+        try:
+            # The new generation outlives every entry written before it
+            cache.set_many(
+                {self.generation_key(serial): uuid.uuid4().hex for serial in serials}, timeout=self.cache_ttl,
+            )
+            cache.delete_many([self.cache_key(serial) for serial in serials])
+        except Exception as e:
+            logger.error(f"Failed to invalidate device serial cache: {str(e)}")
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, serial: int) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(serial)
+            if entry is None:
+                return None
+            patient_id, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._local[serial]
+                return None
+            self._local.move_to_end(serial)
+            return patient_id
+
+    def _set_local(self, serial: int, patient_id: str):
+        with self._lock:
+            self._local[serial] = (patient_id, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(serial)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+
+device_serial_resolver = DeviceSerialResolver()
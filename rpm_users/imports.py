@@ -0,0 +1,117 @@
+"""
+Shared spreadsheet reading for the lead and facility importers.
+
+Files are read lazily (``csv.reader`` or openpyxl read-only ``iter_rows``) so
+an import holds one chunk of rows in memory at a time. The importers
+(``rpm_users.lead_import``, ``retell_calling.facility_import``) take the row
+iterator, work in chunks and report progress through an ``on_chunk``
+callback, which ImportJob uses to checkpoint (see ``rpm_users.tasks.run_import_job``).
+"""
+
+import csv
+import itertools
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+IMPORT_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Rows processed per chunk (one transaction and one progress checkpoint each)
+IMPORT_CHUNK_SIZE = 1000
+
+
+class ImportFileError(Exception):
+    """The file as a whole can't be imported (unreadable, empty or missing required columns)"""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def cell_text(value) -> str:
+    """Spreadsheet cell as stripped text; Excel stores phone numbers and IDs as floats"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.strftime('%m/%d/%Y')
+    return str(value).strip()
+
+
+def iter_spreadsheet_rows(path: str, extension: str) -> Iterator[Sequence]:
+    """
+    Yield the rows of a spreadsheet, header row first, without loading the whole file.
+
+    Raises:
+        ImportFileError: If the file can't be read
+    """
+    if extension == '.csv':
+        # utf-8-sig drops the BOM Excel adds to CSV exports
+        with open(path, newline='', encoding='utf-8-sig', errors='replace') as csv_file:
+            yield from csv.reader(csv_file)
+    elif extension == '.xlsx':
+        import openpyxl
+
+        try:
+            workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFileError(f'Could not read Excel file: {e}')
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls has no streaming reader; pandas (xlrd) reads it in one go
+        try:
+            import pandas as pd
+
+            frame = pd.read_excel(path, header=None, dtype=object)
+        except Exception as e:
+            raise ImportFileError(f'Could not read Excel file: {e}')
+        for row in frame.itertuples(index=False, name=None):
+            yield [None if pd.isna(value) else value for value in row]
+
+
+def count_spreadsheet_rows(path: str, extension: str) -> int:
+    """Number of data rows (excluding the header), for progress reporting; 0 if unknown"""
+    if extension == '.xlsx':
+        import openpyxl
+
+        try:
+            workbook = openpyxl.load_workbook(path, read_only=True)
+        except Exception:
+            return 0
+        try:
+            # Read from the sheet's stored dimensions, without reading any rows
+            return max((workbook.active.max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+    try:
+        return max(sum(1 for _ in iter_spreadsheet_rows(path, extension)) - 1, 0)
+    except ImportFileError:
+        return 0
+
+
+def iter_chunks(rows: Iterable[Sequence], chunk_size: int, skip_rows: int = 0) -> Iterator[List[Tuple[int, Sequence]]]:
+    """
+    Chunks of (spreadsheet row number, row) for the data rows after the header.
+
+    Args:
+        rows: Data rows (header already consumed)
+        chunk_size: Rows per chunk
+        skip_rows: Data rows already processed by an earlier, interrupted run
+    """
+    # Row 1 is the header
+    numbered_rows = itertools.islice(enumerate(rows, start=2), skip_rows, None)
+    while True:
+        chunk = list(itertools.islice(numbered_rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,192 @@
+"""
+Lead import from CSV and Excel spreadsheets.
+
+Rows from ``rpm_users.imports.iter_spreadsheet_rows`` are validated and
+phone-normalized in memory, then written in chunks: one
+``phone_number__in`` query per chunk finds existing leads and one
+``bulk_create`` inserts the rest. ``bulk_create`` skips ``InterestLead.save()``
+and its ``post_save`` notification, so callers send a single summary instead
+(``send_lead_import_summary``).
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from django.db import transaction
+
+from .imports import IMPORT_CHUNK_SIZE, ImportFileError, ImportResult, cell_text, iter_chunks
+from .models import InterestLead
+from .utils import clean_phone_number
+
+logger = logging.getLogger(__name__)
+
+LEAD_IMPORT_REQUIRED_COLUMNS = ('first_name', 'last_name', 'phone_number')
+
+
+def map_lead_columns(headers: Sequence) -> Dict[str, int]:
+    """Map InterestLead fields to 0-based column positions from the header row (case-insensitive)"""
+    column_mapping = {}
+    for i, header in enumerate(headers):
+        if not header or not isinstance(header, str):
+            continue
+        header_lower = header.lower().strip()
+        if 'first' in header_lower and 'name' in header_lower:
+            column_mapping['first_name'] = i
+        elif 'last' in header_lower and 'name' in header_lower:
+            column_mapping['last_name'] = i
+        elif header_lower == 'phone_number' or (header_lower == 'phone' and 'phone 2' not in headers[i + 1:i + 3]):
+            column_mapping['phone_number'] = i
+        elif header_lower == 'phone_number_2':
+            column_mapping['phone_number_2'] = i
+        elif header_lower == 'street 1':
+            column_mapping['street_address'] = i
+        elif header_lower == 'city':
+            column_mapping['city'] = i
+        elif header_lower == 'zip code':
+            column_mapping['zip_code'] = i
+        elif 'mrn' in header_lower:
+            column_mapping['mrn_number'] = i
+        elif 'date' in header_lower:
+            column_mapping['date_of_birth'] = i
+        elif header_lower in ('sex', 's'):
+            column_mapping['sex'] = i
+        elif header_lower in ('marital status', 'm'):
+            column_mapping['marital_status'] = i
+        elif header_lower == 'primary insured id':
+            column_mapping['primary_insured_id'] = i
+        elif header_lower == 'primary insurance':
+            column_mapping['insurance'] = i
+    return column_mapping
+
+
+def parse_date_of_birth(date_str: str) -> Optional[date]:
+    """MM/DD/YYYY, or MM/DD in the current year; None when unparseable"""
+    parts = date_str.split('/')
+    try:
+        if len(parts) == 2:
+            return datetime.strptime(f"{date_str}/{datetime.now().year}", "%m/%d/%Y").date()
+        if len(parts) == 3:
+            return datetime.strptime(date_str, "%m/%d/%Y").date()
+    except ValueError:
+        pass
+    return None
+
+
+def _max_lengths() -> Dict[str, int]:
+    return {
+        model_field.name: model_field.max_length
+        for model_field in InterestLead._meta.get_fields()
+        if getattr(model_field, 'max_length', None)
+    }
+
+
+def _lead_from_row(row_data: Dict[str, str], max_lengths: Dict[str, int]):
+    """
+    Build an unsaved lead from a row's text values.
+
+    Returns:
+        (lead, None) or (None, error message)
+    """
+    first_name = row_data.get('first_name', '')
+    last_name = row_data.get('last_name', '')
+    if not row_data.get('phone_number'):
+        return None, 'Missing phone number'
+    if not first_name and not last_name:
+        return None, 'Either first name or last name must be provided'
+
+    lead_data = {
+        name: value for name, value in row_data.items()
+        if value and name not in ('date_of_birth', 'sex')
+    }
+    lead_data['phone_number'] = clean_phone_number(row_data['phone_number'])
+    if lead_data.get('phone_number_2'):
+        lead_data['phone_number_2'] = clean_phone_number(lead_data['phone_number_2'])
+    if row_data.get('sex'):
+        # Take first character and uppercase
+        lead_data['sex'] = row_data['sex'].upper()[:1]
+    if row_data.get('date_of_birth'):
+        lead_data['date_of_birth'] = parse_date_of_birth(row_data['date_of_birth'])
+
+    # bulk_create would reject the whole chunk, so oversized values are caught per row
+    for name, value in lead_data.items():
+        if isinstance(value, str) and name in max_lengths and len(value) > max_lengths[name]:
+            return None, f'Validation error - {name} is longer than {max_lengths[name]} characters'
+    return InterestLead(**lead_data), None
+
+
+def import_leads(rows: Iterable[Sequence], chunk_size: int = IMPORT_CHUNK_SIZE,
+                 on_chunk: Optional[Callable[[int, ImportResult], None]] = None,
+                 skip_rows: int = 0) -> ImportResult:
+    """
+    Import leads from spreadsheet rows (header row first).
+
+    Leads whose normalized phone number already exists, in the database or
+    earlier in the file, are skipped.
+
+    Args:
+        rows: Rows from iter_spreadsheet_rows()
+        chunk_size: Rows validated and inserted per batch
+        on_chunk: Called with (data rows processed, running result) after each
+            batch, inside the batch's transaction
+        skip_rows: Data rows already imported by an interrupted run
+
+    Returns:
+        ImportResult with created/skipped counts and per-row error messages
+
+    Raises:
+        ImportFileError: If the file is empty or lacks the required columns
+    """
+    rows = iter(rows)
+    headers = next(rows, None)
+    if not headers:
+        raise ImportFileError('File is empty')
+    column_mapping = map_lead_columns(list(headers))
+    if not all(column_mapping.get(name) is not None for name in LEAD_IMPORT_REQUIRED_COLUMNS):
+        raise ImportFileError('Excel file must contain columns for first_name, last_name, and phone_number')
+
+    max_lengths = _max_lengths()
+    result = ImportResult()
+    seen_phones = set()
+    processed = skip_rows
+
+    for chunk in iter_chunks(rows, chunk_size, skip_rows):
+        processed += len(chunk)
+
+        candidates = []
+        for row_num, row in chunk:
+            row_data = {
+                name: cell_text(row[index]) if index < len(row) else ''
+                for name, index in column_mapping.items()
+            }
+            # Skip empty rows
+            if not any(row_data.get(name) for name in LEAD_IMPORT_REQUIRED_COLUMNS):
+                continue
+            lead, error = _lead_from_row(row_data, max_lengths)
+            if error:
+                result.skipped += 1
+                result.errors.append(f'Row {row_num}: {error}')
+                continue
+            candidates.append((row_num, lead))
+
+        existing = set(
+            InterestLead.objects.filter(phone_number__in={lead.phone_number for _, lead in candidates})
+            .values_list('phone_number', flat=True)
+        )
+        new_leads = []
+        for row_num, lead in candidates:
+            if lead.phone_number in existing or lead.phone_number in seen_phones:
+                result.skipped += 1
+                result.errors.append(f'Row {row_num}: Lead with phone number {lead.phone_number} already exists')
+                continue
+            seen_phones.add(lead.phone_number)
+            new_leads.append(lead)
+
+        with transaction.atomic():
+            InterestLead.objects.bulk_create(new_leads)
+            result.created += len(new_leads)
+            if on_chunk:
+                on_chunk(processed, result)
+
+    logger.info(f"Lead import finished: {result.created} created, {result.skipped} skipped")
+    return result
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from rpm_users.activity import rebuild_activity_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-patient activity summaries (latest vital, documentation, call and summary count)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patient',
+            action='append',
+            help='Only rebuild the summary of this patient ID (can be repeated)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Patients rebuilt per UPDATE statement (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding patient activity summaries...')
+        rebuilt = rebuild_activity_summaries(patient_ids=options['patient'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {rebuilt} activity summaries'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0028_reports_patient_created_index'),
+        ('rpm_users', '0052_alter_interestpastmedicalhistory_pmh_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientActivitySummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_summary', serialize=False, to='rpm_users.patient')),
+                ('last_vital_at', models.DateTimeField(blank=True, null=True)),
+                ('last_documentation_at', models.DateTimeField(blank=True, null=True)),
+                ('last_call_status', models.CharField(blank=True, max_length=20, null=True)),
+                ('last_call_at', models.DateTimeField(blank=True, null=True)),
+                ('call_summary_count', models.PositiveIntegerField(default=0)),
+                ('last_call_summary_at', models.DateTimeField(blank=True, null=True)),
+                ('last_documentation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reports.documentation')),
+                ('last_vital', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reports.reports')),
+            ],
+            options={
+                'verbose_name_plural': 'Patient activity summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rpm_users', '0053_patient_activity_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='allergy_list',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='family_history_list',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='medication_list',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='pharmacy_details',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
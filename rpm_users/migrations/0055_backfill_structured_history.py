@@ -0,0 +1,63 @@
+import re
+
+from django.db import migrations
+
+# The free-text parsers from rpm_users.utils at 0054; new saves parse in Patient.save()
+
+STRUCTURED_HISTORY_FIELDS = ('medication_list', 'allergy_list', 'pharmacy_details', 'family_history_list')
+CHUNK_SIZE = 500
+
+
+def non_empty_lines(text):
+    return [line.strip() for line in (text or '').splitlines() if line.strip()]
+
+
+def parse_allergies(text):
+    return [allergy.strip() for allergy in re.split(r'[,\n]', text or '') if allergy.strip()]
+
+
+def parse_pharmacy_info(text):
+    details = {}
+    unkeyed = []
+    for line in non_empty_lines(text):
+        key, separator, value = line.partition(':')
+        if separator and key.strip() and value.strip():
+            details[key.strip()] = value.strip()
+        else:
+            unkeyed.append(line)
+    if unkeyed:
+        details['Details'] = '\n'.join(unkeyed)
+    return details
+
+
+def forwards(apps, schema_editor):
+    Patient = apps.get_model('rpm_users', 'Patient')
+    queryset = Patient.objects.order_by('pk').only(
+        'pk', 'medications', 'allergies', 'pharmacy_info', 'family_history',
+    )
+    last_pk = None
+    while True:
+        chunk_query = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_query[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for patient in chunk:
+            patient.medication_list = non_empty_lines(patient.medications)
+            patient.allergy_list = parse_allergies(patient.allergies)
+            patient.pharmacy_details = parse_pharmacy_info(patient.pharmacy_info)
+            patient.family_history_list = non_empty_lines(patient.family_history)
+        Patient.objects.bulk_update(chunk, STRUCTURED_HISTORY_FIELDS)
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Each chunk's bulk_update commits on its own
+    atomic = False
+
+    dependencies = [
+        ('rpm_users', '0054_patient_structured_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
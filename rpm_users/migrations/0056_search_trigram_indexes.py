@@ -0,0 +1,76 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def _digits(field):
+    return models.Func(
+        field, models.Value('[^0-9]'), models.Value(''), models.Value('g'),
+        function='REGEXP_REPLACE', output_field=models.CharField(),
+    )
+
+
+def _trigram(expression, name):
+    return django.contrib.postgres.indexes.GinIndex(
+        django.contrib.postgres.indexes.OpClass(expression, name='gin_trgm_ops'), name=name,
+    )
+
+
+INDEXES = [
+    ('interestlead', _trigram('first_name', 'lead_first_name_trgm')),
+    ('interestlead', _trigram('last_name', 'lead_last_name_trgm')),
+    ('interestlead', _trigram('email', 'lead_email_trgm')),
+    ('interestlead', _trigram(_digits('phone_number'), 'lead_phone_digits_trgm')),
+    ('interestlead', _trigram(_digits('phone_number_2'), 'lead_phone2_digits_trgm')),
+    ('patient', _trigram('insurance', 'patient_insurance_trgm')),
+    ('patient', _trigram(_digits('phone_number'), 'patient_phone_digits_trgm')),
+]
+
+# Patient names and emails live on auth_user, which this app can't declare indexes for
+USER_INDEXES = [
+    ('auth_user_first_name_trgm', 'first_name'),
+    ('auth_user_last_name_trgm', 'last_name'),
+    ('auth_user_email_trgm', 'email'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    # GIN trigram indexes only exist on PostgreSQL; other backends search with icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in INDEXES:
+        schema_editor.add_index(apps.get_model('rpm_users', model_name), index, concurrently=True)
+    for name, column in USER_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "auth_user" USING gin ("{column}" gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in INDEXES:
+        schema_editor.remove_index(apps.get_model('rpm_users', model_name), index, concurrently=True)
+    for name, _ in USER_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('rpm_users', '0055_backfill_structured_history'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index) for model_name, index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
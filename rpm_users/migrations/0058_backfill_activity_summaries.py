@@ -0,0 +1,56 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+# rebuild_activity_summaries() written against the historical models
+
+CHUNK_SIZE = 500
+
+
+def forwards(apps, schema_editor):
+    Patient = apps.get_model('rpm_users', 'Patient')
+    PatientActivitySummary = apps.get_model('rpm_users', 'PatientActivitySummary')
+    Reports = apps.get_model('reports', 'Reports')
+    Documentation = apps.get_model('reports', 'Documentation')
+    RetellCallSession = apps.get_model('retell_calling', 'RetellCallSession')
+    CallSummary = apps.get_model('retell_calling', 'CallSummary')
+
+    latest_vital = Reports.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at', '-id')
+    latest_doc = Documentation.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at', '-id')
+    latest_call = RetellCallSession.objects.filter(patient=models.OuterRef('patient_id')).order_by('-created_at')
+    summaries = CallSummary.objects.filter(patient=models.OuterRef('patient_id')).order_by()
+
+    all_ids = list(Patient.objects.order_by('pk').values_list('pk', flat=True))
+    for offset in range(0, len(all_ids), CHUNK_SIZE):
+        chunk = all_ids[offset:offset + CHUNK_SIZE]
+        PatientActivitySummary.objects.bulk_create(
+            [PatientActivitySummary(patient_id=patient_id) for patient_id in chunk], ignore_conflicts=True,
+        )
+        PatientActivitySummary.objects.filter(patient_id__in=chunk).update(
+            last_vital_id=models.Subquery(latest_vital.values('id')[:1]),
+            last_vital_at=models.Subquery(latest_vital.values('created_at')[:1]),
+            last_documentation_id=models.Subquery(latest_doc.values('id')[:1]),
+            last_documentation_at=models.Subquery(latest_doc.values('created_at')[:1]),
+            last_call_status=models.Subquery(latest_call.values('call_status')[:1]),
+            last_call_at=models.Subquery(latest_call.values('created_at')[:1]),
+            call_summary_count=Coalesce(
+                models.Subquery(summaries.values('patient').annotate(count=models.Count('pk')).values('count')), 0,
+            ),
+            last_call_summary_at=models.Subquery(
+                summaries.values('patient').annotate(latest=models.Max('generated_at')).values('latest'),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+    # Summaries are filled and committed one chunk of patients at a time
+    atomic = False
+
+    dependencies = [
+        ('reports', '0028_reports_patient_created_index'),
+        ('retell_calling', '0006_facilitycallsession_facilitycalltarget_and_more'),
+        ('rpm_users', '0057_import_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.core.files.storage import FileSystemStorage
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Round
 import uuid
 from django.contrib.auth.models import User
 from datetime import date
@@ -6,6 +9,7 @@ import sendgrid
 from sendgrid.helpers.mail import Mail
 from django.conf import settings
 from rpm.secrets import SENDGRID_API_KEY
+from rpm_users.utils import STRUCTURED_HISTORY_FIELDS, digits_only, structured_medical_history
 # Create your models here.
 class Patient(models.Model):
     SEX_CHOICES = (('Male', 'Male'), ('Female', 'Female'), ('Others', 'Others'),)
@@ -27,6 +31,11 @@ class Patient(models.Model):
     drink = models.CharField(choices=(('YES', 'YES'), ('NO', 'NO'),), default='NO', max_length=3)
     family_history = models.TextField(null=True, blank=True)
     medications = models.TextField(null=True, blank=True)
+    # Parsed from the free-text fields above on every save (see rpm_users.utils.structured_medical_history)
+    medication_list = models.JSONField(default=list, blank=True, editable=False)
+    allergy_list = models.JSONField(default=list, blank=True, editable=False)
+    pharmacy_details = models.JSONField(default=dict, blank=True, editable=False)
+    family_history_list = models.JSONField(default=list, blank=True, editable=False)
     # Address and emergency contact information for machine delivery
     home_address = models.TextField(blank=True, null=True, help_text="Complete home address for machine delivery")
     emergency_contact_name = models.CharField(max_length=255, blank=True, null=True, help_text="Emergency contact person name")
@@ -55,6 +64,13 @@ class Patient(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='green', blank=True, null=True)
     sticky_note = models.TextField(max_length=500, blank=True, null=True, help_text="Reminder notes for this patient (max 500 chars)")
     is_archived = models.BooleanField(default=False, help_text="Whether the patient is archived from the main list")
+
+    class Meta:
+        # Trigram indexes for rpm_users.search (PostgreSQL only, see migration 0056)
+        indexes = [
+            GinIndex(OpClass('insurance', name='gin_trgm_ops'), name='patient_insurance_trgm'),
+            GinIndex(OpClass(digits_only('phone_number'), name='gin_trgm_ops'), name='patient_phone_digits_trgm'),
+        ]
     
     def __str__(self):
         return self.user.email
@@ -79,6 +95,15 @@ class Patient(models.Model):
         # self.bmi = self.weight / (height_in_meters ** 2)  # Calculate BMI
 
         is_new = self._state.adding
+        for field, value in structured_medical_history(self).items():
+            setattr(self, field, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # Keep the structured copies in step when only the text fields are saved
+            update_fields = set(update_fields)
+            kwargs['update_fields'] = update_fields | {
+                STRUCTURED_HISTORY_FIELDS[field] for field in update_fields & STRUCTURED_HISTORY_FIELDS.keys()
+            }
         # Auto-assign moderator with least patients if not already assigned
         if is_new and not self.moderator_assigned:
             from django.db.models import Count
@@ -121,6 +146,24 @@ class Patient(models.Model):
         except Exception as e:
             print("SendGrid error:", e)
 
+class PatientActivitySummary(models.Model):
+    """Latest vital, documentation and call of a patient, kept current by signals (rpm_users.activity)"""
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='activity_summary')
+    last_vital = models.ForeignKey('reports.Reports', on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    last_vital_at = models.DateTimeField(blank=True, null=True)
+    last_documentation = models.ForeignKey('reports.Documentation', on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    last_documentation_at = models.DateTimeField(blank=True, null=True)
+    last_call_status = models.CharField(max_length=20, blank=True, null=True)
+    last_call_at = models.DateTimeField(blank=True, null=True)
+    call_summary_count = models.PositiveIntegerField(default=0)
+    last_call_summary_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name_plural = "Patient activity summaries"
+
+    def __str__(self):
+        return f"Activity of {self.patient}"
+
 class PastMedicalHistory(models.Model):
     PMH_CHOICES = ((
         ('ARDS', 'Acute Respiratory Distress Syndrome'),
@@ -323,6 +366,51 @@ class InterestPastMedicalHistory(models.Model):
         return f"{self.interest.email} - {self.pmh}"
 
 
+# Fields counted by InterestLead.completion_percentage, and those required to convert a lead
+LEAD_COMPLETION_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone_number', 'date_of_birth', 'age', 'allergies',
+    'service_interest', 'insurance', 'additional_comments', 'street_address', 'city', 'zip_code',
+    'mrn_number', 'phone_number_2', 'sex', 'marital_status', 'primary_insured_id',
+)
+LEAD_REQUIRED_FIELDS = ('first_name', 'last_name', 'email', 'phone_number', 'date_of_birth', 'insurance')
+
+
+def _lead_field_filled(name):
+    """Q matching rows where a lead field is truthy, mirroring the Python checks"""
+    field = InterestLead._meta.get_field(name)
+    filled = models.Q(**{f'{name}__isnull': False})
+    if isinstance(field, (models.CharField, models.TextField)):
+        filled &= ~models.Q(**{name: ''})
+    elif isinstance(field, models.IntegerField):
+        filled &= ~models.Q(**{name: 0})
+    return filled
+
+
+class InterestLeadQuerySet(models.QuerySet):
+    def with_completion(self):
+        """
+        Annotate completion_score (percentage of LEAD_COMPLETION_FIELDS filled)
+        and has_required_fields, computed in the database so lists can page,
+        sort and filter on them without loading every lead.
+        """
+        filled = sum(
+            models.Case(models.When(_lead_field_filled(name), then=1), default=0, output_field=models.IntegerField())
+            for name in LEAD_COMPLETION_FIELDS
+        )
+        required = models.Q()
+        for name in LEAD_REQUIRED_FIELDS:
+            required &= _lead_field_filled(name)
+        return self.annotate(
+            completion_score=Round(
+                models.ExpressionWrapper(
+                    filled * models.Value(100.0) / len(LEAD_COMPLETION_FIELDS), output_field=models.FloatField(),
+                ),
+                1,
+            ),
+            has_required_fields=models.ExpressionWrapper(required, output_field=models.BooleanField()),
+        )
+
+
 class InterestLead(models.Model):
     first_name = models.CharField(max_length=100, blank=True, null=True)
     last_name = models.CharField(max_length=100, blank=True, null=True)
@@ -359,65 +447,23 @@ class InterestLead(models.Model):
     converted_at = models.DateTimeField(null=True, blank=True)
     converted_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     
+    objects = InterestLeadQuerySet.as_manager()
+
     @property
     def completion_percentage(self):
         """Calculate how complete the lead data is based on filled fields"""
-        total_fields = 18  # Total number of relevant fields for completion
-        filled_fields = 0
-        
-        # Check each field and count filled ones
-        if self.first_name:
-            filled_fields += 1
-        if self.last_name:
-            filled_fields += 1
-        if self.email:
-            filled_fields += 1
-        if self.phone_number:
-            filled_fields += 1
-        if self.date_of_birth:
-            filled_fields += 1
-        if self.age:
-            filled_fields += 1
-        if self.allergies:
-            filled_fields += 1
-        if self.service_interest:
-            filled_fields += 1
-        if self.insurance:
-            filled_fields += 1
-        if self.additional_comments:
-            filled_fields += 1
-        if self.street_address:
-            filled_fields += 1
-        if self.city:
-            filled_fields += 1
-        if self.zip_code:
-            filled_fields += 1
-        if self.mrn_number:
-            filled_fields += 1
-        if self.phone_number_2:
-            filled_fields += 1
-        if self.sex:
-            filled_fields += 1
-        if self.marital_status:
-            filled_fields += 1
-        if self.primary_insured_id:
-            filled_fields += 1
-            
-        return round((filled_fields / total_fields) * 100, 1)
-    
+        if hasattr(self, 'completion_score'):
+            return self.completion_score
+        filled_fields = sum(1 for name in LEAD_COMPLETION_FIELDS if getattr(self, name))
+        return round((filled_fields / len(LEAD_COMPLETION_FIELDS)) * 100, 1)
+
     @property
     def is_complete(self):
         """Check if lead has all required fields for patient conversion"""
-        required_fields = [
-            self.first_name,
-            self.last_name,
-            self.email,
-            self.phone_number,
-            self.date_of_birth,
-            self.insurance
-        ]
-        return all(field for field in required_fields)
-    
+        if hasattr(self, 'has_required_fields'):
+            return self.has_required_fields
+        return all(getattr(self, name) for name in LEAD_REQUIRED_FIELDS)
+
     def save(self, *args, **kwargs):
         """Override save to clean phone numbers and skip leads without mobile numbers"""
         from .utils import clean_phone_number
@@ -434,6 +480,16 @@ class InterestLead(models.Model):
             self.phone_number_2 = clean_phone_number(self.phone_number_2)
         
         super().save(*args, **kwargs)
+
+    class Meta:
+        # Trigram indexes for rpm_users.search (PostgreSQL only, see migration 0056)
+        indexes = [
+            GinIndex(OpClass('first_name', name='gin_trgm_ops'), name='lead_first_name_trgm'),
+            GinIndex(OpClass('last_name', name='gin_trgm_ops'), name='lead_last_name_trgm'),
+            GinIndex(OpClass('email', name='gin_trgm_ops'), name='lead_email_trgm'),
+            GinIndex(OpClass(digits_only('phone_number'), name='gin_trgm_ops'), name='lead_phone_digits_trgm'),
+            GinIndex(OpClass(digits_only('phone_number_2'), name='gin_trgm_ops'), name='lead_phone2_digits_trgm'),
+        ]
     
     def __str__(self):
         name = f"{self.first_name or ''} {self.last_name or ''}".strip()
@@ -442,6 +498,71 @@ class InterestLead(models.Model):
         return f"Lead {self.id} - {self.email or 'No email'}"
 
 
+def import_upload_storage():
+    """Uploaded lead and facility lists hold PHI, so they live outside MEDIA_ROOT"""
+    return FileSystemStorage(location=settings.IMPORT_UPLOAD_ROOT)
+
+
+class ImportJob(models.Model):
+    """A lead or facility spreadsheet imported in Celery, with progress checkpointed per chunk"""
+    KIND_LEADS = 'leads'
+    KIND_FACILITIES = 'facilities'
+    KIND_CHOICES = (
+        (KIND_LEADS, 'Leads'),
+        (KIND_FACILITIES, 'Facilities'),
+    )
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    )
+    # Per-row messages kept on the job; the counts stay exact beyond this
+    MAX_ERRORS = 500
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='import_jobs', blank=True, null=True)
+    file = models.FileField(
+        storage=import_upload_storage, upload_to='uploads/', blank=True,
+        help_text="Uploaded spreadsheet; deleted once the job finishes",
+    )
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0, help_text="Data rows committed so far; a resumed run skips these")
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True, help_text="Last checkpoint of a running job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'heartbeat_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import {self.original_name} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of data rows processed so far"""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(int(self.processed_rows * 100 / self.total_rows), 99)
+
+
 class ModeratorShortcut(models.Model):
     """Model to store personal text shortcuts for moderators"""
     moderator = models.ForeignKey(Moderator, on_delete=models.CASCADE, related_name='shortcuts')
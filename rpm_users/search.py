@@ -0,0 +1,141 @@
+"""
+Fuzzy search over leads and patients.
+
+On PostgreSQL every query term is matched with pg_trgm word similarity
+(``%>``) against names and emails, and phone numbers are matched on their
+digits only, all backed by GIN trigram indexes so a search over 100k rows is
+an index scan rather than a sequential ``icontains`` scan. Numbers too short
+for the index still match phone digits, by a plain substring scan. Results carry a
+``search_rank`` annotation (best word similarity of the text terms) for
+ordering. Other databases fall back to ``icontains`` with a constant rank.
+"""
+
+import re
+from typing import Sequence
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+
+from .utils import digits_only
+
+LEAD_SEARCH_FIELDS = ('first_name', 'last_name', 'email')
+LEAD_PHONE_FIELDS = ('phone_number', 'phone_number_2')
+
+PATIENT_SEARCH_FIELDS = ('user__first_name', 'user__last_name', 'user__email', 'insurance')
+PATIENT_PHONE_FIELDS = ('phone_number',)
+
+# Shorter digit runs can't use a trigram index; they are matched as text terms
+# that may also be a substring of a phone number (the last digits typed by a moderator)
+MIN_PHONE_DIGITS = 4
+
+# pg_trgm's default word similarity threshold (0.6) rejects most single-letter
+# typos in short names; 0.4 still keeps unrelated names out
+SEARCH_SIMILARITY_THRESHOLD = getattr(settings, 'SEARCH_SIMILARITY_THRESHOLD', 0.4)
+
+
+@receiver(connection_created)
+def set_similarity_threshold(sender, connection, **kwargs):
+    """Apply the search threshold to each new PostgreSQL session"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+            [str(SEARCH_SIMILARITY_THRESHOLD)],
+        )
+
+
+def _phone_match(queryset, phone_fields: Sequence[str], digits: str, postgres: bool):
+    match = models.Q()
+    for index, field in enumerate(phone_fields):
+        if postgres:
+            alias = f'_search_phone_{index}'
+            queryset = queryset.alias(**{alias: digits_only(field)})
+            match |= models.Q(**{f'{alias}__contains': digits})
+        else:
+            match |= models.Q(**{f'{field}__icontains': digits})
+    return queryset, match
+
+
+def _is_phone_term(term: str) -> bool:
+    """A term without letters ("555-0123", "(555)")"""
+    return not re.search(r'[^\W\d_]', term)
+
+
+def _split_query(query: str):
+    """Split a query into text terms and the digits of its phone-like (letterless) terms"""
+    terms = query.split()
+    phone_terms = [term for term in terms if _is_phone_term(term)]
+    digits = re.sub(r'\D', '', ''.join(phone_terms))
+    if len(digits) < MIN_PHONE_DIGITS:
+        return terms, ''
+    return [term for term in terms if term not in phone_terms], digits
+
+
+def search(queryset, query: str, text_fields: Sequence[str], phone_fields: Sequence[str] = ()):
+    """
+    Filter a queryset to rows matching a free-text query and annotate search_rank.
+
+    Every whitespace-separated term has to match at least one text field, so
+    "jon smth" finds "John Smith". Terms without letters are read as a phone
+    number when they hold MIN_PHONE_DIGITS or more digits and match any phone
+    field containing those digits, ignoring formatting ("smith 555-0123").
+    Shorter numbers match a text field or the digits of a phone field ("456").
+
+    Args:
+        queryset: Queryset to filter
+        query: Search text as typed by the user
+        text_fields: Name/email lookups matched by trigram word similarity
+        phone_fields: Phone lookups matched on digits only
+
+    Returns:
+        Filtered queryset annotated with search_rank (higher is better); unchanged for a blank query
+    """
+    text_terms, digits = _split_query(query)
+    if not phone_fields and digits:
+        text_terms, digits = query.split(), ''
+    if not text_terms and not digits:
+        return queryset
+    postgres = connections[queryset.db].vendor == 'postgresql'
+    lookup = 'trigram_word_similar' if postgres else 'icontains'
+
+    match = models.Q()
+    for term in text_terms:
+        term_match = models.Q()
+        for field in text_fields:
+            term_match |= models.Q(**{f'{field}__{lookup}': term})
+        term_digits = re.sub(r'\D', '', term) if phone_fields and _is_phone_term(term) else ''
+        if term_digits:
+            queryset, phone_match = _phone_match(queryset, phone_fields, term_digits, postgres)
+            term_match |= phone_match
+        match &= term_match
+    if digits:
+        queryset, phone_match = _phone_match(queryset, phone_fields, digits, postgres)
+        match &= phone_match
+
+    if not postgres:
+        return queryset.filter(match).annotate(search_rank=models.Value(1.0, output_field=models.FloatField()))
+
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    if text_terms:
+        text = ' '.join(text_terms)
+        similarities = [TrigramWordSimilarity(text, field) for field in text_fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    else:
+        # Every row left matched the phone number equally
+        rank = models.Value(1.0, output_field=models.FloatField())
+    return queryset.filter(match).annotate(search_rank=rank)
+
+
+def search_leads(queryset, query: str):
+    """search() over InterestLead names, email and both phone numbers"""
+    return search(queryset, query, LEAD_SEARCH_FIELDS, LEAD_PHONE_FIELDS)
+
+
+def search_patients(queryset, query: str):
+    """search() over Patient names, email, insurance and phone number"""
+    return search(queryset, query, PATIENT_SEARCH_FIELDS, PATIENT_PHONE_FIELDS)
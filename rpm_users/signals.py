@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.template.loader import render_to_string
@@ -8,6 +9,8 @@ from sendgrid.helpers.mail import Mail
 from .models import Doctor, Patient, Moderator, InterestLead, Interest
 import logging
 from .tasks import send_new_lead_notification
+from .device_resolver import device_serial_resolver
+from . import activity
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +33,64 @@ def send_patient_creation_email(sender, instance, created, **kwargs):
     if created and instance.user and instance.user.email:
         send_welcome_email(instance.user, 'patient')
 
+@receiver(post_init, sender=Patient)
+def remember_device_serial_number(sender, instance, **kwargs):
+    """Keep the loaded serial so a reassigned device invalidates its old mapping too."""
+    # Read from __dict__ so a deferred field is not loaded with an extra query
+    instance._loaded_device_serial_number = instance.__dict__.get('device_serial_number')
+
+@receiver(post_save, sender=Patient)
+def invalidate_device_serial_cache(sender, instance, created, **kwargs):
+    """Drop cached serial -> patient mappings when a patient's device changes."""
+    previous = getattr(instance, '_loaded_device_serial_number', None)
+    current = instance.__dict__.get('device_serial_number')
+    # A new patient may take a serial that is cached as unknown
+    if created or previous != current:
+        transaction.on_commit(lambda: device_serial_resolver.invalidate(previous, current))
+    instance._loaded_device_serial_number = current
+
+@receiver(post_delete, sender=Patient)
+def invalidate_device_serial_cache_on_delete(sender, instance, **kwargs):
+    """Forget the mapping of a deleted patient's device."""
+    serials = (
+        getattr(instance, '_loaded_device_serial_number', None),
+        instance.__dict__.get('device_serial_number'),
+    )
+    transaction.on_commit(lambda: device_serial_resolver.invalidate(*serials))
+
+@receiver(post_save, sender='reports.Reports')
+def record_vital_activity(sender, instance, created, **kwargs):
+    """Keep the patient's activity summary pointing at their latest vital."""
+    if created:
+        activity.record_vital(instance)
+
+@receiver(post_save, sender='reports.Documentation')
+def record_documentation_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.record_documentation(instance)
+
+@receiver(post_save, sender='retell_calling.RetellCallSession')
+def record_call_activity(sender, instance, **kwargs):
+    activity.record_call(instance)
+
+@receiver(post_save, sender='retell_calling.CallSummary')
+def record_call_summary_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.refresh_call_summaries(instance.patient_id)
+
+@receiver(post_delete, sender='reports.Reports')
+@receiver(post_delete, sender='reports.Documentation')
+@receiver(post_delete, sender='retell_calling.RetellCallSession')
+@receiver(post_delete, sender='retell_calling.CallSummary')
+def repair_activity_on_delete(sender, instance, origin=None, **kwargs):
+    """Recompute the summary after a vital, note, call or call summary is deleted."""
+    # Skip cascades from a patient/user delete: the summary goes with the patient.
+    # Other cascades (a call's summaries deleted with the call) change the summary.
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if issubclass(origin_model, (Patient, User)):
+        return
+    activity.schedule_rebuild(instance.patient_id)
+
 @receiver(post_save, sender=InterestLead)
 def notify_new_lead_ai(sender, instance, created, **kwargs):
     """Send notification email to admin when a new AI lead is captured."""
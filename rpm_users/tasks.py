@@ -3,7 +3,12 @@ from django.conf import settings
 import sendgrid
 from sendgrid.helpers.mail import Mail
 import logging
+import os
+from datetime import timedelta
 from django.apps import apps
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import escape
 
 logger = logging.getLogger(__name__)
 
@@ -120,3 +125,140 @@ def send_new_lead_notification(lead_id, model_name='InterestLead'):
         
     except Exception as e:
         logger.error(f"Celery lead notification failed for {model_name} {lead_id}: {str(e)}")
+
+
+@shared_task
+def send_lead_import_summary(file_name, created, skipped, imported_by='', errors=None):
+    """
+    Send one admin email summarizing a spreadsheet lead import.
+
+    Imported leads are bulk-created without per-lead notifications, so this
+    replaces the one email per lead a row-by-row import would have sent.
+    """
+    try:
+        ADMIN_EMAIL = "shaiqueljilani@gmail.com"
+        FROM_EMAIL = "marketing@pinksurfing.com"
+        errors = errors or []
+        
+        error_items = ''.join(f"<li>{escape(error)}</li>" for error in errors[:20])
+        more_errors = f"<p>...and {len(errors) - 20} more</p>" if len(errors) > 20 else ''
+        html_content = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                <h2 style="color: #7928CA;">Lead Import Completed</h2>
+                <p><strong>File:</strong> {escape(file_name)}</p>
+                <p><strong>Imported by:</strong> {escape(imported_by or 'N/A')}</p>
+                <p><strong>Leads created:</strong> {created}</p>
+                <p><strong>Rows skipped:</strong> {skipped}</p>
+                {f'<h3>Skipped rows</h3><ul>{error_items}</ul>{more_errors}' if errors else ''}
+                <p style="font-size: 12px; color: #888;">This is an automated asynchronous notification via Celery.</p>
+            </body>
+        </html>
+        """
+        
+        if not settings.SENDGRID_API_KEY:
+            logger.error("SENDGRID_API_KEY not found in settings.")
+            return
+
+        sg = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
+        message = Mail(
+            from_email=FROM_EMAIL,
+            to_emails=ADMIN_EMAIL,
+            subject=f"📥 Lead import: {created} new leads from {file_name}",
+            html_content=html_content
+        )
+        
+        sg.send(message)
+        logger.info(f"Lead import summary sent for {file_name}")
+        
+    except Exception as e:
+        logger.error(f"Lead import summary failed for {file_name}: {str(e)}")
+
+
+def _stale_import_cutoff():
+    return timezone.now() - timedelta(minutes=settings.IMPORT_JOB_STALE_MINUTES)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def run_import_job(job_id):
+    """
+    Import an ImportJob's spreadsheet, checkpointing progress on the job row.
+
+    Each chunk's rows and the job's counts are committed together, so a job
+    whose worker died is resumed (by redelivery or resume_stale_import_jobs)
+    after its last committed chunk without importing any row twice.
+    """
+    from .imports import ImportFileError, count_spreadsheet_rows, iter_spreadsheet_rows
+    from .lead_import import import_leads
+
+    ImportJob = apps.get_model('rpm_users', 'ImportJob')
+    jobs = ImportJob.objects.filter(pk=job_id)
+    # Claim the job: pending, or running without a recent checkpoint (its worker is gone)
+    claimable = Q(status=ImportJob.STATUS_PENDING) | Q(
+        status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=_stale_import_cutoff(),
+    )
+    if not jobs.filter(claimable).update(status=ImportJob.STATUS_RUNNING, heartbeat_at=timezone.now()):
+        return None
+
+    job = jobs.get()
+    if job.kind == ImportJob.KIND_FACILITIES:
+        from retell_calling.facility_import import import_facilities as importer
+    else:
+        importer = import_leads
+    extension = os.path.splitext(job.file.name.lower())[1]
+    resumed_errors = list(job.errors)
+
+    def on_chunk(processed, result):
+        jobs.update(
+            processed_rows=processed,
+            created_count=job.created_count + result.created,
+            updated_count=job.updated_count + result.updated,
+            skipped_count=job.skipped_count + result.skipped,
+            errors=(resumed_errors + result.errors)[:ImportJob.MAX_ERRORS],
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        if not job.total_rows:
+            jobs.update(total_rows=count_spreadsheet_rows(job.file.path, extension))
+        importer(
+            iter_spreadsheet_rows(job.file.path, extension), on_chunk=on_chunk, skip_rows=job.processed_rows,
+        )
+    except Exception as e:
+        if not isinstance(e, ImportFileError):
+            logger.error(f"Import job {job.pk} failed: {str(e)}", exc_info=True)
+        jobs.update(status=ImportJob.STATUS_FAILED, file='', error=str(e), finished_at=timezone.now())
+        job.file.delete(save=False)
+        return None
+
+    jobs.update(status=ImportJob.STATUS_COMPLETED, file='', finished_at=timezone.now())
+    job.file.delete(save=False)
+    job.refresh_from_db()
+    logger.info(
+        f"Import job {job.pk}: {job.created_count} created, {job.updated_count} updated, {job.skipped_count} skipped"
+    )
+
+    if job.kind == ImportJob.KIND_LEADS:
+        # One summary email per import instead of one notification per lead
+        send_lead_import_summary.delay(
+            job.original_name, job.created_count, job.skipped_count,
+            job.requested_by.get_username() if job.requested_by else '', job.errors,
+        )
+    return {'created': job.created_count, 'updated': job.updated_count, 'skipped': job.skipped_count}
+
+
+@shared_task
+def resume_stale_import_jobs():
+    """Requeue imports whose task was lost: pending with no worker, or running with no recent checkpoint"""
+    ImportJob = apps.get_model('rpm_users', 'ImportJob')
+    cutoff = _stale_import_cutoff()
+    stale = ImportJob.objects.filter(
+        Q(status=ImportJob.STATUS_PENDING, created_at__lt=cutoff)
+        | Q(status=ImportJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+    ).values_list('pk', flat=True)
+    job_ids = [str(pk) for pk in stale]
+    for job_id in job_ids:
+        run_import_job.delay(job_id)
+    if job_ids:
+        logger.info(f"Resumed {len(job_ids)} stale import job(s)")
+    return len(job_ids)
@@ -1,5 +1,26 @@
-from django.test import TestCase
-from .models import PastMedicalHistory
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from reports.models import Documentation, Reports
+from retell_calling.models import CallSummary, RetellCallSession
+from .activity import rebuild_activity_summaries
+from .device_resolver import device_serial_resolver, normalize_serial
+from .imports import ImportFileError
+from .lead_import import import_leads
+from .models import ImportJob, InterestLead, Moderator, PastMedicalHistory, Patient, PatientActivitySummary
+from .search import search_leads
 
 class PastMedicalHistoryTestCase(TestCase):
     def test_pmh_choices_have_unique_codes(self):
@@ -25,3 +46,369 @@ class PastMedicalHistoryTestCase(TestCase):
         self.assertIsNotNone(prostate_code, "Prostate Cancer should be in PMH choices")
         self.assertNotEqual(pancreatic_code, prostate_code, 
                            "Pancreatic Cancer and Prostate Cancer must have different codes")
+
+
+class AssignedPatientListQueryTestCase(TestCase):
+    """The moderator patient list must not issue queries per patient"""
+    # Session, user, moderator, patient count, patient page (joined with the activity summary), archived count
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        patcher = mock.patch('sendgrid.SendGridAPIClient')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='mod@example.com', password='x')
+        self.moderator = Moderator.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def add_patients(self, count, archived=False):
+        for _ in range(count):
+            n = Patient.objects.count()
+            user = User.objects.create_user(username=f'patient{n}@example.com', first_name='Pat', last_name=str(n))
+            patient = Patient.objects.create(
+                user=user, moderator_assigned=self.moderator, is_archived=archived, device_serial_number=9000 + n,
+            )
+            Documentation.objects.create(patient=patient, history_of_present_illness='Stable')
+            Reports.objects.create(patient=patient, blood_pressure='120/80', systolic_blood_pressure='120',
+                                   diastolic_blood_pressure='80', pulse='70')
+            call = RetellCallSession.objects.create(
+                patient=patient, retell_call_id=f'call_{n}', call_status='completed', from_number='1', to_number='2',
+            )
+            CallSummary.objects.create(call_session=call, patient=patient, summary_text='Doing well')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_patients(self):
+        self.add_patients(2)
+        self.add_patients(1, archived=True)
+        few, _ = self.count_queries(reverse('view_all_assigned_patient'))
+
+        self.add_patients(8)
+        self.add_patients(4, archived=True)
+        many, response = self.count_queries(reverse('view_all_assigned_patient'))
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, self.QUERY_BUDGET)
+        self.assertEqual(len(response.context['patient_obj']), 10)
+        row = response.context['patient_obj'][0]
+        self.assertEqual(row['summary_count'], 1)
+        self.assertEqual(row['call_status'], 'completed')
+        self.assertTrue(row['last_vital'].startswith('BP: 120/80, HR: 70'))
+
+    def test_archived_rows_are_loaded_separately(self):
+        self.add_patients(1)
+        self.add_patients(3, archived=True)
+        response = self.client.get(reverse('view_all_assigned_patient'))
+        self.assertEqual(response.context['archived_count'], 3)
+        self.assertNotIn('archived_patients', response.context)
+
+        few, _ = self.count_queries(reverse('view_archived_patients'))
+        self.add_patients(5, archived=True)
+        many, response = self.count_queries(reverse('view_archived_patients'))
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['archived_patients']), 8)
+
+
+class PatientActivitySummaryTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch('sendgrid.SendGridAPIClient')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(username='patient@example.com')
+        self.patient = Patient.objects.create(user=user, device_serial_number=9100)
+
+    def summary(self):
+        return PatientActivitySummary.objects.get(patient=self.patient)
+
+    def test_signals_track_latest_activity(self):
+        Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        latest = Reports.objects.create(patient=self.patient, blood_pressure='130/85')
+        doc = Documentation.objects.create(patient=self.patient, history_of_present_illness='Stable')
+        call = RetellCallSession.objects.create(
+            patient=self.patient, retell_call_id='call_1', from_number='1', to_number='2',
+        )
+        call.call_status = 'completed'
+        call.save()
+        CallSummary.objects.create(call_session=call, patient=self.patient, summary_text='Doing well')
+
+        summary = self.summary()
+        self.assertEqual(summary.last_vital_id, latest.pk)
+        self.assertEqual(summary.last_documentation_id, doc.pk)
+        self.assertEqual(summary.last_call_status, 'completed')
+        self.assertEqual(summary.call_summary_count, 1)
+
+    def test_deleting_latest_vital_falls_back_to_previous(self):
+        previous = Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        latest = Reports.objects.create(patient=self.patient, blood_pressure='130/85')
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.delete()
+        self.assertEqual(self.summary().last_vital_id, previous.pk)
+
+    def test_bulk_delete_rebuilds_each_patient_once(self):
+        first = Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        for _ in range(3):
+            Reports.objects.create(patient=self.patient, blood_pressure='130/85')
+        with mock.patch('rpm_users.activity.rebuild_activity_summaries',
+                        wraps=rebuild_activity_summaries) as rebuild, \
+                self.captureOnCommitCallbacks(execute=True):
+            Reports.objects.exclude(pk=first.pk).delete()
+        rebuild.assert_called_once_with([self.patient.pk])
+        self.assertEqual(self.summary().last_vital_id, first.pk)
+
+    def test_failed_rebuild_does_not_fail_the_committed_delete(self):
+        report = Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        with mock.patch('rpm_users.activity.rebuild_activity_summaries', side_effect=DatabaseError), \
+                self.assertLogs('django', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            report.delete()
+        self.assertFalse(Reports.objects.exists())
+
+    def test_call_summaries_deleted_with_their_call_are_uncounted(self):
+        call = RetellCallSession.objects.create(
+            patient=self.patient, retell_call_id='call_1', from_number='1', to_number='2',
+        )
+        CallSummary.objects.create(call_session=call, patient=self.patient, summary_text='Doing well')
+        self.assertEqual(self.summary().call_summary_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            call.delete()
+        self.assertEqual(self.summary().call_summary_count, 0)
+        self.assertIsNone(self.summary().last_call_at)
+
+    def test_rebuild_repairs_drift(self):
+        report = Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        PatientActivitySummary.objects.all().delete()
+        self.assertEqual(rebuild_activity_summaries(), 1)
+        self.assertEqual(self.summary().last_vital_id, report.pk)
+        self.assertEqual(self.summary().call_summary_count, 0)
+
+    def test_migration_backfills_existing_patients(self):
+        report = Reports.objects.create(patient=self.patient, blood_pressure='120/80')
+        call = RetellCallSession.objects.create(
+            patient=self.patient, retell_call_id='call_1', from_number='1', to_number='2',
+        )
+        CallSummary.objects.create(call_session=call, patient=self.patient, summary_text='Doing well')
+        # As deployed: the table was created empty
+        PatientActivitySummary.objects.all().delete()
+
+        backfill = import_module('rpm_users.migrations.0058_backfill_activity_summaries')
+        backfill.forwards(apps, None)
+
+        summary = self.summary()
+        self.assertEqual(summary.last_vital_id, report.pk)
+        self.assertEqual(summary.last_call_status, 'initiated')
+        self.assertEqual(summary.call_summary_count, 1)
+
+
+class StructuredMedicalHistoryTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch('sendgrid.SendGridAPIClient')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create_user(username='history@example.com')
+        self.patient = Patient.objects.create(
+            user=user,
+            medications='Lisinopril 10mg\n\n  Metformin 500mg  ',
+            allergies='Penicillin, peanuts,\nLatex',
+            pharmacy_info='Name: CVS\nPhone: 555-0100\nNear the mall',
+            family_history='Diabetes (mother)\n',
+        )
+
+    def test_save_parses_free_text(self):
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.medication_list, ['Lisinopril 10mg', 'Metformin 500mg'])
+        self.assertEqual(self.patient.allergy_list, ['Penicillin', 'peanuts', 'Latex'])
+        self.assertEqual(self.patient.pharmacy_details, {'Name': 'CVS', 'Phone': '555-0100', 'Details': 'Near the mall'})
+        self.assertEqual(self.patient.family_history_list, ['Diabetes (mother)'])
+
+    def test_update_fields_include_structured_copy(self):
+        self.patient.medications = 'Aspirin 81mg'
+        self.patient.save(update_fields=['medications'])
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.medication_list, ['Aspirin 81mg'])
+
+
+class LeadsListTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(self.admin)
+
+    def test_completion_annotation_matches_properties(self):
+        InterestLead.objects.create(phone_number='5550100001', first_name='Ann', age=0, city='')
+        InterestLead.objects.create(
+            phone_number='5550100002', first_name='Bob', last_name='Lee', email='bob@example.com',
+            date_of_birth='1950-01-01', insurance='Medicare', age=75, sex='M',
+        )
+        for lead in InterestLead.objects.with_completion():
+            plain = InterestLead.objects.get(pk=lead.pk)
+            self.assertEqual(lead.completion_score, plain.completion_percentage)
+            self.assertEqual(lead.has_required_fields, plain.is_complete)
+
+    def test_list_queries_do_not_grow_with_leads(self):
+        for index in range(30):
+            InterestLead.objects.create(
+                phone_number=f'55502000{index:02d}', first_name=f'Lead{index}',
+                is_converted=True, converted_by=self.admin,
+            )
+        # Session, user, page count, one page of leads and the statistics
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('leads_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 25)
+        self.assertEqual(response.context['filtered_count'], 30)
+        self.assertEqual(response.context['page_obj'][0]['converted_by_name'], '')
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        InterestLead.objects.create(first_name='John', last_name='Smith', phone_number='(555) 012-3456')
+        InterestLead.objects.create(first_name='Joan', last_name='Smithers', phone_number='5559876543')
+        InterestLead.objects.create(first_name='Mary', last_name='Jones', phone_number='5550129999')
+
+    def names(self, query):
+        return sorted(lead.first_name for lead in search_leads(InterestLead.objects.all(), query))
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.names('smith'), ['Joan', 'John'])
+        self.assertEqual(self.names('jo smith'), ['Joan', 'John'])
+        self.assertEqual(self.names('john smith'), ['John'])
+
+    def test_phone_terms_match_digits(self):
+        # Lead phone numbers are stored cleaned (+15550123456), so any formatting of the query matches
+        self.assertEqual(self.names('555-012'), ['John', 'Mary'])
+        self.assertEqual(self.names('smith 555 012'), ['John'])
+        # Too few digits for the phone index: still a substring of the phone digits
+        self.assertEqual(self.names('987'), ['Joan'])
+        self.assertEqual(self.names('012'), ['John', 'Mary'])
+        self.assertEqual(self.names('smith 987'), ['Joan'])
+
+    def test_blank_query_is_unfiltered(self):
+        self.assertEqual(len(self.names('  ')), 3)
+
+
+class LeadImportTestCase(TestCase):
+    def test_import_dedupes_in_bulk_without_per_lead_notifications(self):
+        InterestLead.objects.create(first_name='Existing', phone_number='5550000001')
+        rows = [
+            ['First Name', 'Last Name', 'Phone', 'Date of Birth'],
+            ['Dup', 'Db', '(555) 000-0001', ''],
+            ['Ann', 'Lee', 5550000002.0, '01/02/1950'],
+            ['Ann', 'Again', '555-000-0002', ''],
+            ['No', 'Phone', '', ''],
+            ['', '', '', ''],
+        ]
+        with mock.patch('rpm_users.signals.send_new_lead_notification') as notification, \
+                self.assertNumQueries(4):  # existing-phone lookup and the insert, in a savepoint
+            result = import_leads(rows, chunk_size=10)
+        notification.delay.assert_not_called()
+        self.assertEqual((result.created, result.skipped), (1, 3))
+        lead = InterestLead.objects.get(first_name='Ann')
+        self.assertEqual(lead.phone_number, '+15550000002')
+        self.assertEqual(str(lead.date_of_birth), '1950-01-02')
+
+    def test_missing_required_columns(self):
+        with self.assertRaises(ImportFileError):
+            import_leads([['Name', 'Phone']])
+
+
+@override_settings(IMPORT_UPLOAD_ROOT=tempfile.mkdtemp())
+class ImportJobTestCase(TestCase):
+    def make_job(self, **kwargs):
+        job = ImportJob(kind=ImportJob.KIND_LEADS, original_name='leads.csv', **kwargs)
+        content = 'First Name,Last Name,Phone\nAnn,Lee,5550000001\nBob,Ray,5550000002\nCy,Day,555-000-0001\n'
+        job.file.save('leads.csv', ContentFile(content.encode()))
+        return job
+
+    def run_job(self, job):
+        from .tasks import run_import_job
+
+        with mock.patch('rpm_users.tasks.send_lead_import_summary') as summary:
+            run_import_job(str(job.pk))
+        job.refresh_from_db()
+        return job, summary
+
+    def test_import_completes_with_counts_and_row_errors(self):
+        job, summary = self.run_job(self.make_job())
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.total_rows, job.processed_rows, job.progress), (3, 3, 100))
+        self.assertEqual((job.created_count, job.skipped_count), (2, 1))
+        self.assertEqual(len(job.errors), 1)
+        self.assertFalse(job.file)
+        summary.delay.assert_called_once()
+
+    def test_stale_running_job_resumes_after_last_checkpoint(self):
+        # A worker committed the first row, then died
+        InterestLead.objects.create(first_name='Ann', phone_number='+15550000001')
+        job = self.make_job(
+            status=ImportJob.STATUS_RUNNING, total_rows=3, processed_rows=1, created_count=1,
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        job, _ = self.run_job(job)
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.created_count, job.skipped_count), (2, 1))
+        self.assertEqual(InterestLead.objects.count(), 2)
+
+    def test_running_job_with_recent_checkpoint_is_not_claimed(self):
+        job = self.make_job(status=ImportJob.STATUS_RUNNING, heartbeat_at=timezone.now())
+        job, summary = self.run_job(job)
+        self.assertEqual((job.status, job.processed_rows), (ImportJob.STATUS_RUNNING, 0))
+        summary.delay.assert_not_called()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'device-serials'}})
+class DeviceSerialResolverTestCase(TestCase):
+    def setUp(self):
+        patcher = mock.patch('sendgrid.SendGridAPIClient')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        device_serial_resolver.clear_local()
+        self.addCleanup(device_serial_resolver.clear_local)
+        self.patient = self.make_patient('first@example.com', 7000)
+
+    def make_patient(self, username, serial):
+        return Patient.objects.create(user=User.objects.create_user(username=username), device_serial_number=serial)
+
+    def resolve(self, serial=7000):
+        # Another process: nothing in the local tier, only the shared cache
+        device_serial_resolver.clear_local()
+        return device_serial_resolver.resolve(serial)
+
+    def test_reassigned_device_resolves_to_new_patient(self):
+        self.assertEqual(self.resolve(), str(self.patient.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.device_serial_number = None
+            self.patient.save()
+            other = self.make_patient('second@example.com', 7000)
+        self.assertEqual(self.resolve(), str(other.pk))
+
+    def test_deleted_patient_is_forgotten(self):
+        self.assertEqual(self.resolve(), str(self.patient.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.delete()
+        self.assertIsNone(self.resolve())
+
+    def test_mapping_loaded_before_a_reassignment_is_not_cached(self):
+        load = device_serial_resolver._load
+
+        def load_then_reassign(serials):
+            loaded = load(serials)
+            # The reassignment commits and invalidates before this reader writes the cache
+            Patient.objects.filter(pk=self.patient.pk).update(device_serial_number=None)
+            self.other = self.make_patient('second@example.com', 7000)
+            device_serial_resolver.invalidate(7000)
+            return loaded
+
+        with mock.patch.object(device_serial_resolver, '_load', side_effect=load_then_reassign):
+            self.assertEqual(device_serial_resolver.resolve(7000), str(self.patient.pk))
+        self.assertEqual(device_serial_resolver.resolve(7000), str(self.other.pk))
+        self.assertEqual(self.resolve(), str(self.other.pk))
+
+    def test_serials_outside_bigint_range_are_unknown(self):
+        self.assertEqual(normalize_serial(' 7000 '), 7000)
+        self.assertIsNone(normalize_serial('9' * 20))
+        self.assertIsNone(normalize_serial('-1'))
+        self.assertEqual(device_serial_resolver.resolve_many(['9' * 20, 'abc']), {})
@@ -20,6 +20,7 @@ urlpatterns = [
     path('patient_logout/', views.patient_logout, name='patient_logout'),
     path('registration-success/', views.registration_success, name='registration_success'),
     path('update-patient/', views.update_patient),
+    path('view-patient/archived/', views.view_archived_patients, name='view_archived_patients'),
     path('view-patient/<str:patient_id>/', views.moderator_actions_view, name='moderator_actions'),
     path('view-patient/', views.view_assigned_patient, name='view_all_assigned_patient'),
     path('logout/', views.moderator_logout, name='moderator_logout'),
@@ -69,6 +70,8 @@ urlpatterns = [
     path('dashboard/leads/<int:lead_id>/delete/', views.delete_lead, name='delete_lead'),
     path('dashboard/leads/<int:lead_id>/convert/', views.convert_lead_to_patient, name='convert_lead_to_patient'),
     path('dashboard/leads-call-summaries/', views.leads_call_summaries_list, name='leads_call_summaries'),
+    path('dashboard/imports/<uuid:job_id>/', views.import_job_detail, name='import_job_detail'),
+    path('dashboard/imports/<uuid:job_id>/status/', views.import_job_status, name='import_job_status'),
     
     # Admin-verified user creation
     path('staff/create-user/', views.admin_create_user, name='admin_create_user'),
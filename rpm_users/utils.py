@@ -5,6 +5,8 @@ Utility functions for RPM users app.
 import re
 import logging
 
+from django.db import models
+
 logger = logging.getLogger('rpm_users.utils')
 
 
@@ -101,3 +103,80 @@ def get_phone_for_api(phone_number: str) -> str:
             return f"+{digits_only}"
     
     return digits_only
+
+
+def digits_only(expression):
+    """
+    SQL expression stripping everything but digits from a phone column (PostgreSQL).
+
+    Used both in the phone trigram indexes and in search queries; the two must
+    produce identical SQL for the planner to use the index.
+    """
+    return models.Func(
+        expression, models.Value('[^0-9]'), models.Value(''), models.Value('g'),
+        function='REGEXP_REPLACE', output_field=models.CharField(),
+    )
+
+
+# Free-text clinical fields on Patient and the structured JSON field each one is parsed into
+STRUCTURED_HISTORY_FIELDS = {
+    'medications': 'medication_list',
+    'allergies': 'allergy_list',
+    'pharmacy_info': 'pharmacy_details',
+    'family_history': 'family_history_list',
+}
+
+
+def _non_empty_lines(text: str) -> list:
+    return [line.strip() for line in (text or '').splitlines() if line.strip()]
+
+
+def parse_medications(text: str) -> list:
+    """One medication per non-empty line"""
+    return _non_empty_lines(text)
+
+
+def parse_allergies(text: str) -> list:
+    """Comma- or newline-separated allergies"""
+    return [allergy.strip() for allergy in re.split(r'[,\n]', text or '') if allergy.strip()]
+
+
+def parse_family_history(text: str) -> list:
+    """One family history entry per non-empty line"""
+    return _non_empty_lines(text)
+
+
+def parse_pharmacy_info(text: str) -> dict:
+    """
+    Parse pharmacy details written as "Key: value" lines.
+
+    Lines without a key are kept under 'Details' so no free text is lost.
+
+    Args:
+        text: Pharmacy info as entered on the patient forms
+
+    Returns:
+        Dict of pharmacy fields, empty when nothing was entered
+    """
+    details = {}
+    unkeyed = []
+    for line in _non_empty_lines(text):
+        key, separator, value = line.partition(':')
+        if separator and key.strip() and value.strip():
+            details[key.strip()] = value.strip()
+        else:
+            unkeyed.append(line)
+    if unkeyed:
+        details['Details'] = '\n'.join(unkeyed)
+    return details
+
+
+def structured_medical_history(patient) -> dict:
+    """Structured field values for a patient's free-text clinical fields"""
+    return {
+        'medication_list': parse_medications(patient.medications),
+        'allergy_list': parse_allergies(patient.allergies),
+        'pharmacy_details': parse_pharmacy_info(patient.pharmacy_info),
+        'family_history_list': parse_family_history(patient.family_history),
+    }
+
@@ -10,11 +10,15 @@ from django.conf import settings
 from reports.models import Reports, Documentation
 from reports.serializers import ReportSerializer
 from reports.forms import ReportForm
-from .models import Patient, Moderator, PastMedicalHistory, Interest, InterestPastMedicalHistory, InterestLead, Doctor, EmailOTP, LabCategory, LabTest, LabResult, LabDocument
+from .models import Patient, Moderator, PastMedicalHistory, Interest, InterestPastMedicalHistory, InterestLead, Doctor, EmailOTP, LabCategory, LabTest, LabResult, LabDocument, ImportJob
 from retell_calling.models import CallSummary, LeadCallSession, LeadCallSummary, FacilityCallTarget, FacilityCallSession, FacilityCallSummary
 from referral.models import Referral
 from django.db import models
+from django.core.paginator import Paginator
+from .imports import IMPORT_EXTENSIONS
+from .search import search_leads, search_patients
 from .serializers import PatientSerializer, ModeratorSerializer
+from .tasks import run_import_job
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
 from django.shortcuts import render, get_object_or_404, redirect
@@ -34,6 +38,7 @@ from django.views.decorators.csrf import csrf_exempt
 import json
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from django.urls import reverse
 from django.db import transaction
 import re
 import logging
@@ -302,7 +307,11 @@ def moderator_detail(request, moderator_id):
         moderator = get_object_or_404(Moderator, id=moderator_id)
         
         # Get all patients assigned to this moderator
-        assigned_patients = Patient.objects.filter(moderator_assigned=moderator).select_related('user').order_by('user__first_name')
+        assigned_patients = (
+            Patient.objects.filter(moderator_assigned=moderator)
+            .select_related('user', 'doctor_escalated', 'activity_summary__last_vital')
+            .order_by('user__first_name')
+        )
         
         # Add additional info for each patient
         patients_with_info = []
@@ -314,9 +323,9 @@ def moderator_detail(request, moderator_id):
                 today = date.today()
                 age = today.year - patient.date_of_birth.year - ((today.month, today.day) < (patient.date_of_birth.month, patient.date_of_birth.day))
             
-            # Get latest report for this patient (if any)
-            from reports.models import Reports
-            latest_report = Reports.objects.filter(patient=patient).order_by('-created_at').first()
+            # Latest report for this patient (if any), from the activity summary
+            summary = getattr(patient, 'activity_summary', None)
+            latest_report = summary.last_vital if summary else None
             
             # Get escalated doctor information if patient is escalated
             escalated_doctor = None
@@ -651,57 +660,18 @@ def admin_patient_list(request):
         
         # Apply search filter if provided
         if search_query:
-            patients = patients.filter(
-                models.Q(user__first_name__icontains=search_query) |
-                models.Q(user__last_name__icontains=search_query) |
-                models.Q(user__email__icontains=search_query) |
-                models.Q(phone_number__icontains=search_query) |
-                models.Q(insurance__icontains=search_query) |
-                models.Q(monitoring_parameters__icontains=search_query)
-            )
-        
-        # Order by creation date (newest first)
-        patients = patients.order_by('-created_at')
+            # Best matches first, newest first among equal matches
+            patients = search_patients(patients, search_query).order_by('-search_rank', '-created_at')
+        else:
+            # Order by creation date (newest first)
+            patients = patients.order_by('-created_at')
         
         # Format patient data for display
         formatted_patients = []
         for patient in patients:
-            # Format medications into a list if they exist
-            medications = []
-            if patient.medications:
-                medications = [med.strip() for med in patient.medications.split('\n') if med.strip()]
-
-            # Format pharmacy info into structured data if it exists
-            pharmacy_info = {}
-            if patient.pharmacy_info:
-                try:
-                    lines = patient.pharmacy_info.split('\n')
-                    for line in lines:
-                        if ':' in line:
-                            key, value = line.split(':', 1)
-                            pharmacy_info[key.strip()] = value.strip()
-                except:
-                    pharmacy_info = {'Details': patient.pharmacy_info}
-
-            # Format allergies into a list if they exist
-            allergies = []
-            if patient.allergies:
-                allergies = [allergy.strip() for allergy in patient.allergies.split(',') if allergy.strip()]
-
-            # Format family history into structured sections if it exists
-            family_history = []
-            if patient.family_history:
-                history_lines = patient.family_history.split('\n')
-                for line in history_lines:
-                    if line.strip():
-                        family_history.append(line.strip())
-
             formatted_patient = {
                 'patient': patient,
-                'formatted_medications': medications,
-                'formatted_pharmacy': pharmacy_info,
-                'formatted_allergies': allergies,
-                'formatted_family_history': family_history,
+                **_formatted_history(patient),
                 'moderator_name': patient.moderator_assigned.user.get_full_name() if patient.moderator_assigned else 'Not assigned',
                 'doctor_name': patient.doctor_escalated.user.get_full_name() if patient.doctor_escalated else 'Not escalated'
             }
@@ -1005,92 +975,118 @@ def moderator_logout(request):
     logout(request)  # Logs out the current user
     return redirect('/')  # Redirect to the login page after logout
 
+ASSIGNED_PATIENTS_PAGE_SIZE = 50
+
+
+def _assigned_patients(moderator, archived=False, search_query=''):
+    """
+    A moderator's patients joined with their activity summary (latest
+    documentation, vital and call, and call summary count), so the list is
+    one query however many patients are on the page.
+
+    With a search query only matching patients are returned, best match first.
+    """
+    patients = (
+        Patient.objects.filter(moderator_assigned=moderator, is_archived=archived)
+        .select_related('user', 'activity_summary__last_vital', 'activity_summary__last_documentation')
+    )
+    if search_query:
+        return search_patients(patients, search_query).order_by('-search_rank', 'created_at', 'id')
+    # Order patients by signup date (created_at)
+    return patients.order_by('created_at', 'id')
+
+
+def _format_last_vital(vital):
+    vital_parts = []
+    if vital.systolic_blood_pressure and vital.diastolic_blood_pressure:
+        vital_parts.append(f"BP: {vital.systolic_blood_pressure}/{vital.diastolic_blood_pressure}")
+    if vital.pulse:
+        vital_parts.append(f"HR: {vital.pulse}")
+    if vital.blood_glucose:
+        vital_parts.append(f"BG: {vital.blood_glucose}")
+    if vital.spo2:
+        vital_parts.append(f"SpO2: {vital.spo2}%")
+    recorded = timezone.localtime(vital.created_at).strftime('%m/%d/%Y %I:%M %p')
+    if vital_parts:
+        return f"{', '.join(vital_parts)} - {recorded}"
+    return f"Vital recorded - {recorded}"
+
+
+def _formatted_history(patient):
+    """Template keys for the structured medications, pharmacy, allergies and family history"""
+    return {
+        'formatted_medications': patient.medication_list,
+        'formatted_pharmacy': patient.pharmacy_details,
+        'formatted_allergies': patient.allergy_list,
+        'formatted_family_history': patient.family_history_list,
+    }
+
+
+def _build_assigned_patient_rows(patients, start_serial=1):
+    """Table rows for a page of _assigned_patients()"""
+    formatted = []
+    for serial_number, patient in enumerate(patients, start=start_serial):
+        # Patients created before the summaries were rebuilt may not have one yet
+        summary = getattr(patient, 'activity_summary', None)
+        last_documentation = summary.last_documentation if summary else None
+        last_doc_text = None
+        if last_documentation:
+            last_doc_text = f"{last_documentation.title} - {timezone.localtime(last_documentation.created_at).strftime('%m/%d/%Y %I:%M %p')}"
+        last_vital = summary.last_vital if summary else None
+        formatted.append({
+            'serial_number': serial_number,
+            'patient': patient,
+            **_formatted_history(patient),
+            'last_documentation': last_doc_text,
+            'last_vital': _format_last_vital(last_vital) if last_vital else None,
+            'status': patient.status or 'green',
+            'sticky_note': patient.sticky_note or '',
+            'call_status': summary.last_call_status if summary else None,
+            'summary_count': summary.call_summary_count if summary else 0,
+        })
+    return formatted
+
+
 @login_required
 def view_assigned_patient(request):
     moderator = Moderator.objects.get(user=request.user)
-    # Order patients by signup date (created_at)
-    all_patients = Patient.objects.filter(moderator_assigned=moderator).order_by('created_at')
-    active_patients = all_patients.filter(is_archived=False)
-    archived_patients = all_patients.filter(is_archived=True)
+    search_query = request.GET.get('search', '').strip()
     
-    # Import models for call status
-    from retell_calling.models import RetellCallSession, CallSummary
-    
-    def build_patient_list(patient_queryset, start_serial=1):
-        formatted = []
-        serial_number = start_serial
-        for patient in patient_queryset:
-            medications = []
-            if patient.medications:
-                medications = [med.strip() for med in patient.medications.split('\n') if med.strip()]
-            pharmacy_info = {}
-            if patient.pharmacy_info:
-                try:
-                    lines = patient.pharmacy_info.split('\n')
-                    for line in lines:
-                        if ':' in line:
-                            key, value = line.split(':', 1)
-                            pharmacy_info[key.strip()] = value.strip()
-                except:
-                    pharmacy_info = {'Details': patient.pharmacy_info}
-            allergies = []
-            if patient.allergies:
-                allergies = [allergy.strip() for allergy in patient.allergies.split(',') if allergy.strip()]
-            family_history = []
-            if patient.family_history:
-                history_lines = patient.family_history.split('\n')
-                for line in history_lines:
-                    if line.strip():
-                        family_history.append(line.strip())
-            last_documentation = Documentation.objects.filter(patient=patient).order_by('-created_at').first()
-            last_doc_text = None
-            if last_documentation:
-                last_doc_text = f"{last_documentation.title} - {timezone.localtime(last_documentation.created_at).strftime('%m/%d/%Y %I:%M %p')}"
-            last_vital = Reports.objects.filter(patient=patient).order_by('-created_at').first()
-            last_vital_text = None
-            if last_vital:
-                vital_parts = []
-                if last_vital.systolic_blood_pressure and last_vital.diastolic_blood_pressure:
-                    vital_parts.append(f"BP: {last_vital.systolic_blood_pressure}/{last_vital.diastolic_blood_pressure}")
-                if last_vital.pulse:
-                    vital_parts.append(f"HR: {last_vital.pulse}")
-                if last_vital.blood_glucose:
-                    vital_parts.append(f"BG: {last_vital.blood_glucose}")
-                if last_vital.spo2:
-                    vital_parts.append(f"SpO2: {last_vital.spo2}%")
-                if vital_parts:
-                    last_vital_text = f"{', '.join(vital_parts)} - {timezone.localtime(last_vital.created_at).strftime('%m/%d/%Y %I:%M %p')}"
-                else:
-                    last_vital_text = f"Vital recorded - {timezone.localtime(last_vital.created_at).strftime('%m/%d/%Y %I:%M %p')}"
-            latest_call = RetellCallSession.objects.filter(patient=patient).order_by('-created_at').first()
-            call_status = latest_call.call_status if latest_call else None
-            summary_count = CallSummary.objects.filter(patient=patient).count()
-            formatted.append({
-                'serial_number': serial_number,
-                'patient': patient,
-                'formatted_medications': medications,
-                'formatted_pharmacy': pharmacy_info,
-                'formatted_allergies': allergies,
-                'formatted_family_history': family_history,
-                'last_documentation': last_doc_text,
-                'last_vital': last_vital_text,
-                'status': patient.status or 'green',
-                'sticky_note': patient.sticky_note or '',
-                'call_status': call_status,
-                'summary_count': summary_count
-            })
-            serial_number += 1
-        return formatted
+    paginator = Paginator(_assigned_patients(moderator, search_query=search_query), ASSIGNED_PATIENTS_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    # Bulk calls go to every active patient, not just the search results
+    active_patient_count = (
+        Patient.objects.filter(moderator_assigned=moderator, is_archived=False).count() if search_query else paginator.count
+    )
     
-    formatted_patients = build_patient_list(active_patients)
-    formatted_archived = build_patient_list(archived_patients)
-
+    # Archived patients are only counted here; the list is loaded when the section is opened
     context = {
-        'patient_obj': formatted_patients,
-        'archived_patients': formatted_archived,
+        'patient_obj': _build_assigned_patient_rows(page_obj, start_serial=page_obj.start_index()),
+        'page_obj': page_obj,
+        'paginator': paginator,
+        'is_paginated': page_obj.has_other_pages(),
+        'search_query': search_query,
+        'active_patient_count': active_patient_count,
+        'archived_count': Patient.objects.filter(moderator_assigned=moderator, is_archived=True).count(),
     }
     return render(request, 'view_assigned_patient.html', context)
 
+
+@login_required
+def view_archived_patients(request):
+    """Rows of the archived patients table, fetched when the archived section is expanded"""
+    moderator = Moderator.objects.filter(user=request.user).first()
+    if not moderator:
+        return JsonResponse({"error": "Only moderators can view assigned patients"}, status=403)
+    
+    paginator = Paginator(_assigned_patients(moderator, archived=True), ASSIGNED_PATIENTS_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'archived_patients': _build_assigned_patient_rows(page_obj, start_serial=page_obj.start_index()),
+        'page_obj': page_obj,
+    }
+    return render(request, 'view_assigned_patient_archived_rows.html', context)
+
 @login_required
 def write_document(request, report_id):
     report = Reports.objects.get(id=report_id)
@@ -1528,33 +1524,13 @@ def patient_self_registration(request):
 @login_required
 def view_patient(request, patient_id):
     patient = Patient.objects.get(id=patient_id)
-    
-    # Process allergies
-    allergies_list = []
-    if patient.allergies:
-        allergies_list = [allergy.strip() for allergy in patient.allergies.split(',')]
-    
-    # Process medications
-    medications_list = []
-    if patient.medications:
-        medications_list = [med.strip() for med in patient.medications.split('\n')]
-    
-    # Process family history
-    family_history_list = []
-    if patient.family_history:
-        family_history_list = [history.strip() for history in patient.family_history.split('\n')]
-    
-    # Process pharmacy info
-    pharmacy_info_list = []
-    if patient.pharmacy_info:
-        pharmacy_info_list = [info.strip() for info in patient.pharmacy_info.split('\n')]
-    
+
     context = {
         'patient': patient,
-        'allergies_list': allergies_list,
-        'medications_list': medications_list,
-        'family_history_list': family_history_list,
-        'pharmacy_info_list': pharmacy_info_list,
+        'allergies_list': patient.allergy_list,
+        'medications_list': patient.medication_list,
+        'family_history_list': patient.family_history_list,
+        'pharmacy_info_list': [f"{key}: {value}" for key, value in patient.pharmacy_details.items()],
     }
     return render(request, 'index.html', context)
 
@@ -1998,16 +1974,9 @@ def view_escalated_patient(request):
     patients = Patient.objects.filter(doctor_escalated=doctor, is_escalated=True)
     formatted_patients = []
     for patient in patients:
-        medications = [med.strip() for med in patient.medications.split('\n')] if patient.medications else []
-        allergies = [allergy.strip() for allergy in patient.allergies.split(',')] if patient.allergies else []
-        family_history = [fh.strip() for fh in patient.family_history.split('\n')] if patient.family_history else []
-        pharmacy_info = [info.strip() for info in patient.pharmacy_info.split('\n')] if patient.pharmacy_info else []
         formatted_patients.append({
             'patient': patient,
-            'formatted_medications': medications,
-            'formatted_allergies': allergies,
-            'formatted_family_history': family_history,
-            'formatted_pharmacy': pharmacy_info,
+            **_formatted_history(patient),
         })
     context = {
         'patients': formatted_patients,
@@ -2024,42 +1993,9 @@ def doctor_patient_detail(request, patient_id):
         return redirect('doctor_login')
     patient = get_object_or_404(Patient, id=patient_id, doctor_escalated=doctor, is_escalated=True)
 
-    # Format medications into a list if they exist
-    medications = []
-    if patient.medications:
-        medications = [med.strip() for med in patient.medications.split('\n') if med.strip()]
-
-    # Format pharmacy info into structured data if it exists
-    pharmacy_info = {}
-    if patient.pharmacy_info:
-        try:
-            lines = patient.pharmacy_info.split('\n')
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    pharmacy_info[key.strip()] = value.strip()
-        except:
-            pharmacy_info = {'Details': patient.pharmacy_info}
-
-    # Format allergies into a list if they exist
-    allergies = []
-    if patient.allergies:
-        allergies = [allergy.strip() for allergy in patient.allergies.split(',') if allergy.strip()]
-
-    # Format family history into structured sections if it exists
-    family_history = []
-    if patient.family_history:
-        history_lines = patient.family_history.split('\n')
-        for line in history_lines:
-            if line.strip():
-                family_history.append(line.strip())
-
     context = {
         'patient': patient,
-        'formatted_medications': medications,
-        'formatted_pharmacy': pharmacy_info,
-        'formatted_allergies': allergies,
-        'formatted_family_history': family_history
+        **_formatted_history(patient),
     }
     return render(request, 'index.html', context)
 
@@ -2448,293 +2384,84 @@ def search_shortcuts(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def start_import_job(request, uploaded_file, kind):
+    """
+    Save an uploaded spreadsheet as an ImportJob and queue it.
+
+    Returns:
+        The job, or None (with an error message added) if the file type isn't accepted
+    """
+    import os
+    
+    file_extension = os.path.splitext(uploaded_file.name.lower())[1]
+    if file_extension not in IMPORT_EXTENSIONS:
+        messages.error(request, 'Please upload a valid Excel or CSV file (.xlsx, .xls, or .csv)')
+        return None
+    
+    job = ImportJob.objects.create(
+        kind=kind,
+        requested_by=request.user,
+        file=uploaded_file,
+        original_name=uploaded_file.name[:255],
+    )
+    transaction.on_commit(lambda: run_import_job.delay(str(job.id)))
+    return job
+
+
 @user_passes_test(lambda u: u.is_superuser, login_url='admin_login')
 def handle_excel_import(request):
-    """Handle Excel file import for leads"""
-    try:
-        import openpyxl
-        from django.core.files.storage import default_storage
-        from django.core.files.base import ContentFile
-        import tempfile
-        import os
-        
-        print("handle_excel_import function called")
-        print("Request FILES:", request.FILES)
-        excel_file = request.FILES['excel_file']
-        print(f"Excel file received: {excel_file.name}, size: {excel_file.size}")
-        
-        # Validate file type - accept Excel and CSV files
-        if not excel_file.name.lower().endswith(('.xlsx', '.xls', '.csv')):
-            messages.error(request, 'Please upload a valid Excel or CSV file (.xlsx, .xls, or .csv)')
-            return redirect('leads_list')
-        
-        # Determine file type and save accordingly
-        file_name_lower = excel_file.name.lower()
-        if file_name_lower.endswith('.csv'):
-            file_extension = '.csv'
-        elif file_name_lower.endswith('.xlsx'):
-            file_extension = '.xlsx'
-        else:
-            file_extension = '.xls'
-            
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-            for chunk in excel_file.chunks():
-                tmp_file.write(chunk)
-            tmp_file_path = tmp_file.name
-        
-        print(f"Temporary file saved as: {tmp_file_path}")
-        
-        try:
-            workbook = None
-            worksheet = None
-            
-            # Handle CSV files
-            if file_extension == '.csv':
-                print("Processing CSV file...")
-                import csv
-                
-                # Read CSV file
-                with open(tmp_file_path, 'r', encoding='utf-8') as csvfile:
-                    csv_reader = csv.reader(csvfile)
-                    rows = list(csv_reader)
-                
-                if not rows:
-                    raise Exception("CSV file is empty")
-                
-                print(f"CSV file has {len(rows)} rows")
-                print(f"Headers: {rows[0]}")
-                
-                # Convert CSV to openpyxl workbook for consistent processing
-                workbook = openpyxl.Workbook()
-                worksheet = workbook.active
-                
-                # Write CSV data to worksheet
-                for row_idx, row in enumerate(rows, 1):
-                    for col_idx, value in enumerate(row, 1):
-                        worksheet.cell(row=row_idx, column=col_idx, value=value)
-                
-                print("Successfully converted CSV to Excel format")
-            
-            # Handle Excel files
-            else:
-                # First try: Use pandas if available (handles both .xlsx and .xls)
-                try:
-                    import pandas as pd
-                    print("Trying to read with pandas...")
-                    df = pd.read_excel(tmp_file_path)
-                    print(f"Successfully read Excel file with pandas. Shape: {df.shape}")
-                    print(f"Columns: {list(df.columns)}")
-                    
-                    # Convert to openpyxl workbook for processing
-                    converted_path = tmp_file_path.replace(file_extension, '_converted.xlsx')
-                    df.to_excel(converted_path, index=False, engine='openpyxl')
-                    workbook = openpyxl.load_workbook(converted_path)
-                    worksheet = workbook.active
-                    
-                    # Clean up converted file
-                    os.unlink(converted_path)
-                    print("Successfully processed with pandas")
-                    
-                except ImportError:
-                    print("Pandas not available, trying openpyxl directly...")
-                except Exception as pandas_error:
-                    print(f"Pandas failed to read file: {pandas_error}")
-                
-                # Second try: Direct openpyxl (works for .xlsx files)
-                if workbook is None:
-                    try:
-                        print("Trying openpyxl directly...")
-                        workbook = openpyxl.load_workbook(tmp_file_path)
-                        worksheet = workbook.active
-                        print("Successfully processed with openpyxl")
-                    except Exception as openpyxl_error:
-                        print(f"Openpyxl failed: {openpyxl_error}")
-                
-                if workbook is None:
-                    raise Exception("Could not read Excel file with any available method")
-            
-            # Get headers from first row
-            headers = [cell.value for cell in worksheet[1]]
-            
-            # Find all available columns (case-insensitive)
-            column_mapping = {}
-            
-            for i, header in enumerate(headers, 1):
-                if header and isinstance(header, str):
-                    header_lower = header.lower().strip()
-                    
-                    # Map Excel columns to model fields (case-insensitive matching)
-                    if 'first' in header_lower and 'name' in header_lower:
-                        column_mapping['first_name'] = i
-                    elif 'last' in header_lower and 'name' in header_lower:
-                        column_mapping['last_name'] = i
-                    elif header_lower == 'phone_number' or (header_lower == 'phone' and 'phone 2' not in headers[i:i+2]):
-                        column_mapping['phone_number'] = i
-                    elif header_lower == 'phone_number_2':
-                        column_mapping['phone_number_2'] = i
-                    elif header_lower == 'street 1':
-                        column_mapping['street_address'] = i
-                    elif header_lower == 'city':
-                        column_mapping['city'] = i
-                    elif header_lower == 'zip code':
-                        column_mapping['zip_code'] = i
-                    elif header_lower == 'mrn#' or 'mrn' in header_lower:
-                        column_mapping['mrn_number'] = i
-                    elif header_lower == 'date' or 'date' in header_lower:
-                        column_mapping['date_of_birth'] = i
-                    elif header_lower == 'sex' or header_lower == 's':
-                        column_mapping['sex'] = i
-                    elif header_lower == 'marital status' or header_lower == 'm':
-                        column_mapping['marital_status'] = i
-                    elif header_lower == 'primary insured id':
-                        column_mapping['primary_insured_id'] = i
-                    elif header_lower == 'primary insurance':
-                        column_mapping['insurance'] = i
-            
-            # Debug: Print column mapping
-            print(f"Column mapping found: {column_mapping}")
-            print(f"Available headers: {headers}")
-            
-            # Check for required columns
-            if not column_mapping.get('first_name') or not column_mapping.get('last_name') or not column_mapping.get('phone_number'):
-                messages.error(request, 'Excel file must contain columns for first_name, last_name, and phone_number')
-                return redirect('leads_list')
-            
-            # Process rows
-            created_count = 0
-            skipped_count = 0
-            errors = []
-            
-            for row_num in range(2, worksheet.max_row + 1):  # Skip header row
-                try:
-                    # Extract all available data from the row
-                    row_data = {}
-                    
-                    for field_name, col_index in column_mapping.items():
-                        cell_value = worksheet.cell(row=row_num, column=col_index).value
-                        if cell_value is not None:
-                            row_data[field_name] = str(cell_value).strip()
-                        else:
-                            row_data[field_name] = ''
-                    
-                    # Get required fields
-                    first_name = row_data.get('first_name', '')
-                    last_name = row_data.get('last_name', '')
-                    phone_number = row_data.get('phone_number', '')
-                    
-                    # Skip empty rows
-                    if not first_name and not last_name and not phone_number:
-                        continue
-                    
-                    print(f"Processing row {row_num}: {first_name} {last_name}, phone: {phone_number}")
-                    
-                    # Skip if no phone number (required field)
-                    if not phone_number:
-                        skipped_count += 1
-                        errors.append(f'Row {row_num}: Missing phone number')
-                        continue
-                    
-                    # Skip if no first_name AND no last_name (at least one required)
-                    if not first_name and not last_name:
-                        skipped_count += 1
-                        errors.append(f'Row {row_num}: Either first name or last name must be provided')
-                        continue
-                    
-                    # Check if lead already exists (by phone number)
-                    if InterestLead.objects.filter(phone_number=phone_number).exists():
-                        skipped_count += 1
-                        errors.append(f'Row {row_num}: Lead with phone number {phone_number} already exists')
-                        continue
-                    
-                    # Parse date of birth if available
-                    date_of_birth = None
-                    if row_data.get('date_of_birth'):
-                        try:
-                            from datetime import datetime
-                            # Handle different date formats (MM/DD, MM/DD/YYYY, etc.)
-                            date_str = row_data['date_of_birth']
-                            if '/' in date_str:
-                                parts = date_str.split('/')
-                                if len(parts) == 2:  # MM/DD format
-                                    # Assume current year for MM/DD format
-                                    current_year = datetime.now().year
-                                    date_of_birth = datetime.strptime(f"{date_str}/{current_year}", "%m/%d/%Y").date()
-                                elif len(parts) == 3:  # MM/DD/YYYY format
-                                    date_of_birth = datetime.strptime(date_str, "%m/%d/%Y").date()
-                        except Exception as date_error:
-                            print(f"Date parsing error for row {row_num}: {date_error}")
-                    
-                    # Create new lead with all available data
-                    try:
-                        lead_data = {
-                            'first_name': first_name,
-                            'last_name': last_name,
-                            'phone_number': phone_number,
-                        }
-                        
-                        # Add optional fields if they exist
-                        if row_data.get('phone_number_2'):
-                            lead_data['phone_number_2'] = row_data['phone_number_2']
-                        if row_data.get('street_address'):
-                            lead_data['street_address'] = row_data['street_address']
-                        if row_data.get('city'):
-                            lead_data['city'] = row_data['city']
-                        if row_data.get('zip_code'):
-                            lead_data['zip_code'] = row_data['zip_code']
-                        if row_data.get('mrn_number'):
-                            lead_data['mrn_number'] = row_data['mrn_number']
-                        if date_of_birth:
-                            lead_data['date_of_birth'] = date_of_birth
-                        if row_data.get('sex'):
-                            lead_data['sex'] = row_data['sex'].upper()[:1]  # Take first character and uppercase
-                        if row_data.get('marital_status'):
-                            lead_data['marital_status'] = row_data['marital_status']
-                        if row_data.get('primary_insured_id'):
-                            lead_data['primary_insured_id'] = row_data['primary_insured_id']
-                        if row_data.get('insurance'):
-                            lead_data['insurance'] = row_data['insurance']
-                        
-                        lead = InterestLead.objects.create(**lead_data)
-                        created_count += 1
-                        print(f"Created lead: {lead}")
-                        
-                    except Exception as validation_error:
-                        skipped_count += 1
-                        errors.append(f'Row {row_num}: Validation error - {str(validation_error)}')
-                        continue
-                    
-                except Exception as e:
-                    skipped_count += 1
-                    errors.append(f'Row {row_num}: {str(e)}')
-            
-            # Clean up temporary file
-            os.unlink(tmp_file_path)
-            
-            # Show results
-            if created_count > 0:
-                messages.success(request, f'Successfully imported {created_count} leads')
-            
-            if skipped_count > 0:
-                messages.warning(request, f'Skipped {skipped_count} rows due to errors or duplicates')
-            
-            if errors and len(errors) <= 10:  # Show first 10 errors
-                for error in errors[:10]:
-                    messages.warning(request, error)
-            elif len(errors) > 10:
-                messages.warning(request, f'First 10 errors: {", ".join(errors[:10])}')
-            
-        except Exception as e:
-            # Clean up temporary file
-            if os.path.exists(tmp_file_path):
-                os.unlink(tmp_file_path)
-            messages.error(request, f'Error processing Excel file: {str(e)}')
-            
-    except ImportError:
-        messages.error(request, 'Excel processing library not installed. Please install openpyxl.')
-    except Exception as e:
-        messages.error(request, f'Error importing leads: {str(e)}')
+    """Queue an Excel/CSV lead import and show its progress page"""
+    logger = logging.getLogger(__name__)
     
-    return redirect('leads_list')
+    excel_file = request.FILES['excel_file']
+    logger.info(f"Lead import file received: {excel_file.name}, size: {excel_file.size}")
+    
+    job = start_import_job(request, excel_file, ImportJob.KIND_LEADS)
+    if job is None:
+        return redirect('leads_list')
+    messages.info(request, f'Importing leads from {excel_file.name}. You can leave this page; the import continues in the background.')
+    return redirect('import_job_detail', job_id=job.id)
+
+
+def _import_job_payload(job):
+    return {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'file_name': job.original_name,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'skipped': job.skipped_count,
+        'progress': job.progress,
+        'errors': job.errors,
+        'error': job.error,
+    }
+
+
+@user_passes_test(lambda u: u.is_superuser, login_url='admin_login')
+def import_job_detail(request, job_id):
+    """Progress and results page for a lead or facility import"""
+    job = get_object_or_404(ImportJob, id=job_id)
+    if job.kind == ImportJob.KIND_FACILITIES:
+        back_url = reverse('retell_calling:facility_calls_dashboard')
+    else:
+        back_url = reverse('leads_list')
+    context = {
+        'job': job,
+        'back_url': back_url,
+        'status_url': reverse('import_job_status', args=[job.id]),
+        'max_errors': ImportJob.MAX_ERRORS,
+    }
+    return render(request, 'admin/import_job.html', context)
+
+
+@user_passes_test(lambda u: u.is_superuser, login_url='admin_login')
+def import_job_status(request, job_id):
+    """Import progress for polling; finished once status is completed or failed"""
+    job = get_object_or_404(ImportJob, id=job_id)
+    return JsonResponse(_import_job_payload(job))
 
 
 @user_passes_test(lambda u: u.is_superuser, login_url='admin_login')
@@ -2789,17 +2516,13 @@ def leads_list(request):
         date_to = request.GET.get('date_to', '').strip()
         conversion_status = request.GET.get('conversion_status', '').strip()
         
-        # Start with all leads
-        leads = InterestLead.objects.all()
+        # Start with all leads; completion is computed in the query and the
+        # conversion relations are joined so a page renders without extra queries
+        leads = InterestLead.objects.with_completion().select_related('converted_patient__user', 'converted_by')
         
         # Apply search filter if provided
         if search_query:
-            leads = leads.filter(
-                models.Q(first_name__icontains=search_query) |
-                models.Q(last_name__icontains=search_query) |
-                models.Q(email__icontains=search_query) |
-                models.Q(phone_number__icontains=search_query)
-            )
+            leads = search_leads(leads, search_query)
         
         # Apply date range filter if provided
         if date_from:
@@ -2822,28 +2545,31 @@ def leads_list(request):
         elif conversion_status == 'not_converted':
             leads = leads.filter(is_converted=False)
         
-        # Order by creation date (newest first)
-        leads = leads.order_by('-created_at')
+        # Best matches first when searching, otherwise newest first
+        leads = leads.order_by('-search_rank', '-created_at') if search_query else leads.order_by('-created_at')
         
-        # Add computed fields for each lead
-        leads_with_data = []
-        for lead in leads:
-            leads_with_data.append({
+        # Paginate the queryset so only the requested page of leads is fetched
+        paginator = Paginator(leads, 25)  # Show 25 leads per page
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        page_obj.object_list = [
+            {
                 'lead': lead,
                 'completion_percentage': lead.completion_percentage,
                 'is_complete': lead.is_complete,
-                'converted_patient_name': lead.converted_patient.user.get_full_name() if lead.converted_patient else None,
+                'converted_patient_name': lead.converted_patient.user.get_full_name() if lead.converted_patient and lead.converted_patient.user else None,
                 'converted_by_name': lead.converted_by.get_full_name() if lead.converted_by else None
-            })
-        
-        # Implement pagination
-        paginator = Paginator(leads_with_data, 25)  # Show 25 leads per page
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+            }
+            for lead in page_obj.object_list
+        ]
         
         # Calculate statistics
-        total_leads = InterestLead.objects.count()
-        converted_leads = InterestLead.objects.filter(is_converted=True).count()
+        stats = InterestLead.objects.aggregate(
+            total=models.Count('id'),
+            converted=models.Count('id', filter=models.Q(is_converted=True)),
+        )
+        total_leads = stats['total']
+        converted_leads = stats['converted']
         conversion_rate = round((converted_leads / total_leads * 100), 1) if total_leads > 0 else 0
         
         context = {
@@ -2857,7 +2583,7 @@ def leads_list(request):
             'total_leads': total_leads,
             'converted_leads': converted_leads,
             'conversion_rate': conversion_rate,
-            'filtered_count': len(leads_with_data)
+            'filtered_count': paginator.count
         }
         
         return render(request, 'admin/leads_list.html', context)